@@ -0,0 +1,74 @@
+import difflib
+import os
+import shutil
+import sys
+import tempfile
+
+# Make the shared top-level modules importable when run from the repository checkout
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from bulk_import import export_import_csvs
+from mooc_data import open_mooc_sources
+import segment_storage
+
+# Golden test of the bulk import CSVs: exports the small fixed MOOC data set in bulk_import_golden/input
+# (synthetic data, generated once with synthetic_mooc and checked in) for every segment layout and diffs
+# the CSVs against bulk_import_golden/expected/<layout>. Exits with 1 and prints the diffs on any change.
+# After an intended change to the export, rerun with --update and review the diff of the expected files.
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bulk_import_golden")
+INPUT_DIR = os.path.join(GOLDEN_DIR, "input")
+EXPECTED_DIR = os.path.join(GOLDEN_DIR, "expected")
+
+
+def export_layout(output_dir, layout):
+    sources = open_mooc_sources(INPUT_DIR)
+    export_import_csvs(output_dir, sources["user_video_act"], sources["user"], sources["course"], sources["video"],
+                       layout)
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines(keepends=True)
+
+
+def diff_dirs(expected_dir, actual_dir):
+    """Returns unified diff lines between the CSV files of two folders (missing files diff against nothing)."""
+    names = sorted(set(os.listdir(expected_dir)) | set(os.listdir(actual_dir)))
+    lines = []
+    for name in names:
+        expected_path = os.path.join(expected_dir, name)
+        actual_path = os.path.join(actual_dir, name)
+        expected = _read(expected_path) if os.path.exists(expected_path) else []
+        actual = _read(actual_path) if os.path.exists(actual_path) else []
+        lines.extend(difflib.unified_diff(expected, actual, f"expected/{name}", f"actual/{name}"))
+    return lines
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Diff the bulk import CSVs of a fixed input against the checked-in golden files.")
+    parser.add_argument('--update', action='store_true', help='Rewrite the golden files from the current export')
+    args = parser.parse_args()
+
+    failed = False
+    for layout in segment_storage.LAYOUTS:
+        expected_dir = os.path.join(EXPECTED_DIR, layout)
+        if args.update:
+            shutil.rmtree(expected_dir, ignore_errors=True)
+            export_layout(expected_dir, layout)
+            print(f"{layout}: golden files written to {expected_dir}")
+            continue
+        with tempfile.TemporaryDirectory(prefix="bulk_import_check_") as actual_dir:
+            export_layout(actual_dir, layout)
+            diff = diff_dirs(expected_dir, actual_dir)
+        if diff:
+            failed = True
+            sys.stdout.writelines(diff)
+            print(f"{layout}: CSVs differ from the golden files")
+        else:
+            print(f"{layout}: CSVs match the golden files")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+import os
+import itertools
+import re
+import sys
+import threading
+from collections import defaultdict
+
+# Make the shared top-level modules importable when run from the repository checkout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import neo4j_utils
+import segment_storage
+
+# In-process stand-in for Neo4j, so the seeding and reasoning code can be benchmarked on any machine.
+#
+# It is not a Cypher engine. It understands exactly the statements this repository sends:
+#   - the seeding statements of neo4j_utils (including the change markers), applied with the same MERGE
+#     semantics in Python
+#   - read queries of the form  MATCH (a:A)-[r:R]->(b:B)... [WHERE x.p IS NOT NULL [AND ...]]
+#     RETURN x.p [AS alias], ... | count(*) [AS alias] [LIMIT n]   (any chain of directed single hops)
+#   - the segment reads of segment_storage that the form above cannot express (skip counts, and the
+#     compact layout's interactions, count and snapshot export)
+#   - RETURN 1 (connection warmup)
+# Anything else raises NotImplementedError, so a benchmark never silently measures the wrong thing.
+# Sessions, transactions and results expose the subset of the driver API the scripts use.
+
+
+class Record(tuple):
+    """A row that, like neo4j.Record, is a tuple and can also be indexed by column name."""
+
+    def __new__(cls, values, keys):
+        record = super().__new__(cls, values)
+        record._keys = keys
+        return record
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._keys.index(key))
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._keys)
+
+    def get(self, key, default=None):
+        return self[key] if key in self._keys else default
+
+    def data(self):
+        return dict(zip(self._keys, self))
+
+
+class Result:
+    def __init__(self, keys, rows):
+        self._keys = keys
+        self._rows = iter(rows)
+
+    def __iter__(self):
+        for row in self._rows:
+            yield Record(row, self._keys)
+
+    def keys(self):
+        return list(self._keys)
+
+    def single(self):
+        records = list(self)
+        return records[0] if records else None
+
+    def data(self):
+        return [record.data() for record in self]
+
+    def consume(self):
+        for _ in self._rows:
+            pass
+
+
+class InMemoryGraph:
+    """
+    nodes: label -> {id: properties}
+    relationships: type -> {key: (source label, source id, target label, target id, properties)}
+    """
+
+    def __init__(self):
+        self.nodes = defaultdict(dict)
+        self.relationships = defaultdict(dict)
+        self.lock = threading.Lock()
+        self._adjacency = {}
+
+    def node_count(self, label=None):
+        return len(self.nodes[label]) if label else sum(len(n) for n in self.nodes.values())
+
+    def relationship_count(self, rel_type=None):
+        if rel_type:
+            return len(self.relationships[rel_type])
+        return sum(len(r) for r in self.relationships.values())
+
+    def merge_node(self, label, node_id):
+        return self.nodes[label].setdefault(node_id, {"id": node_id})
+
+    def merge_relationship(self, rel_type, key, source, target):
+        self._adjacency.pop(rel_type, None)
+        rels = self.relationships[rel_type]
+        if key not in rels:
+            rels[key] = (source[0], source[1], target[0], target[1], {})
+        return rels[key][4]
+
+    def adjacency(self, rel_type):
+        """Source id -> [(target label, target id, relationship properties)], built on first use after a write."""
+        adjacency = self._adjacency.get(rel_type)
+        if adjacency is None:
+            adjacency = defaultdict(list)
+            for source_label, source, target_label, target, props in self.relationships[rel_type].values():
+                adjacency[(source_label, source)].append((target_label, target, props))
+            self._adjacency[rel_type] = adjacency
+        return adjacency
+
+
+class Driver:
+    """Driver stand-in over an InMemoryGraph; install it with neo4j_client.set_driver."""
+
+    def __init__(self, graph=None):
+        self.graph = graph if graph is not None else InMemoryGraph()
+
+    def session(self, **kwargs):
+        return Session(self.graph)
+
+    def verify_connectivity(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Transaction:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, query, parameters=None, **kwargs):
+        return run(self.graph, query, {**(parameters or {}), **kwargs})
+
+
+class Session:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def run(self, query, parameters=None, **kwargs):
+        return run(self.graph, query, {**(parameters or {}), **kwargs})
+
+    def execute_read(self, work, *args, **kwargs):
+        return work(Transaction(self.graph), *args, **kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        return work(Transaction(self.graph), *args, **kwargs)
+
+
+# --- Seeding statements ---
+def _merge_nodes(label):
+    def write(graph, rows):
+        for row in rows:
+            graph.merge_node(label, row["id"]).update(row["props"])
+    return write
+
+
+def _set_properties(label):
+    def write(graph, rows):
+        for row in rows:
+            node = graph.nodes[label].get(row["id"])
+            if node is not None:
+                node.update(row["props"])
+    return write
+
+
+def _write_enrollments(graph, rows):
+    for row in rows:
+        if row["user_id"] in graph.nodes["User"]:
+            graph.merge_node("Course", row["course_id"])
+            props = graph.merge_relationship("ENROLLED_IN", (row["user_id"], row["course_id"]),
+                                             ("User", row["user_id"]), ("Course", row["course_id"]))
+            props["enroll_time"] = row["enroll_time"]
+
+
+def _write_segments(graph, rows):
+    for row in rows:
+        if row["video_id"] in graph.nodes["Video"]:
+            segment = graph.merge_node("Segment", row["segment_id"])
+            segment.update({k: row[k] for k in ("segment_index", "start", "end", "text")})
+            graph.merge_relationship("HAS_SEGMENT", (row["video_id"], row["segment_id"]),
+                                     ("Video", row["video_id"]), ("Segment", row["segment_id"]))
+
+
+def _write_segment_lists(graph, rows):
+    for row in rows:
+        video = graph.nodes["Video"].get(row["video_id"])
+        if video is not None:
+            video.update(segment_start=row["start"], segment_end=row["end"])
+
+
+def _write_transcripts(graph, rows):
+    for row in rows:
+        if row["video_id"] in graph.nodes["Video"]:
+            graph.merge_node("Transcript", row["video_id"])["text"] = row["text"]
+            graph.merge_relationship("HAS_TRANSCRIPT", (row["video_id"],),
+                                     ("Video", row["video_id"]), ("Transcript", row["video_id"]))
+
+
+def _write_part_of(graph, rows):
+    for row in rows:
+        if row["video_id"] in graph.nodes["Video"] and row["course_id"] in graph.nodes["Course"]:
+            props = graph.merge_relationship("PART_OF", (row["video_id"], row["course_id"], row["video_order"]),
+                                             ("Video", row["video_id"]), ("Course", row["course_id"]))
+            props.update(video_order=row["video_order"], display_name=row["display_name"], chapter=row["chapter"])
+
+
+def _write_watched(graph, rows):
+    for row in rows:
+        if row["user_id"] in graph.nodes["User"] and row["video_id"] in graph.nodes["Video"]:
+            props = graph.merge_relationship("WATCHED", (row["user_id"], row["video_id"]),
+                                             ("User", row["user_id"]), ("Video", row["video_id"]))
+            props.update({k: row[k] for k in neo4j_utils.WATCHED_PROPERTIES})
+
+
+def _normalize(query):
+    return " ".join(query.split())
+
+
+_WRITES = {
+    _normalize(neo4j_utils.USER_QUERY): _merge_nodes("User"),
+    _normalize(neo4j_utils.COURSE_QUERY): _merge_nodes("Course"),
+    _normalize(neo4j_utils.VIDEO_QUERY): _merge_nodes("Video"),
+    _normalize(neo4j_utils.ENROLLED_IN_QUERY): _write_enrollments,
+    _normalize(neo4j_utils.SEGMENT_QUERY): _write_segments,
+    _normalize(neo4j_utils.SEGMENT_LIST_QUERY): _write_segment_lists,
+    _normalize(neo4j_utils.TRANSCRIPT_QUERY): _write_transcripts,
+    _normalize(neo4j_utils.PART_OF_QUERY): _write_part_of,
+    _normalize(neo4j_utils.WATCHED_QUERY): _write_watched,
+    _normalize(neo4j_utils.VIDEO_STATS_QUERY): _set_properties("Video"),
+    _normalize(neo4j_utils.COURSE_STATS_QUERY): _set_properties("Course"),
+}
+
+
+# --- Read queries ---
+_MATCH = re.compile(r"^MATCH (?P<pattern>.+?)(?: WHERE (?P<where>.+?))? RETURN (?P<returns>.+?)(?: LIMIT (?P<limit>\d+))?$")
+_NODE = re.compile(r"\((\w+):(\w+)\)")
+_HOP = re.compile(r"-\[(\w*):(\w+)\]->\((\w+):(\w+)\)")
+_NOT_NULL = re.compile(r"^(\w+)\.(\w+) IS NOT NULL$")
+_PROPERTY = re.compile(r"^(\w+)\.(\w+)(?: AS (\w+))?$")
+_COUNT = re.compile(r"^count\(\*\)(?: AS (\w+))?$")
+
+
+def _parse_pattern(pattern):
+    """Returns (first node (var, label), [(rel var, type, node var, label)]) or None."""
+    first = _NODE.match(pattern)
+    if first is None:
+        return None
+    hops = []
+    pos = first.end()
+    while pos < len(pattern):
+        hop = _HOP.match(pattern, pos)
+        if hop is None:
+            return None
+        hops.append(hop.groups())
+        pos = hop.end()
+    return first.groups(), hops
+
+
+def _bindings(graph, first, hops):
+    """Yields {variable: properties} for every match of the pattern."""
+    var, label = first
+    adjacencies = [graph.adjacency(rel_type) for _, rel_type, _, _ in hops]
+
+    def expand(binding, node, depth):
+        if depth == len(hops):
+            yield binding
+            return
+        rel_var, _, target_var, target_label = hops[depth]
+        for other_label, other, props in adjacencies[depth].get(node, ()):
+            if other_label != target_label or other not in graph.nodes[target_label]:
+                continue
+            yield from expand({**binding, rel_var: props, target_var: graph.nodes[target_label][other]},
+                              (target_label, other), depth + 1)
+
+    for node_id, props in list(graph.nodes[label].items()):
+        yield from expand({var: props}, (label, node_id), 0)
+
+
+def _select(graph, query):
+    match = _MATCH.match(query)
+    parsed = match and _parse_pattern(match.group("pattern"))
+    if not parsed:
+        return None
+    conditions = []
+    for condition in (match.group("where") or "").split(" AND ") if match.group("where") else []:
+        not_null = _NOT_NULL.match(condition)
+        if not_null is None:
+            return None
+        conditions.append(not_null.groups())
+    columns = []
+    for expression in match.group("returns").split(", "):
+        count = _COUNT.match(expression)
+        if count:
+            columns.append(("count", None, count.group(1) or expression))
+            continue
+        prop = _PROPERTY.match(expression)
+        if prop is None:
+            return None
+        var, name, alias = prop.groups()
+        columns.append((var, name, alias or f"{var}.{name}"))
+    keys = [alias for _, _, alias in columns]
+
+    matches = (b for b in _bindings(graph, *parsed) if all(b[v].get(p) is not None for v, p in conditions))
+    if any(var == "count" for var, _, _ in columns):
+        if len(columns) > 1:
+            return None
+        return Result(keys, [(sum(1 for _ in matches),)])
+    rows = (tuple(b[var].get(name) for var, name, _ in columns) for b in matches)
+    if match.group("limit"):
+        rows = itertools.islice(rows, int(match.group("limit")))
+    return Result(keys, rows)
+
+
+def _compact_segments(video):
+    """Yields the segments of a Video in the compact layout as Segment-like property dicts."""
+    for i, (start, end) in enumerate(zip(video.get("segment_start") or (), video.get("segment_end") or ())):
+        yield {"id": segment_storage.segment_id(video["id"], i), "start": start, "end": end, "segment_index": i}
+
+
+def _user_segments(graph, layout):
+    """Yields (user, watched, video, segment) property dicts in either segment layout."""
+    if layout == "nodes":
+        for binding in _bindings(graph, ("u", "User"), [("w", "WATCHED", "v", "Video"), ("", "HAS_SEGMENT", "s", "Segment")]):
+            yield binding["u"], binding["w"], binding["v"], binding["s"]
+        return
+    for binding in _bindings(graph, ("u", "User"), [("w", "WATCHED", "v", "Video")]):
+        for segment in _compact_segments(binding["v"]):
+            yield binding["u"], binding["w"], binding["v"], segment
+
+
+def _segment_interactions(graph, layout):
+    keys = ["user", "video", "segment", "seg_start", "seg_end", "watched_start", "watched_end"]
+    return Result(keys, ((u["id"], v["id"], s["id"], s.get("start"), s.get("end"),
+                          w.get("video_start_time"), w.get("video_end_time"))
+                         for u, w, v, s in _user_segments(graph, layout)))
+
+
+def _compact_snapshot_segments(graph):
+    return Result(["id", "seg_start", "seg_end", "segment_index"],
+                  ((s["id"], s["start"], s["end"], s["segment_index"])
+                   for video in list(graph.nodes["Video"].values()) for s in _compact_segments(video)))
+
+
+def _compact_snapshot_has_segment(graph):
+    return Result(["source", "target"], ((video["id"], s["id"]) for video in list(graph.nodes["Video"].values())
+                                         for s in _compact_segments(video)))
+
+
+def _segment_skip_counts(graph, layout):
+    # Same semantics as the Cypher in segment_storage.SKIP_COUNTS_QUERIES
+    viewers = defaultdict(set)
+    skippers = defaultdict(set)
+    for u, w, v, s in _user_segments(graph, layout):
+        start, end = w.get("video_start_time"), w.get("video_end_time")
+        # A comparison with a missing segment bound is null in Cypher, and coalesce(null, false) counts as overlap
+        viewed = (start is not None and end is not None
+                  and not (s.get("start") is not None and end < s["start"])
+                  and not (s.get("end") is not None and start > s["end"]))
+        key = (v["id"], s["id"])
+        (viewers if viewed else skippers)[key].add(u["id"])
+        viewers.setdefault(key, set())
+        skippers.setdefault(key, set())
+    rows = [(video, segment, len(viewers[(video, segment)]), len(skippers[(video, segment)]))
+            for video, segment in viewers]
+    return Result(["video", "segment", "views", "skips"], rows)
+
+
+def _compact_interaction_count(graph):
+    return Result(["count"], [(sum(1 for _ in _user_segments(graph, "compact")),)])
+
+
+# Segment reads whose Cypher the pattern matcher in _select cannot express
+_READS = {
+    _normalize(segment_storage.SKIP_COUNTS_QUERIES["nodes"]): lambda graph: _segment_skip_counts(graph, "nodes"),
+    _normalize(segment_storage.SKIP_COUNTS_QUERIES["compact"]): lambda graph: _segment_skip_counts(graph, "compact"),
+    _normalize(segment_storage.INTERACTIONS_QUERIES["compact"]): lambda graph: _segment_interactions(graph, "compact"),
+    _normalize(segment_storage.INTERACTION_COUNT_QUERIES["compact"]): _compact_interaction_count,
+    _normalize(segment_storage.SNAPSHOT_QUERIES["compact"]["Segment"]): _compact_snapshot_segments,
+    _normalize(segment_storage.SNAPSHOT_QUERIES["compact"]["HAS_SEGMENT"]): _compact_snapshot_has_segment,
+}
+
+
+def run(graph, query, parameters):
+    normalized = _normalize(query)
+    write = _WRITES.get(normalized)
+    if write is not None:
+        with graph.lock:
+            write(graph, parameters["rows"])
+        return Result([], [])
+    if normalized == _normalize(neo4j_utils.CHANGE_MARKER_QUERY):
+        with graph.lock:
+            graph.merge_node("SchemaVersion", "seed_changes").update(parameters["changes"])
+        return Result([], [])
+    if normalized == "RETURN 1":
+        return Result(["1"], [(1,)])
+    read = _READS.get(normalized)
+    if read is not None:
+        return read(graph)
+    result = _select(graph, normalized)
+    if result is None:
+        raise NotImplementedError(f"The in-memory graph does not support this query: {normalized}")
+    return result
@@ -0,0 +1,247 @@
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+# Benchmark runs never publish result tables for the recommendation service
+os.environ["RESULTS_DIR"] = ""
+
+# Make the shared top-level modules and the reasoning scripts importable when run from the repository checkout
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "first_order_logic_reasoning"))
+sys.path.insert(0, ROOT)
+import neo4j_client
+from mooc_data import open_mooc_sources
+from neo4j_utils import clear_database, insert_data_into_kg, is_database_empty, seed_steps
+from neo4j_schema import ensure_schema
+import segment_storage
+import segments_skipped
+import video_speed
+from graph_snapshot import export_snapshot
+from in_memory_graph import Driver
+from synthetic_mooc import add_generator_arguments, generate_mooc_data
+
+# End-to-end benchmarks: generates synthetic MOOC data at several scales, seeds it with insert_data_into_kg
+# (timing every step) and runs each reasoning job on the result. Every measurement reports wall time,
+# rows processed, rows/s and the peak RSS of the process during that measurement.
+#
+# --backend memory (default) runs against benchmarks/in_memory_graph.py, so no server is needed; the
+# numbers then cover the client side (row building, batching, streaming, NumPy and rule evaluation) plus a
+# Python-level store. --backend neo4j uses the NEO4J_* settings and refuses to run unless the database is
+# empty; it clears the benchmark data again after every scale.
+DEFAULT_SCALES = (200, 1000, 5000)
+
+WATCHED_ROWS = "MATCH (u:User)-[w:WATCHED]->(v:Video) RETURN count(*) AS count"
+# Rows the stats mode of video_speed reads: one per Video and Course with stored viewing statistics
+STATS_ROWS = [f"MATCH (n:{label}) WHERE n.speed_samples IS NOT NULL RETURN count(*) AS count" for label in ("Video", "Course")]
+
+
+def reset_peak_rss():
+    # Linux resets the peak RSS (VmHWM) of a process when 5 is written to its clear_refs
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Without /proc the lifetime peak is the best available figure
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _result(scale, step, seconds, rows, peak):
+    return {"users": scale, "step": step, "seconds": round(seconds, 4), "rows": rows,
+            "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None, "peak_rss_mb": round(peak, 1)}
+
+
+class SeedPhaseRecorder:
+    """
+    Session proxy passed to insert_data_into_kg together with the steps from wrap_steps. A step starts when
+    its rows start being built and ends when the next one starts, so each step is charged the time, rows and
+    peak RSS of building and writing its own rows. The first step also includes the scan for referenced ids.
+    """
+
+    def __init__(self, session, scale):
+        self.session = session
+        self.scale = scale
+        self.results = []
+        self.current = None
+        self.rows = 0
+        self.started = None
+
+    def start(self):
+        reset_peak_rss()
+        self.started = time.perf_counter()
+
+    def _finish_step(self):
+        if self.current is not None:
+            now = time.perf_counter()
+            self.results.append(_result(self.scale, f"seed.{self.current}", now - self.started, self.rows, peak_rss_mb()))
+            reset_peak_rss()
+            self.started = now
+        self.rows = 0
+
+    def run(self, query, parameters=None, **kwargs):
+        # Statements outside the seed steps (the change markers) are passed through unmeasured
+        return self.session.run(query, parameters, **kwargs)
+
+    def _start_step(self, name):
+        self._finish_step()
+        self.current = name
+
+    def _timed_rows(self, step):
+        self._start_step(step.name)
+        yield from step.rows()
+
+    def wrap_steps(self, steps):
+        """Returns the SeedSteps with row factories that start the step's clock when they are first read."""
+        return [step._replace(rows=lambda step=step: self._timed_rows(step)) for step in steps]
+
+    def execute_write(self, work, query, batch, **kwargs):
+        result = self.session.execute_write(work, query, batch, **kwargs)
+        self.rows += len(batch)
+        return result
+
+    def finish(self):
+        self._finish_step()
+        self.current = None
+        return self.results
+
+
+def _count(query):
+    return neo4j_client.run_query(query, idempotent=True)[0]["count"]
+
+
+def _measure(scale, step, rows, func):
+    # rows may be a function, called after the measurement (for jobs that report their own row count)
+    reset_peak_rss()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        func()
+    seconds = time.perf_counter() - start
+    return _result(scale, step, seconds, rows() if callable(rows) else rows, peak_rss_mb())
+
+
+def run_reasoning_jobs(scale, snapshot_dir):
+    watched = _count(WATCHED_ROWS)
+    stats_rows = sum(_count(query) for query in STATS_ROWS)
+    with neo4j_client.session() as session:
+        layout = session.execute_read(segment_storage.detect_layout)
+    segment_rows = _count(segment_storage.INTERACTION_COUNT_QUERIES[layout])
+    manifest = {}
+
+    def export():
+        with neo4j_client.session() as session:
+            manifest.update(export_snapshot(session, snapshot_dir))
+
+    def exported():
+        return sum(manifest["nodes"].values()) + sum(rel["edges"] for rel in manifest["relationships"].values())
+
+    jobs = [
+        ("segments_skipped.server", segment_rows, lambda: segments_skipped.main(mode="server")),
+        ("segments_skipped.client", segment_rows, lambda: segments_skipped.main(mode="client")),
+        ("video_speed.vectorized", watched, lambda: video_speed.main(mode="vectorized")),
+        ("video_speed.records", watched, lambda: video_speed.main(mode="records")),
+        ("video_speed.stats", stats_rows, lambda: video_speed.main(mode="stats")),
+        ("graph_snapshot.export", exported, export),
+        ("segments_skipped.snapshot", segment_rows, lambda: segments_skipped.main(snapshot=snapshot_dir)),
+        ("video_speed.snapshot", watched, lambda: video_speed.main(snapshot=snapshot_dir)),
+    ]
+    return [_measure(scale, name, rows, func) for name, rows, func in jobs]
+
+
+def run_scale(scale, backend, generator_options, data_dir, segment_layout=None):
+    results = []
+    reset_peak_rss()
+    start = time.perf_counter()
+    counts = generate_mooc_data(data_dir, users=scale, **generator_options)
+    results.append(_result(scale, "generate", time.perf_counter() - start, sum(counts.values()), peak_rss_mb()))
+
+    if backend == "memory":
+        neo4j_client.set_driver(Driver())
+    else:
+        with neo4j_client.session() as session:
+            if not is_database_empty(session):
+                raise SystemExit("The benchmark needs an empty database; it deletes everything it seeded afterwards.")
+            ensure_schema(session)
+    sources = open_mooc_sources(data_dir)
+    try:
+        with neo4j_client.session() as session:
+            recorder = SeedPhaseRecorder(session, scale)
+            recorder.start()
+            data = (sources["user_video_act"], sources["user"], sources["course"], sources["video"])
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                insert_data_into_kg(recorder, *data, storage=segment_layout,
+                                    steps=recorder.wrap_steps(seed_steps(*data, storage=segment_layout)))
+            results.extend(recorder.finish())
+        results.extend(run_reasoning_jobs(scale, os.path.join(data_dir, "graph_snapshot")))
+    finally:
+        if backend == "neo4j":
+            with neo4j_client.session() as session, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                clear_database(session)
+        else:
+            neo4j_client.set_driver(None)
+    return results
+
+
+def print_header():
+    print(f"{'users':>8}  {'step':<28} {'seconds':>9} {'rows':>10} {'rows/s':>12} {'peak RSS MB':>12}", flush=True)
+
+
+def print_results(results):
+    for r in results:
+        rate = f"{r['rows_per_second']:.0f}" if r["rows_per_second"] is not None else "-"
+        print(f"{r['users']:>8}  {r['step']:<28} {r['seconds']:>9.3f} {r['rows']:>10} {rate:>12} {r['peak_rss_mb']:>12.1f}",
+              flush=True)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark seeding and the reasoning jobs on synthetic MOOC data.")
+    parser.add_argument('--scales', default=",".join(map(str, DEFAULT_SCALES)),
+                        help='Comma-separated numbers of users to generate (default: %(default)s)')
+    parser.add_argument('--backend', choices=['memory', 'neo4j'], default='memory',
+                        help='In-process stand-in (memory) or the Neo4j server from the NEO4J_* settings')
+    parser.add_argument('--json', metavar='PATH', help='Also write the results as JSON')
+    parser.add_argument('--keep-data', metavar='DIR', help='Keep the generated data in DIR/users_<n> instead of a temporary folder')
+    parser.add_argument('--segment-storage', choices=segment_storage.LAYOUTS, default=segment_storage.SEGMENT_STORAGE,
+                        help='Segment layout to seed (default: SEGMENT_STORAGE or nodes, see segment_storage.py)')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    generator_options = {k: getattr(args, k) for k in ('courses', 'videos_per_course', 'segments_per_video',
+                                                        'activities_per_user', 'courses_per_user', 'seed',
+                                                        'data_format')}
+
+    results = []
+    print_header()
+    for scale in (int(s) for s in args.scales.split(",") if s.strip()):
+        data_dir = os.path.join(args.keep_data, f"users_{scale}") if args.keep_data else tempfile.mkdtemp(prefix="mooc_bench_")
+        try:
+            scale_results = run_scale(scale, args.backend, generator_options, data_dir, args.segment_storage)
+        finally:
+            if not args.keep_data:
+                shutil.rmtree(data_dir, ignore_errors=True)
+        print_results(scale_results)
+        results.extend(scale_results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "segment_storage": args.segment_storage, "generator": generator_options,
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Make the shared top-level modules importable when run from the repository checkout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mooc_data import MOOC_FORMATS, write_mooc_file
+
+# Generates MOOC-shaped user.json, course.json, video.json and user_video_act.json at any scale, with the
+# record layout of the real dataset and its skew: course popularity follows a Zipf law, activity per user is
+# log-normal, viewers drop off towards the end of a course, watched ranges start late or stop early, and
+# most playback speeds cluster around 1x with tails at 0.75x, 1.5x and 2x.
+#
+# Output is deterministic for a given seed. Users are streamed to disk; only the course catalog is kept in memory.
+DEFAULT_USERS = 1000
+DEFAULT_COURSES = 50
+DEFAULT_VIDEOS_PER_COURSE = 40
+DEFAULT_SEGMENTS_PER_VIDEO = 20
+DEFAULT_ACTIVITIES_PER_USER = 60
+DEFAULT_COURSES_PER_USER = 4
+
+# Exponent of the Zipf law over course ranks
+COURSE_POPULARITY_SKEW = 1.1
+# Spread of the log-normal number of activities per user
+ACTIVITY_SIGMA = 1.0
+PLAYBACK_SPEEDS = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0)
+PLAYBACK_SPEED_WEIGHTS = (2, 8, 45, 15, 20, 10)
+
+_SYLLABLES = ("Li", "Wang", "Zhang", "Liu", "Chen", "Yang", "Zhao", "Huang", "Zhou", "Wu", "Xu", "Sun", "Ma",
+              "Zhu", "Hu", "Guo", "He", "Lin", "Qi", "Fei", "Jing", "Wen", "Hua", "Ming", "Xue", "Yu", "Zhong")
+_WORDS = ("the", "of", "and", "we", "this", "model", "data", "function", "system", "energy", "history",
+          "theory", "example", "method", "value", "structure", "process", "result", "course", "question")
+_START_DATE = datetime(2018, 1, 1)
+
+
+def _name(rng, words=3):
+    return " ".join(rng.choice(_SYLLABLES) for _ in range(words))
+
+
+def _timestamp(moment):
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def build_catalog(courses, videos_per_course, segments_per_video, seed=0):
+    """
+    Returns a list of courses, each a dict with the course record under "record" and its videos as
+    (video id, segment ends) pairs under "videos"; every course gets its own videos.
+    """
+    rng = random.Random(seed)
+    catalog = []
+    for c in range(courses):
+        course_id = f"C_course-v1:SynthX+{c:08d}+sp"
+        n_videos = max(1, int(videos_per_course * rng.uniform(0.5, 1.5)))
+        videos = []
+        for _ in range(n_videos):
+            n_segments = max(1, int(segments_per_video * rng.uniform(0.5, 1.5)))
+            ends = []
+            end = 0.0
+            for _ in range(n_segments):
+                end = round(end + rng.uniform(4.0, 20.0), 2)
+                ends.append(end)
+            videos.append((f"V_{rng.getrandbits(128):032x}", ends))
+        record = {
+            "id": course_id,
+            "name": _name(rng, 4),
+            "prerequisites": "Wu",
+            "about": " ".join(rng.choice(_WORDS) for _ in range(60)),
+            "core_id": course_id,
+            "video_order": [video_id for video_id, _ in videos],
+            "display_name": [_name(rng, 5) for _ in videos],
+            "chapter": [f"{1 + i // 10:02d}.{1 + i % 10:02d}.01.01" for i in range(len(videos))],
+        }
+        catalog.append({"record": record, "videos": videos})
+    return catalog
+
+
+def video_records(catalog, seed=0):
+    rng = random.Random(seed + 1)
+    for course in catalog:
+        for video_id, ends in course["videos"]:
+            starts = [0.0] + ends[:-1]
+            yield {
+                "id": video_id,
+                "name": _name(rng, 4),
+                "start": starts,
+                "end": ends,
+                "text": [" ".join(rng.choice(_WORDS) for _ in range(8)) for _ in ends],
+            }
+
+
+def _course_weights(n_courses):
+    # Cumulative Zipf weights over course ranks, for random.choices(cum_weights=...)
+    weights = []
+    total = 0.0
+    for rank in range(1, n_courses + 1):
+        total += 1 / rank ** COURSE_POPULARITY_SKEW
+        weights.append(total)
+    return weights
+
+
+def _enrollments(rng, course_weights, courses_per_user):
+    """Distinct course indexes of one user, drawn by popularity."""
+    n_courses = len(course_weights)
+    count = min(n_courses, 1 + int(rng.expovariate(1 / max(courses_per_user - 1, 1e-9))))
+    chosen = []
+    while len(chosen) < count:
+        course = rng.choices(range(n_courses), cum_weights=course_weights)[0]
+        if course not in chosen:
+            chosen.append(course)
+    return chosen
+
+
+def _user_rng(seed, user, stream):
+    # Independent, reproducible random stream per user, so user.json and user_video_act.json can be
+    # written in separate passes without holding the users in memory
+    return random.Random((seed * 1_000_003 + user) * 4 + stream)
+
+
+def _user_courses(seed, user, course_weights, courses_per_user):
+    rng = _user_rng(seed, user, 0)
+    courses = _enrollments(rng, course_weights, courses_per_user)
+    enrolled = [_START_DATE + timedelta(seconds=rng.uniform(0, 540 * 86400)) for _ in courses]
+    return rng, courses, enrolled
+
+
+def user_records(catalog, users, courses_per_user, seed=0):
+    course_weights = _course_weights(len(catalog))
+    for u in range(users):
+        rng, courses, enrolled = _user_courses(seed, u, course_weights, courses_per_user)
+        yield {
+            "id": f"U_{u + 1:07d}",
+            "name": _name(rng),
+            "course_order": [catalog[c]["record"]["id"] for c in courses],
+            "enroll_time": [_timestamp(t) for t in enrolled],
+        }
+
+
+def _activity(rng, course_id, video_id, ends, enrolled):
+    duration = ends[-1]
+    # Most viewers start at the beginning; the others jump in, and many stop early
+    start = 0.0 if rng.random() < 0.6 else rng.uniform(0, duration * 0.5)
+    end = min(duration, start + duration * rng.uniform(0.2, 1.0))
+    speed = rng.choices(PLAYBACK_SPEEDS, weights=PLAYBACK_SPEED_WEIGHTS)[0] * rng.uniform(0.97, 1.03)
+    progress = end - start
+    watching_time = max(1, int(progress / speed))
+    local_start = enrolled + timedelta(seconds=rng.uniform(0, 120 * 86400))
+    return {
+        "course_id": course_id,
+        "video_id": video_id,
+        "watching_count": 1 + int(rng.expovariate(0.5)),
+        "video_duration": duration,
+        "local_watching_time": watching_time,
+        "video_progress_time": progress,
+        "video_start_time": round(start, 2),
+        "video_end_time": round(end, 2),
+        "local_start_time": _timestamp(local_start),
+        "local_end_time": _timestamp(local_start + timedelta(seconds=watching_time)),
+    }
+
+
+def user_video_act_records(catalog, users, courses_per_user, activities_per_user, seed=0):
+    course_weights = _course_weights(len(catalog))
+    mu = math.log(activities_per_user) - ACTIVITY_SIGMA ** 2 / 2
+    for u in range(users):
+        _, courses, enrolled = _user_courses(seed, u, course_weights, courses_per_user)
+        rng = _user_rng(seed, u, 1)
+        activity = []
+        for _ in range(max(1, int(rng.lognormvariate(mu, ACTIVITY_SIGMA)))):
+            k = rng.randrange(len(courses))
+            course = catalog[courses[k]]
+            videos = course["videos"]
+            # Viewers drop off: early videos of a course are watched far more often than late ones
+            video_id, ends = videos[int(len(videos) * rng.random() ** 2)]
+            activity.append(_activity(rng, course["record"]["id"], video_id, ends, enrolled[k]))
+        yield {"id": f"U_{u + 1:07d}", "activity": activity}
+
+
+def generate_mooc_data(out_dir, users=DEFAULT_USERS, courses=DEFAULT_COURSES,
+                       videos_per_course=DEFAULT_VIDEOS_PER_COURSE, segments_per_video=DEFAULT_SEGMENTS_PER_VIDEO,
+                       activities_per_user=DEFAULT_ACTIVITIES_PER_USER, courses_per_user=DEFAULT_COURSES_PER_USER,
+                       seed=0, data_format="json"):
+    """
+    Writes the four MOOC files to out_dir in data_format ("json" or "columnar", see mooc_data).
+    Returns the number of records written per file name.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    catalog = build_catalog(courses, videos_per_course, segments_per_video, seed)
+    counts = {
+        "course": write_mooc_file(out_dir, "course", (c["record"] for c in catalog), data_format),
+        "video": write_mooc_file(out_dir, "video", video_records(catalog, seed), data_format),
+        "user": write_mooc_file(out_dir, "user", user_records(catalog, users, courses_per_user, seed), data_format),
+        "user_video_act": write_mooc_file(
+            out_dir, "user_video_act",
+            user_video_act_records(catalog, users, courses_per_user, activities_per_user, seed), data_format,
+        ),
+    }
+    return counts
+
+
+def add_generator_arguments(parser):
+    parser.add_argument('--courses', type=int, default=DEFAULT_COURSES)
+    parser.add_argument('--videos-per-course', type=int, default=DEFAULT_VIDEOS_PER_COURSE)
+    parser.add_argument('--segments-per-video', type=int, default=DEFAULT_SEGMENTS_PER_VIDEO)
+    parser.add_argument('--activities-per-user', type=int, default=DEFAULT_ACTIVITIES_PER_USER,
+                        help='Mean number of activity records per user (log-normal)')
+    parser.add_argument('--courses-per-user', type=int, default=DEFAULT_COURSES_PER_USER,
+                        help='Mean number of courses a user enrolls in')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', dest='data_format', choices=sorted(MOOC_FORMATS), default='json',
+                        help='On-disk format of the generated files (default: %(default)s)')
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate synthetic MOOC data files at a given scale.")
+    parser.add_argument('--out', default='data/synthetic', help='Output folder (use it as DATA_FOLDER for seeding)')
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS)
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    counts = generate_mooc_data(args.out, users=args.users, courses=args.courses,
+                                videos_per_course=args.videos_per_course, segments_per_video=args.segments_per_video,
+                                activities_per_user=args.activities_per_user, courses_per_user=args.courses_per_user,
+                                seed=args.seed, data_format=args.data_format)
+    print(", ".join(f"{n} {name} records" for name, n in counts.items()) +
+          f" written to {args.out} in {time.perf_counter() - start:.1f}s")
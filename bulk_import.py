@@ -0,0 +1,295 @@
+import csv
+import os
+import shutil
+import subprocess
+from dotenv import load_dotenv
+from neo4j_utils import (
+    referenced_ids, select_records, user_rows, course_rows, enrollment_rows,
+    video_rows, segment_rows, segment_list_rows, transcript_rows, part_of_rows, watched_rows,
+    video_stats_rows, course_stats_rows,
+)
+from mooc_data import open_mooc_sources
+import segment_storage
+
+# Export the MOOC JSON files as neo4j-admin import CSVs for a cold start on an empty database.
+# The CSVs contain the same nodes, relationships and properties insert_data_into_kg writes.
+load_dotenv()
+
+BULK_IMPORT_DIR = os.getenv("BULK_IMPORT_DIR", "data/bulk_import")
+NEO4J_ADMIN = os.getenv("NEO4J_ADMIN", "neo4j-admin")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+ARRAY_DELIMITER = ";"
+
+
+# --- Header type inference ---
+def _value_type(value):
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "long"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, (list, tuple)):
+        element_types = {_value_type(v) for v in value if v is not None}
+        return (_merge_types(element_types) if element_types else "string") + "[]"
+    return "string"
+
+
+def _merge_types(types):
+    if len(types) == 1:
+        return next(iter(types))
+    if types <= {"long", "double"}:
+        return "double"
+    if types <= {"long[]", "double[]"}:
+        return "double[]"
+    if all(t.endswith("[]") for t in types):
+        return "string[]"
+    return "string"
+
+
+# Returns {property: neo4j-admin type} for all non-null values seen in the property maps
+def infer_property_types(property_maps):
+    seen = {}
+    for props in property_maps:
+        for key, value in props.items():
+            if value is None:
+                continue
+            types = seen.setdefault(key, set())
+            # An empty list fits any array type
+            if not (isinstance(value, (list, tuple)) and not value):
+                types.add(_value_type(value))
+    return {key: _merge_types(types) if types else "string[]" for key, types in sorted(seen.items())}
+
+
+def _format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple)):
+        return ARRAY_DELIMITER.join(_format_value(v) for v in value)
+    if isinstance(value, float) and value != value:
+        return "NaN"
+    return str(value)
+
+
+def _property_header(types):
+    return [key if t == "string" else f"{key}:{t}" for key, t in types.items()]
+
+
+# --- CSV writers ---
+def _write_csv(path, id_header, rows, to_ids, to_props, trailer_header, trailer_value):
+    """
+    Writes one node or relationship CSV. `rows` must be re-iterable: one pass infers the property
+    types for the header, the second writes the data.
+    """
+    types = infer_property_types(to_props(row) for row in rows)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(id_header + _property_header(types) + [trailer_header])
+        for row in rows:
+            props = to_props(row)
+            writer.writerow(to_ids(row) + [_format_value(props.get(key)) for key in types] + [trailer_value])
+            count += 1
+    return count
+
+
+def _write_nodes(path, label, rows):
+    return _write_csv(
+        path, [f"id:ID({label})"], rows,
+        lambda row: [row["id"]], lambda row: row["props"],
+        ":LABEL", label,
+    )
+
+
+def _write_relationships(path, rel_type, start_label, end_label, start_key, end_key, rows):
+    return _write_csv(
+        path, [f":START_ID({start_label})", f":END_ID({end_label})"], rows,
+        lambda row: [row[start_key], row[end_key]],
+        lambda row: {k: v for k, v in row.items() if k not in (start_key, end_key)},
+        ":TYPE", rel_type,
+    )
+
+
+class _Rows:
+    """Re-iterable wrapper so a generator pipeline can be streamed once per pass."""
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def __iter__(self):
+        return iter(self.factory())
+
+
+def _first_by_key(rows, key):
+    # Source ids are unique; guard against repeats while keeping only the keys in memory
+    seen = set()
+    for row in rows:
+        k = key(row)
+        if k not in seen:
+            seen.add(k)
+            yield row
+
+
+def export_import_csvs(output_dir, user_video_act_data, user_data, course_data, video_data, storage=None):
+    """
+    Writes header-typed node and relationship CSVs for `neo4j-admin database import full` into output_dir.
+    The data arguments may be lists or re-iterable streaming sources. storage is the segment layout
+    (default SEGMENT_STORAGE, see segment_storage.py).
+    Returns a dict with the written "nodes" and "relationships" file paths and the row count per file.
+    """
+    storage = segment_storage.check_layout(storage or segment_storage.SEGMENT_STORAGE)
+    os.makedirs(output_dir, exist_ok=True)
+    user_ids, course_ids, video_ids = referenced_ids(user_video_act_data)
+
+    # Node ids that actually exist in the source files; relationships to anything else are dropped,
+    # exactly like the MATCH clauses of the transactional loader do
+    existing_users = {u["id"] for u in select_records(user_data, user_ids)}
+    existing_videos = {v["id"] for v in select_records(video_data, video_ids)}
+    listed_courses = {c["id"] for c in select_records(course_data, course_ids)}
+    # Viewing statistics (see viewing_stats.py) become properties of the video and course nodes
+    video_stats = {r["id"]: r["props"] for r in video_stats_rows(user_video_act_data, existing_users, existing_videos)}
+    course_stats = {r["id"]: r["props"] for r in course_stats_rows(
+        user_video_act_data, select_records(course_data, course_ids), existing_users, existing_videos)}
+
+    def users():
+        return _first_by_key(user_rows(select_records(user_data, user_ids)), lambda r: r["id"])
+
+    def courses():
+        for row in _first_by_key(course_rows(select_records(course_data, course_ids)), lambda r: r["id"]):
+            row["props"].update(course_stats.get(row["id"], {}))
+            yield row
+        # ENROLLED_IN merges bare Course nodes for courses missing from course.json
+        extra = set()
+        for row in enrollment_rows(select_records(user_data, user_ids)):
+            if row["course_id"] not in listed_courses and row["course_id"] not in extra:
+                extra.add(row["course_id"])
+                yield {"id": row["course_id"], "props": {}}
+
+    def video_nodes():
+        for video in select_records(video_data, video_ids):
+            row = next(video_rows([video]))
+            row["props"].update(video_stats.get(row["id"], {}))
+            # Compact layout: the segment bounds become float list properties of the video
+            lists = next(segment_list_rows([video]), None) if storage == "compact" else None
+            if lists is not None:
+                row["props"].update(segment_start=lists["start"], segment_end=lists["end"])
+            yield row
+
+    def videos():
+        return _first_by_key(video_nodes(), lambda r: r["id"])
+
+    def transcripts():
+        for row in _first_by_key(transcript_rows(select_records(video_data, video_ids)), lambda r: r["video_id"]):
+            # A delimiter inside a text would split it and shift every later segment of the transcript
+            if any(ARRAY_DELIMITER in text for text in row["text"]):
+                raise ValueError(f"A transcript text of video {row['video_id']} contains the array delimiter "
+                                 f"{ARRAY_DELIMITER!r}; use SEGMENT_TEXT=none or the nodes segment storage")
+            yield {"id": row["video_id"], "props": {"text": row["text"]}}
+
+    def has_transcript():
+        for row in transcripts():
+            yield {"video_id": row["id"], "transcript_id": row["id"]}
+
+    def segments():
+        for row in _first_by_key(segment_rows(select_records(video_data, video_ids)), lambda r: r["segment_id"]):
+            yield {"id": row["segment_id"], "video_id": row["video_id"],
+                   "props": {k: row[k] for k in ("segment_index", "start", "end", "text")}}
+
+    def enrollments():
+        return enrollment_rows(select_records(user_data, user_ids))
+
+    def has_segment():
+        for row in segments():
+            yield {"video_id": row["video_id"], "segment_id": row["id"]}
+
+    def part_of():
+        rows = part_of_rows(select_records(course_data, course_ids), existing_videos)
+        return _first_by_key(rows, lambda r: (r["video_id"], r["course_id"], r["video_order"]))
+
+    def watched():
+        return (r for r in watched_rows(user_video_act_data)
+                if r["user_id"] in existing_users and r["video_id"] in existing_videos)
+
+    files = {"nodes": [], "relationships": [], "counts": {}}
+
+    def node_file(name, label, factory):
+        path = os.path.join(output_dir, name)
+        files["counts"][name] = _write_nodes(path, label, _Rows(factory))
+        files["nodes"].append(path)
+
+    def rel_file(name, rel_type, start_label, end_label, start_key, end_key, factory):
+        path = os.path.join(output_dir, name)
+        files["counts"][name] = _write_relationships(
+            path, rel_type, start_label, end_label, start_key, end_key, _Rows(factory))
+        files["relationships"].append(path)
+
+    print("Export users, courses, videos and segments", flush=True)
+    node_file("users.csv", "User", users)
+    node_file("courses.csv", "Course", courses)
+    node_file("videos.csv", "Video", videos)
+    if storage == "nodes":
+        node_file("segments.csv", "Segment",
+                  lambda: ({"id": r["id"], "props": r["props"]} for r in segments()))
+    elif segment_storage.SEGMENT_TEXT == "transcript":
+        node_file("transcripts.csv", "Transcript", transcripts)
+
+    print("Export relationships", flush=True)
+    rel_file("enrolled_in.csv", "ENROLLED_IN", "User", "Course", "user_id", "course_id", enrollments)
+    if storage == "nodes":
+        rel_file("has_segment.csv", "HAS_SEGMENT", "Video", "Segment", "video_id", "segment_id", has_segment)
+    elif segment_storage.SEGMENT_TEXT == "transcript":
+        rel_file("has_transcript.csv", "HAS_TRANSCRIPT", "Video", "Transcript", "video_id", "transcript_id",
+                 has_transcript)
+    rel_file("part_of.csv", "PART_OF", "Video", "Course", "video_id", "course_id", part_of)
+    rel_file("watched.csv", "WATCHED", "User", "Video", "user_id", "video_id", watched)
+    return files
+
+
+def import_command(files, database=NEO4J_DATABASE, admin=NEO4J_ADMIN):
+    """Returns the neo4j-admin command line that imports the exported CSVs into `database`."""
+    command = [
+        admin, "database", "import", "full", database,
+        "--overwrite-destination=true",
+        "--multiline-fields=true",
+        f"--array-delimiter={ARRAY_DELIMITER}",
+    ]
+    command += [f"--nodes={path}" for path in files["nodes"]]
+    command += [f"--relationships={path}" for path in files["relationships"]]
+    return command
+
+
+# Returns the path of the neo4j-admin executable, or None if it is not available on this machine
+def find_neo4j_admin(admin=NEO4J_ADMIN):
+    return shutil.which(admin)
+
+
+def run_bulk_import(files, database=NEO4J_DATABASE, admin=NEO4J_ADMIN):
+    """
+    Runs neo4j-admin import for the exported CSVs. The target database must be stopped (on Community
+    edition this means the server is not running). Returns True on success.
+    """
+    command = import_command(files, database=database, admin=admin)
+    print("Running: " + " ".join(command), flush=True)
+    completed = subprocess.run(command)
+    return completed.returncode == 0
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export MOOC data as neo4j-admin import CSVs.")
+    parser.add_argument('--data-folder', default=os.getenv("DATA_FOLDER", "data/data_subset"), help='Folder with the MOOC JSON files')
+    parser.add_argument('--output', default=BULK_IMPORT_DIR, help='Folder to write the CSV files to')
+    parser.add_argument('--limit', type=int, default=int(os.getenv("USER_VIDEO_ACT_LIMIT", "0")), help='Only export the first N user_video_act records')
+    parser.add_argument('--segment-storage', choices=segment_storage.LAYOUTS, default=segment_storage.SEGMENT_STORAGE, help='Segment layout to export (default: SEGMENT_STORAGE or nodes)')
+    parser.add_argument('--run', action='store_true', help='Run neo4j-admin import after exporting (the database must be stopped)')
+    args = parser.parse_args()
+    sources = open_mooc_sources(args.data_folder, user_video_act_limit=args.limit)
+    exported = export_import_csvs(args.output, sources["user_video_act"], sources["user"], sources["course"], sources["video"],
+                                  args.segment_storage)
+    for name, count in exported["counts"].items():
+        print(f"{name}: {count} rows")
+    if args.run:
+        raise SystemExit(0 if run_bulk_import(exported) else 1)
+    print("Import with: " + " ".join(import_command(exported)))
@@ -1,51 +1,170 @@
+import heapq
 import os
-import json
+import random
+import sys
+from collections import Counter, defaultdict
 from dotenv import load_dotenv
 
+# Make the shared top-level modules importable when run from the repository checkout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from mooc_data import MOOC_FORMATS, mooc_path, open_mooc_source, write_mooc_file
+
 # Run this function to generate a proper data subset of all mooc data
 load_dotenv()
 
 USER_VIDEO_ACT_LIMIT = int(os.getenv("USER_VIDEO_ACT_LIMIT", "100"))
-print("USER_VIDEO_ACT_LIMIT:", USER_VIDEO_ACT_LIMIT)
+# Format of the written subset files: json or columnar (see mooc_data); the input may be in either format
+SUBSET_FORMAT = os.getenv("SUBSET_FORMAT", "json").strip().lower()
+# Which users to keep (see SAMPLING_MODES) and the seed of the random modes
+SUBSET_MODE = os.getenv("SUBSET_MODE", "first").strip().lower()
+SUBSET_SEED = int(os.getenv("SUBSET_SEED", "0"))
 MOOC_DIR = os.path.join(os.path.dirname(__file__), "../mooc")
 SUBSET_DIR = os.path.dirname(__file__)
 
-# Load mooc data
-with open(os.path.join(MOOC_DIR, "user_video_act.json"), "r", encoding="utf-8") as f:
-    user_video_act_data = json.load(f)
-with open(os.path.join(MOOC_DIR, "user.json"), "r", encoding="utf-8") as f:
-    user_data = json.load(f)
-with open(os.path.join(MOOC_DIR, "course.json"), "r", encoding="utf-8") as f:
-    course_data = json.load(f)
-with open(os.path.join(MOOC_DIR, "video.json"), "r", encoding="utf-8") as f:
-    video_data = json.load(f)
-
-# Limit user_video_act_data
-user_video_act_subset = user_video_act_data[:USER_VIDEO_ACT_LIMIT]
-
-# Find referenced user, course, and video ids
-user_ids = set(user['id'] for user in user_video_act_subset)
-course_ids = set()
-video_ids = set()
-for user in user_video_act_subset:
-    for act in user.get('activity', []):
-        if 'course_id' in act:
-            course_ids.add(act['course_id'])
-        if 'video_id' in act:
-            video_ids.add(act['video_id'])
-
-user_subset = [u for u in user_data if u['id'] in user_ids]
-course_subset = [c for c in course_data if c['id'] in course_ids]
-video_subset = [v for v in video_data if v['id'] in video_ids]
-
-# Write subset files
-with open(os.path.join(SUBSET_DIR, "user_video_act.json"), "w", encoding="utf-8") as f:
-    json.dump(user_video_act_subset, f, ensure_ascii=False, indent=2)
-with open(os.path.join(SUBSET_DIR, "user.json"), "w", encoding="utf-8") as f:
-    json.dump(user_subset, f, ensure_ascii=False, indent=2)
-with open(os.path.join(SUBSET_DIR, "course.json"), "w", encoding="utf-8") as f:
-    json.dump(course_subset, f, ensure_ascii=False, indent=2)
-with open(os.path.join(SUBSET_DIR, "video.json"), "w", encoding="utf-8") as f:
-    json.dump(video_subset, f, ensure_ascii=False, indent=2)
-
-print(f"Subset files written to {SUBSET_DIR}")
+# first:      the first `limit` users of user_video_act
+# random:     `limit` users drawn uniformly (reservoir sampling, reproducible by seed)
+# stratified: `limit` users drawn per course, in proportion to the number of users whose main course it is
+# window:     users with activity whose local_start_time lies in [start, end); their activity is cut to the window
+# top:        the `limit` users with the most activity records
+SAMPLING_MODES = ("first", "random", "stratified", "window", "top")
+
+
+def main_course(activity):
+    """The course a user has the most activity records in (the first one seen on ties), or None."""
+    courses = Counter(act.get('course_id') for act in activity or () if act.get('course_id') is not None)
+    return max(courses, key=courses.get) if courses else None
+
+
+# The selectors below scan a single field of user_video_act (the columnar format decodes only that field)
+# and return the positions of the chosen records; only positions are kept in memory.
+def select_random(source, limit, rng):
+    reservoir = []
+    for i, _ in enumerate(source.column('id')):
+        if i < limit:
+            reservoir.append(i)
+        else:
+            j = rng.randrange(i + 1)
+            if j < limit:
+                reservoir[j] = i
+    return set(reservoir)
+
+
+def select_stratified(source, limit, rng):
+    # One reservoir per course, each large enough for the course's share, so any allocation can be served
+    reservoirs = defaultdict(list)
+    seen = Counter()
+    for i, activity in enumerate(source.column('activity')):
+        course = main_course(activity)
+        seen[course] += 1
+        if len(reservoirs[course]) < limit:
+            reservoirs[course].append(i)
+        else:
+            j = rng.randrange(seen[course])
+            if j < limit:
+                reservoirs[course][j] = i
+    total = sum(seen.values())
+    if not total:
+        return set()
+    # Largest remainder allocation of min(limit, total) users over the courses
+    shares = {course: min(limit, total) * n / total for course, n in seen.items()}
+    quotas = {course: int(share) for course, share in shares.items()}
+    by_remainder = sorted(shares, key=lambda course: shares[course] - quotas[course], reverse=True)
+    for course in by_remainder[:min(limit, total) - sum(quotas.values())]:
+        quotas[course] += 1
+    return {i for course, quota in quotas.items() for i in rng.sample(reservoirs[course], quota)}
+
+
+def select_top(source, limit, rng=None):
+    ranked = heapq.nlargest(limit, ((len(activity or ()), -i) for i, activity in enumerate(source.column('activity'))))
+    return {-negative for _, negative in ranked}
+
+
+SELECTORS = {"random": select_random, "stratified": select_stratified, "top": select_top}
+
+
+def in_window(act, start=None, end=None):
+    time = act.get('local_start_time')
+    return time is not None and (start is None or time >= start) and (end is None or time < end)
+
+
+def sample_users(source, mode="first", limit=USER_VIDEO_ACT_LIMIT, seed=SUBSET_SEED, start=None, end=None):
+    """
+    Yields the user_video_act records chosen by mode (see SAMPLING_MODES). limit <= 0 keeps every user in the
+    first and window modes. first and window decide per record in a single pass; the other modes scan one field
+    to choose positions and then stream the chosen records.
+    """
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode {mode!r}; expected one of {', '.join(SAMPLING_MODES)}")
+    if mode == "first":
+        yield from source.records(0, limit if limit > 0 else None)
+        return
+    if mode == "window":
+        kept = 0
+        for user in source:
+            activity = [act for act in user.get('activity', []) if in_window(act, start, end)]
+            if activity:
+                yield {**user, 'activity': activity}
+                kept += 1
+                if kept == limit:
+                    return
+        return
+    if limit <= 0:
+        raise ValueError(f"The {mode} sampling mode needs a positive limit")
+    selected = SELECTORS[mode](source, limit, random.Random(seed))
+    last = max(selected, default=-1)
+    for i, user in enumerate(source.records(0, last + 1)):
+        if i in selected:
+            yield user
+
+
+def create_data_subset(mooc_dir=MOOC_DIR, subset_dir=SUBSET_DIR, limit=USER_VIDEO_ACT_LIMIT, data_format=SUBSET_FORMAT,
+                       mode=SUBSET_MODE, seed=SUBSET_SEED, start=None, end=None):
+    """
+    Streams the user_video_act records chosen by mode (see sample_users) and every user, course and video they
+    reference from mooc_dir into subset_dir, written in data_format. Each of the user, course and video files is
+    read once, and only the referenced id sets are kept in memory. Returns the number of records written per file.
+    """
+    if data_format not in MOOC_FORMATS:
+        raise ValueError(f"Unknown SUBSET_FORMAT {data_format!r}; expected one of {', '.join(MOOC_FORMATS)}")
+    user_ids = set()
+    course_ids = set()
+    video_ids = set()
+
+    # Find referenced user, course, and video ids while writing the sampled user_video_act records
+    def user_video_act_subset():
+        source = open_mooc_source(mooc_path(mooc_dir, "user_video_act"))
+        for user in sample_users(source, mode, limit, seed, start, end):
+            user_ids.add(user['id'])
+            for act in user.get('activity', []):
+                if 'course_id' in act:
+                    course_ids.add(act['course_id'])
+                if 'video_id' in act:
+                    video_ids.add(act['video_id'])
+            yield user
+
+    counts = {"user_video_act": write_mooc_file(subset_dir, "user_video_act", user_video_act_subset(), data_format)}
+
+    # Write subset files
+    for name, ids in (("user", user_ids), ("course", course_ids), ("video", video_ids)):
+        records = open_mooc_source(mooc_path(mooc_dir, name))
+        counts[name] = write_mooc_file(subset_dir, name, (record for record in records if record['id'] in ids),
+                                       data_format)
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Write a subset of the MOOC data with every referenced user, course and video.")
+    parser.add_argument('--mode', choices=SAMPLING_MODES, default=SUBSET_MODE, help='How users are chosen (default: SUBSET_MODE or first)')
+    parser.add_argument('--limit', type=int, default=USER_VIDEO_ACT_LIMIT, help='Number of users (default: USER_VIDEO_ACT_LIMIT)')
+    parser.add_argument('--seed', type=int, default=SUBSET_SEED, help='Seed of the random and stratified modes')
+    parser.add_argument('--start', help='window mode: earliest local_start_time kept, e.g. 2019-01-01')
+    parser.add_argument('--end', help='window mode: local_start_time before which activity is kept')
+    parser.add_argument('--mooc-dir', default=MOOC_DIR, help='Folder with the full data (default: data/mooc)')
+    parser.add_argument('--out', default=SUBSET_DIR, help='Output folder (default: this folder)')
+    parser.add_argument('--format', choices=sorted(MOOC_FORMATS), default=SUBSET_FORMAT, help='Output format (default: SUBSET_FORMAT or json)')
+    args = parser.parse_args()
+    print(f"Sampling mode: {args.mode}, USER_VIDEO_ACT_LIMIT: {args.limit}")
+    os.makedirs(args.out, exist_ok=True)
+    counts = create_data_subset(args.mooc_dir, args.out, args.limit, args.format, args.mode, args.seed, args.start, args.end)
+    print(", ".join(f"{n} {name} records" for name, n in counts.items()) + f" written to {args.out}")
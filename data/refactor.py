@@ -1,59 +1,170 @@
 import json
 import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from typing import Optional
 from pypinyin import lazy_pinyin
 
-def convert_to_json_array(input_path: str, output_path: Optional[str] = None, translate_names: bool = True):
+# Make the shared top-level modules importable when run from the repository checkout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mooc_data import MOOC_FORMATS, write_columnar
+
+# Distinct strings whose pinyin is kept per process; school and course names repeat across many records
+PINYIN_CACHE_SIZE = int(os.getenv("PINYIN_CACHE_SIZE", "65536"))
+# Input lines handed to a worker at a time
+CHUNK_SIZE = 2000
+
+_CHINESE_CHAR = re.compile(r'[\u4e00-\u9fff]')
+
+
+def is_chinese(text):
+    if not isinstance(text, str) or not text.strip():
+        return False
+    # Consider as Chinese if >70% of non-space chars are Chinese
+    chinese_chars = len(_CHINESE_CHAR.findall(text))
+    return chinese_chars / max(1, len(text.replace(' ', ''))) > 0.7
+
+
+@lru_cache(maxsize=PINYIN_CACHE_SIZE)
+def to_pinyin(text):
+    return ' '.join([s.capitalize() for s in lazy_pinyin(text)])
+
+
+def _convert_lines(lines, translate_names=True, indent=None, serialize=True):
     """
-    Converts a file with newline-separated JSON objects to a valid JSON array file.
-    Optionally translates Chinese names to pinyin.
-    Args:
-        input_path: Path to the input file.
-        output_path: Path to write the output file. If None, overwrites input file.
-        translate_names: If True, convert Chinese names to pinyin.
+    Parses a chunk of newline-separated JSON objects, translates Chinese values and serializes them again
+    (or returns the objects when serialize is False). Returns (records, errors) in input order; runs in the worker processes.
     """
-    with open(input_path, 'r', encoding='utf-8') as f:
-        lines = [line.strip() for line in f if line.strip() and not line.strip() in ['[', ']']]
-    objs = []
-    import re
-    def is_chinese(text):
-        if not isinstance(text, str) or not text.strip():
-            return False
-        # Count Chinese characters
-        chinese_chars = re.findall(r'[\u4e00-\u9fff]', text)
-        # Consider as Chinese if >70% of non-space chars are Chinese
-        return len(chinese_chars) / max(1, len(text.replace(' ',''))) > 0.7
-
+    records = []
+    errors = []
+    separators = None if indent else (',', ':')
     for line in lines:
         try:
             obj = json.loads(line.rstrip(','))
             if translate_names:
                 for k, v in obj.items():
                     if isinstance(v, str) and is_chinese(v):
-                        obj[k] = ' '.join([s.capitalize() for s in lazy_pinyin(v)])
-            objs.append(obj)
+                        obj[k] = to_pinyin(v)
+            records.append(json.dumps(obj, ensure_ascii=False, indent=indent, separators=separators) if serialize else obj)
         except Exception as e:
-            print(f"Skipping line due to error: {e}\n{line}")
+            errors.append(f"Skipping line due to error: {e}\n{line}")
+    return records, errors
+
+
+def _line_chunks(f, chunk_size):
+    chunk = []
+    for line in f:
+        line = line.strip()
+        if line and line not in ('[', ']'):
+            chunk.append(line)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _converted_chunks(chunks, translate_names, indent, workers, serialize=True):
+    """Yields the converted chunks in input order, with at most two chunks per worker in flight."""
+    if workers <= 1:
+        for chunk in chunks:
+            yield _convert_lines(chunk, translate_names, indent, serialize)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_convert_lines, chunk, translate_names, indent, serialize))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def convert_to_json_array(input_path: str, output_path: Optional[str] = None, translate_names: bool = True,
+                          workers: int = 1, chunk_size: int = CHUNK_SIZE, indent: Optional[int] = None):
+    """
+    Converts a file with newline-separated JSON objects to a valid JSON array file.
+    Optionally translates Chinese names to pinyin.
+    The input is streamed in chunks of lines, so memory stays bounded; with workers > 1 the chunks are
+    converted in a process pool and written in input order.
+    Args:
+        input_path: Path to the input file.
+        output_path: Path to write the output file. If None, overwrites input file.
+        translate_names: If True, convert Chinese names to pinyin.
+        workers: Number of worker processes (1 converts in this process).
+        chunk_size: Number of lines sent to a worker at a time.
+        indent: Indentation of every record; None writes one compact record per line.
+    """
     out_path = output_path or input_path
-    with open(out_path, 'w', encoding='utf-8') as f:
-        json.dump(objs, f, ensure_ascii=False, indent=2)
-    print(f"Converted {input_path} to valid JSON array at {out_path}")
+    # Written next to the target and swapped in at the end, so the input can be converted in place
+    tmp_path = out_path + ".tmp"
+    count = 0
+    with open(input_path, 'r', encoding='utf-8') as f, open(tmp_path, 'w', encoding='utf-8') as out:
+        for records, errors in _converted_chunks(_line_chunks(f, chunk_size), translate_names, indent, workers):
+            for error in errors:
+                print(error)
+            for record in records:
+                if indent:
+                    record = ' ' * indent + record.replace('\n', '\n' + ' ' * indent)
+                out.write(("[\n" if count == 0 else ",\n") + record)
+                count += 1
+        out.write("\n]" if count else "[]")
+    os.replace(tmp_path, out_path)
+    print(f"Converted {input_path} to valid JSON array at {out_path} ({count} records)")
 
-def convert_all_in_folder(folder: str, translate_names: bool = True):
+
+def convert_to_columnar(input_path: str, output_path: Optional[str] = None, translate_names: bool = True,
+                        workers: int = 1, chunk_size: int = CHUNK_SIZE, **kwargs):
+    """
+    Converts a file with newline-separated JSON objects to the columnar format of mooc_data (see write_columnar),
+    with the same streaming, translation and worker options as convert_to_json_array.
+    Args:
+        output_path: Path of the .mcol file. If None, the input path with its extension replaced by .mcol.
+    """
+    out_path = output_path or os.path.splitext(input_path)[0] + MOOC_FORMATS["columnar"]
+
+    def records(f):
+        for converted, errors in _converted_chunks(_line_chunks(f, chunk_size), translate_names, None, workers,
+                                                   serialize=False):
+            for error in errors:
+                print(error)
+            yield from converted
+
+    with open(input_path, 'r', encoding='utf-8') as f:
+        count = write_columnar(out_path, records(f))
+    print(f"Converted {input_path} to columnar format at {out_path} ({count} records)")
+
+
+def convert_all_in_folder(folder: str, translate_names: bool = True, data_format: str = "json", **kwargs):
     """
-    Converts all .json files in a folder to valid JSON arrays.
+    Converts all .json files in a folder to valid JSON arrays (or to columnar files next to them).
     """
+    convert = convert_to_columnar if data_format == "columnar" else convert_to_json_array
     for fname in os.listdir(folder):
         if fname.endswith('.json'):
-            convert_to_json_array(os.path.join(folder, fname), translate_names=translate_names)
+            convert(os.path.join(folder, fname), translate_names=translate_names, **kwargs)
+
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Convert newline JSON to array JSON.")
     parser.add_argument('file_or_folder', help='File or folder to process')
     parser.add_argument('--no-translate', action='store_true', help='Do not translate names to pinyin')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes for parsing and translation (default: number of CPUs)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Lines per worker task (default: %(default)s)')
+    parser.add_argument('--indent', type=int, default=None,
+                        help='Indent every record (the previous layout used 2); default writes compact records')
+    parser.add_argument('--format', choices=sorted(MOOC_FORMATS), default='json',
+                        help='json rewrites the files as JSON arrays; columnar writes .mcol files next to them')
     args = parser.parse_args()
+    options = {"workers": args.workers, "chunk_size": args.chunk_size, "indent": args.indent}
     if os.path.isdir(args.file_or_folder):
-        convert_all_in_folder(args.file_or_folder, translate_names=not args.no_translate)
+        convert_all_in_folder(args.file_or_folder, translate_names=not args.no_translate, data_format=args.format, **options)
+    elif args.format == "columnar":
+        convert_to_columnar(args.file_or_folder, translate_names=not args.no_translate, **options)
     else:
-        convert_to_json_array(args.file_or_folder, translate_names=not args.no_translate)
+        convert_to_json_array(args.file_or_folder, translate_names=not args.no_translate, **options)
@@ -0,0 +1,281 @@
+import json
+import os
+import shutil
+import numpy as np
+
+# Local approximate nearest-neighbour index over node2vec embeddings (IVF: inverted file lists).
+#
+# Vectors are L2-normalized (similarity = cosine), clustered with k-means into n_lists lists and stored
+# grouped by list, so probing a list reads one contiguous slice of a memory-mapped array.
+#
+# Layout of an index directory:
+#   manifest.json       format version, dimension, labels, vector count per label, list count
+#   centroids.npy       (n_lists, dimension) float32, normalized
+#   list_offsets.npy    (n_lists + 1) int64; list i holds rows list_offsets[i]:list_offsets[i + 1]
+#   vectors.npy         (n, dimension) float32, normalized, grouped by list
+#   ids.npy             node id of every row
+#   labels.npy          index into manifest["labels"] of every row (uint8)
+#   sorted_ids.npy      ids sorted, and id_order.npy the row of each, for id lookups with searchsorted
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", "ann_index")
+ANN_INDEX_VERSION = 1
+# Lists probed per query: more lists = better recall, slower queries
+ANN_N_PROBE = int(os.getenv("ANN_N_PROBE", "8"))
+
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLE_PER_LIST = 256
+_CHUNK = 8192
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def _assign(vectors, centroids):
+    """Nearest centroid (highest dot product) of every vector, computed in chunks to bound memory."""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _CHUNK):
+        assignment[start:start + _CHUNK] = np.argmax(vectors[start:start + _CHUNK] @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(vectors, n_lists, seed=0):
+    """Spherical k-means on a sample of the (normalized) vectors."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * _KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(_KMEANS_ITERATIONS):
+        assignment = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.bincount(assignment, minlength=n_lists) == 0
+        # Re-seed lists that lost all their points
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def default_n_lists(n):
+    return max(1, int(np.sqrt(n)))
+
+
+def build_index(path, vectors_by_label, n_lists=None, seed=0):
+    """
+    Builds an index from {label: (ids, vectors)} and writes it to path (swapped in atomically).
+    Returns the manifest.
+    """
+    labels = sorted(vectors_by_label)
+    if len(labels) > 255:
+        raise ValueError("At most 255 labels per index")
+    columns = []
+    for code, label in enumerate(labels):
+        label_ids = np.asarray(vectors_by_label[label][0], dtype=str)
+        label_vectors = np.asarray(vectors_by_label[label][1], dtype=np.float32)
+        if len(label_ids) != len(label_vectors):
+            raise ValueError(f"{label}: {len(label_ids)} ids but {len(label_vectors)} vectors")
+        if len(label_ids) == 0:
+            continue
+        if label_vectors.ndim != 2:
+            raise ValueError(f"{label}: vectors must be a 2-D array, got shape {label_vectors.shape}")
+        if columns and label_vectors.shape[1] != columns[0][1].shape[1]:
+            raise ValueError(f"{label}: vectors have dimension {label_vectors.shape[1]}, "
+                             f"but {labels[columns[0][2]]} has {columns[0][1].shape[1]}")
+        columns.append((label_ids, label_vectors, code))
+    if not columns:
+        raise ValueError("No vectors to index")
+    ids = np.concatenate([label_ids for label_ids, _, _ in columns])
+    vectors = _normalize(np.concatenate([label_vectors for _, label_vectors, _ in columns]))
+    label_codes = np.concatenate([np.full(len(label_ids), code, dtype=np.uint8) for label_ids, _, code in columns])
+
+    n_lists = min(n_lists or default_n_lists(len(vectors)), len(vectors))
+    centroids = train_centroids(vectors, n_lists, seed)
+    assignment = _assign(vectors, centroids)
+    order = np.argsort(assignment, kind="stable")
+    list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=n_lists), out=list_offsets[1:])
+    ids = ids[order]
+
+    tmp_path = path.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    arrays = {
+        "centroids": centroids,
+        "list_offsets": list_offsets,
+        "vectors": vectors[order],
+        "ids": ids,
+        "labels": label_codes[order],
+    }
+    arrays["id_order"] = np.argsort(ids, kind="stable")
+    arrays["sorted_ids"] = ids[arrays["id_order"]]
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + ".npy"), array)
+    manifest = {
+        "version": ANN_INDEX_VERSION,
+        "dimension": int(vectors.shape[1]),
+        "labels": labels,
+        "counts": {label: len(vectors_by_label[label][0]) for label in labels},
+        "n_lists": int(n_lists),
+    }
+    with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def update_index(path, label, ids, vectors, n_lists=None):
+    """Replaces the vectors of one label in the index at path (creating it if needed) and rebuilds it."""
+    vectors_by_label = {}
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        index = AnnIndex.open(path)
+        for code, other in enumerate(index.labels):
+            if other != label:
+                rows = np.flatnonzero(index.row_labels == code)
+                vectors_by_label[other] = (np.asarray(index.ids[rows]), np.asarray(index.vectors[rows]))
+    vectors_by_label[label] = (ids, vectors)
+    return build_index(path, vectors_by_label, n_lists=n_lists)
+
+
+class AnnIndex:
+    """
+    Memory-mapped IVF index.
+
+    Usage:
+        index = AnnIndex.open()
+        index.similar_to('C_course-v1:TsinghuaX+00690242+sp', k=5, label='Course')
+        for ids, scores in index.search(query_vectors, k=10, label='Video'): ...
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.labels = manifest["labels"]
+        load = lambda name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+        # Centroids and offsets are small and read by every query, so they are kept in memory
+        self.centroids = np.array(load("centroids"))
+        self.list_offsets = np.array(load("list_offsets"))
+        self.vectors = load("vectors")
+        self.ids = load("ids")
+        self.row_labels = load("labels")
+        self.id_order = load("id_order")
+        self.sorted_ids = load("sorted_ids")
+
+    @classmethod
+    def open(cls, path=ANN_INDEX_DIR):
+        manifest_path = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No ANN index in {path}")
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != ANN_INDEX_VERSION:
+            raise ValueError(f"Unsupported ANN index version {manifest.get('version')} in {path}")
+        return cls(path, manifest)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, node_id, label=None):
+        """Row number of a node id (restricted to label if given), or None."""
+        lo = np.searchsorted(self.sorted_ids, node_id, side="left")
+        hi = np.searchsorted(self.sorted_ids, node_id, side="right")
+        for row in self.id_order[lo:hi]:
+            if label is None or self.labels[self.row_labels[row]] == label:
+                return int(row)
+        return None
+
+    def vector(self, node_id, label=None):
+        row = self.row_of(node_id, label)
+        if row is None:
+            raise KeyError(f"{node_id} is not in the index")
+        return np.asarray(self.vectors[row])
+
+    def _label_code(self, label):
+        if label is None:
+            return None
+        if label not in self.labels:
+            raise KeyError(f"Label {label} is not in the index (has {', '.join(self.labels)})")
+        return self.labels.index(label)
+
+    def _search_one(self, query, centroid_scores, k, label_code, n_probe, exclude_row):
+        lists = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe] if n_probe < len(centroid_scores) \
+            else np.arange(len(centroid_scores))
+        rows = np.concatenate([np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in lists])
+        if label_code is not None:
+            rows = rows[self.row_labels[rows] == label_code]
+        if exclude_row is not None:
+            rows = rows[rows != exclude_row]
+        if len(rows) == 0:
+            return rows, np.empty(0, dtype=np.float32)
+        scores = self.vectors[rows] @ query
+        top = np.argpartition(-scores, min(k, len(rows)) - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return rows[top], scores[top]
+
+    def search(self, queries, k=10, label=None, n_probe=ANN_N_PROBE, exclude_rows=None):
+        """
+        Batched top-k cosine search. queries is (m, dimension) or a single vector. Returns (ids, scores),
+        one array per query (a single pair for a single vector); filters results to `label` if given.
+        """
+        single = np.ndim(queries) == 1
+        queries = _normalize(np.atleast_2d(queries))
+        label_code = self._label_code(label)
+        n_probe = max(1, min(n_probe, len(self.centroids)))
+        centroid_scores = queries @ self.centroids.T
+        results = []
+        for i, query in enumerate(queries):
+            exclude_row = exclude_rows[i] if exclude_rows is not None else None
+            rows, scores = self._search_one(query, centroid_scores[i], k, label_code, n_probe, exclude_row)
+            results.append((self.ids[rows], scores))
+        return results[0] if single else results
+
+    def similar_to(self, node_id, k=10, label=None, n_probe=ANN_N_PROBE, source_label=None):
+        """Returns [(id, similarity)] of the k nodes most similar to node_id, excluding the node itself."""
+        row = self.row_of(node_id, source_label)
+        if row is None:
+            raise KeyError(f"{node_id} is not in the index")
+        ids, scores = self.search(self.vectors[row], k=k, label=label, n_probe=n_probe, exclude_rows=[row])
+        return [(str(i), float(s)) for i, s in zip(ids, scores)]
+
+
+def main():
+    import argparse
+    import time
+    from embedding_pipeline import EMBEDDING_PROPERTY, stored_embeddings
+
+    parser = argparse.ArgumentParser(description="Build or query the local ANN index over node2vec embeddings.")
+    parser.add_argument('--dir', default=ANN_INDEX_DIR, help='Index directory (default: ANN_INDEX_DIR)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help=f'Build the index from the {EMBEDDING_PROPERTY} properties in the store')
+    build.add_argument('--labels', nargs='+', default=['User', 'Video', 'Course'])
+    build.add_argument('--lists', type=int, default=None, help='Number of IVF lists (default: sqrt(n))')
+    query = sub.add_parser('query', help='Print the nodes most similar to a node id')
+    query.add_argument('id')
+    query.add_argument('--label', default=None, help='Only return nodes with this label')
+    query.add_argument('--k', type=int, default=10)
+    query.add_argument('--n-probe', type=int, default=ANN_N_PROBE)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        vectors_by_label = {}
+        for label in args.labels:
+            ids, vectors = stored_embeddings(label)
+            if len(ids):
+                vectors_by_label[label] = (ids, vectors)
+            print(f"Loaded {len(ids)} {label} embeddings")
+        manifest = build_index(args.dir, vectors_by_label, n_lists=args.lists)
+        print(f"Built ANN index with {sum(manifest['counts'].values())} vectors in {manifest['n_lists']} lists at {args.dir}")
+        return
+
+    index = AnnIndex.open(args.dir)
+    start = time.perf_counter()
+    results = index.similar_to(args.id, k=args.k, label=args.label, n_probe=args.n_probe)
+    elapsed = (time.perf_counter() - start) * 1000
+    for node_id, similarity in results:
+        print(f"{node_id} (similarity: {similarity:.3f})")
+    print(f"Query took {elapsed:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+# On-disk cache of node2vec embeddings, one entry per embedding target.
+#
+# An entry is valid for a fingerprint of everything the embeddings depend on: node counts of the projected
+# labels, relationship counts of the projected types, the seeding change markers of those labels and types
+# (neo4j_utils.record_changes; a seed step that writes rows renews the markers of what it creates) and the
+# algorithm parameters. A seed run that writes nothing, or only touches labels and types outside a target's
+# projection, keeps that target cached. Edits made outside the seeding process that keep all counts equal
+# are not detected; use --refresh after those.
+#
+# Layout: <EMBEDDING_CACHE_DIR>/<target name>/{manifest.json, ids.npy, vectors.npy}
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+EMBEDDING_CACHE_VERSION = 2
+
+
+def _count(run_query, query):
+    return run_query(query, idempotent=True)[0]["count"]
+
+
+def graph_fingerprint(run_query, target, params):
+    """
+    Returns (fingerprint, details) for an EmbeddingTarget. run_query is neo4j_client.run_query; the counts
+    come from the count store, so this costs a handful of cheap queries.
+    """
+    marker = run_query("MATCH (m:SchemaVersion {id: 'seed_changes'}) RETURN properties(m) AS changes",
+                       idempotent=True)
+    changes = marker[0]["changes"] if marker else {}
+    details = {
+        "version": EMBEDDING_CACHE_VERSION,
+        "nodes": {label: _count(run_query, f"MATCH (n:`{label}`) RETURN count(n) AS count")
+                  for label in target.node_labels},
+        "relationships": {t: _count(run_query, f"MATCH ()-[r:`{t}`]->() RETURN count(r) AS count")
+                          for t in target.relationship_types},
+        "changes": {name: changes.get(name) for name in (*target.node_labels, *target.relationship_types)},
+        "label": target.label,
+        "params": params,
+    }
+    fingerprint = hashlib.sha1(json.dumps(details, sort_keys=True).encode("utf-8")).hexdigest()
+    return fingerprint, details
+
+
+class EmbeddingCache:
+    def __init__(self, directory=EMBEDDING_CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, target):
+        return os.path.join(self.directory, target.name)
+
+    def load(self, target, fingerprint):
+        """Returns (ids, vectors) cached for this fingerprint, memory-mapped, or None."""
+        path = self._path(target)
+        try:
+            with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if manifest.get("fingerprint") != fingerprint:
+            return None
+        ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        return ids, vectors
+
+    def store(self, target, fingerprint, details, ids, vectors):
+        """Replaces the target's entry (written to a temporary directory and swapped in)."""
+        path = self._path(target)
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, "ids.npy"), np.asarray(ids, dtype=str))
+        np.save(os.path.join(tmp_path, "vectors.npy"), np.asarray(vectors, dtype=np.float32))
+        manifest = {"fingerprint": fingerprint, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **details}
+        with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
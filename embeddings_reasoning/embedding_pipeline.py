@@ -0,0 +1,301 @@
+import os
+import sys
+from collections import namedtuple
+import numpy as np
+from dotenv import load_dotenv
+
+# Make the shared top-level modules (neo4j_client) importable when run from the repository checkout;
+# the Docker images put them on PYTHONPATH instead
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import instrumentation
+import neo4j_client
+import results_store
+import segment_storage
+from embedding_cache import EmbeddingCache, graph_fingerprint
+
+load_dotenv()
+
+# One GDS pipeline for every find_similar_* script:
+# project once -> node2vec.mutate (embeddings stay in the in-memory graph) -> knn.stream on the same graph
+# -> optionally write the embeddings back -> drop the projection.
+# With the embedding cache (default), embeddings are reused while the graph is unchanged and KNN runs locally.
+
+EMBEDDING_PROPERTY = "node2vecEmbedding"
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "128"))
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "5"))
+# Memory budget in MB for the score matrix of one chunk of the local KNN (see local_similar)
+SIMILARITY_MEMORY_MB = int(os.getenv("SIMILARITY_MEMORY_MB", "256"))
+# Fixed seed makes node2vec reproducible between runs; empty lets GDS pick one
+EMBEDDING_RANDOM_SEED = os.getenv("EMBEDDING_RANDOM_SEED", "")
+# Parallelism of the optional write-back of embeddings to the store
+EMBEDDING_WRITE_CONCURRENCY = int(os.getenv("EMBEDDING_WRITE_CONCURRENCY", "4"))
+# Rows per transaction when writing cached embeddings back
+EMBEDDING_WRITE_BATCH_SIZE = int(os.getenv("EMBEDDING_WRITE_BATCH_SIZE", "1000"))
+
+# label: nodes that get compared; node_labels: everything projected so the relationships have both endpoints;
+# relationship_types: projected undirected; dedupe_pairs: print (a, b) and (b, a) only once
+EmbeddingTarget = namedtuple("EmbeddingTarget", ["name", "label", "node_labels", "relationship_types", "dedupe_pairs"])
+
+EMBEDDING_TARGETS = {
+    "users": EmbeddingTarget("users", "User", ("User", "Video"), ("WATCHED",), False),
+    "users_interactions": EmbeddingTarget(
+        "users_interactions", "User", ("User", "Video", "Course"), ("ENROLLED_IN", "WATCHED", "PART_OF"), True
+    ),
+    "courses": EmbeddingTarget("courses", "Course", ("Course", "Video"), ("PART_OF",), False),
+    "videos": EmbeddingTarget("videos", "Video", ("Video", "Segment"), ("HAS_SEGMENT",), False),
+}
+
+
+def graph_name(target):
+    return f"{target.name}EmbeddingGraph"
+
+
+def node2vec_config(embedding_dimension=EMBEDDING_DIMENSION):
+    config = {"mutateProperty": EMBEDDING_PROPERTY, "embeddingDimension": embedding_dimension}
+    if EMBEDDING_RANDOM_SEED:
+        config["randomSeed"] = int(EMBEDDING_RANDOM_SEED)
+    return config
+
+
+# Projecting and node2vec.mutate are not idempotent (the graph or property may already exist after a
+# dropped connection), so run_query does not retry them once sent; see project_and_embed.
+def project(target):
+    neo4j_client.run_query("CALL gds.graph.drop($name, false)", {"name": graph_name(target)}, name="gds_graph_drop",
+                           idempotent=True)
+    relationships = {t: {"type": t, "orientation": "UNDIRECTED"} for t in target.relationship_types}
+    record = neo4j_client.run_query(
+        "CALL gds.graph.project($name, $labels, $relationships) YIELD nodeCount, relationshipCount "
+        "RETURN nodeCount, relationshipCount",
+        {"name": graph_name(target), "labels": list(target.node_labels), "relationships": relationships},
+        name="gds_graph_project",
+    )[0]
+    return record["nodeCount"], record["relationshipCount"]
+
+
+def project_and_embed(target, embedding_dimension=EMBEDDING_DIMENSION):
+    """
+    Projects the target graph and runs node2vec.mutate on it, retrying both from the start on transient
+    errors: project drops any partial projection first. Returns the projected node and relationship counts.
+    """
+    def attempt():
+        counts = project(target)
+        compute_embeddings(target, embedding_dimension)
+        return counts
+    return neo4j_client.with_retry(attempt)
+
+
+def compute_embeddings(target, embedding_dimension=EMBEDDING_DIMENSION):
+    neo4j_client.run_query(
+        "CALL gds.node2vec.mutate($name, $config) YIELD nodePropertiesWritten RETURN nodePropertiesWritten",
+        {"name": graph_name(target), "config": node2vec_config(embedding_dimension)},
+        name="node2vec_mutate",
+    )
+
+
+def stream_similar(target, top_k=SIMILARITY_TOP_K):
+    """Returns (node1 id, node2 id, similarity) for the top_k neighbours of every target node, most similar first."""
+    records = neo4j_client.run_query(
+        """
+        CALL gds.knn.stream($name, {topK: $top_k, nodeLabels: [$label], nodeProperties: [$property]})
+        YIELD node1, node2, similarity
+        RETURN gds.util.asNode(node1).id AS node1, gds.util.asNode(node2).id AS node2, similarity
+        ORDER BY similarity DESC
+        """,
+        {"name": graph_name(target), "top_k": top_k, "label": target.label, "property": EMBEDDING_PROPERTY},
+        name="knn_stream", idempotent=True,
+    )
+    return [(record["node1"], record["node2"], record["similarity"]) for record in records]
+
+
+def write_embeddings(target):
+    """Writes the in-memory embeddings of the target label to the store (GDS writes them in parallel batches)."""
+    record = neo4j_client.run_query(
+        "CALL gds.graph.nodeProperties.write($name, [$property], [$label], {writeConcurrency: $concurrency}) "
+        "YIELD propertiesWritten RETURN propertiesWritten",
+        {"name": graph_name(target), "property": EMBEDDING_PROPERTY, "label": target.label,
+         "concurrency": EMBEDDING_WRITE_CONCURRENCY},
+        name="node_properties_write", idempotent=True,
+    )[0]
+    return record["propertiesWritten"]
+
+
+def stream_embeddings(target):
+    """Returns (ids, vectors) of the target label from the in-memory projection."""
+    records = neo4j_client.run_query(
+        "CALL gds.graph.nodeProperty.stream($name, $property, [$label]) YIELD nodeId, propertyValue "
+        "RETURN gds.util.asNode(nodeId).id AS id, propertyValue AS embedding",
+        {"name": graph_name(target), "property": EMBEDDING_PROPERTY, "label": target.label},
+        name="node_property_stream", idempotent=True,
+    )
+    return _id_vector_columns(records)
+
+
+def stored_embeddings(label):
+    """Returns (ids, vectors) of the embeddings previously written to the store with --write."""
+    records = neo4j_client.run_query(
+        f"MATCH (n:{label}) WHERE n.{EMBEDDING_PROPERTY} IS NOT NULL RETURN n.id AS id, n.{EMBEDDING_PROPERTY} AS embedding",
+        session_config={"fetch_size": 10000}, name="stored_embeddings", idempotent=True,
+    )
+    return _id_vector_columns(records)
+
+
+def _id_vector_columns(records):
+    ids = [record["id"] for record in records]
+    vectors = np.array([record["embedding"] for record in records], dtype=np.float32)
+    return ids, vectors.reshape(len(ids), -1)
+
+
+def drop(target):
+    neo4j_client.run_query("CALL gds.graph.drop($name, false)", {"name": graph_name(target)}, name="gds_graph_drop",
+                           idempotent=True)
+
+
+def write_cached_embeddings(label, ids, vectors, batch_size=EMBEDDING_WRITE_BATCH_SIZE):
+    """Writes embeddings held locally (e.g. from the cache) to the store in batched UNWIND transactions."""
+    query = f"UNWIND $rows AS row MATCH (n:{label} {{id: row.id}}) SET n.{EMBEDDING_PROPERTY} = row.embedding"
+    written = 0
+    for start in range(0, len(ids), batch_size):
+        rows = [{"id": str(i), "embedding": v} for i, v in
+                zip(ids[start:start + batch_size], np.asarray(vectors[start:start + batch_size]).tolist())]
+        neo4j_client.execute_write(lambda tx: instrumentation.run(
+            tx, query, name="write_cached_embeddings", input_rows=len(rows), rows=rows).consume())
+        written += len(rows)
+    return written
+
+
+def local_similar(ids, vectors, top_k=SIMILARITY_TOP_K, memory_mb=SIMILARITY_MEMORY_MB):
+    """
+    Exact KNN over local embeddings by cosine similarity, in row chunks to bound memory.
+    Each chunk scores its rows against all N vectors (float32 scores plus int64 partition indexes,
+    12 bytes per score), so the chunk size is derived from N to stay within memory_mb.
+    Returns (node1 id, node2 id, similarity) like stream_similar, most similar first.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+    k = min(top_k, len(vectors) - 1)
+    if k <= 0:
+        return []
+    chunk_size = max(1, memory_mb * 1024 * 1024 // (12 * len(vectors)))
+    sources, targets, similarities = [], [], []
+    for start in range(0, len(vectors), chunk_size):
+        scores = vectors[start:start + chunk_size] @ vectors.T
+        rows = np.arange(len(scores))
+        scores[rows, start + rows] = -np.inf
+        top = np.argpartition(scores, -k, axis=1)[:, -k:]
+        sources.append(np.repeat(start + rows, k))
+        targets.append(top.ravel())
+        similarities.append(scores[rows[:, None], top].ravel())
+    sources, targets, similarities = np.concatenate(sources), np.concatenate(targets), np.concatenate(similarities)
+    order = np.argsort(-similarities, kind="stable")
+    ids = np.asarray(ids)
+    return [(str(ids[a]), str(ids[b]), float(sim)) for a, b, sim in
+            zip(sources[order], targets[order], similarities[order])]
+
+
+def _compute_in_gds(target, embedding_dimension, top_k, write, knn, embeddings):
+    """
+    Projects, runs node2vec.mutate and returns (ids, vectors, pairs). pairs come from GDS KNN if knn is set,
+    ids/vectors are streamed back if embeddings is set; otherwise they are None.
+    """
+    print(f"Projecting {target.name} graph ({', '.join(target.node_labels)} via {', '.join(target.relationship_types)}) "
+          f"and running Node2Vec for {target.label} (dimension {embedding_dimension})...")
+    try:
+        nodes, relationships = project_and_embed(target, embedding_dimension)
+        print(f"Projected {nodes} nodes and {relationships} relationships")
+        pairs = None
+        if knn:
+            print(f"Finding top {top_k} similar {target.label} nodes using KNN...")
+            pairs = stream_similar(target, top_k)
+        if write:
+            print(f"Wrote {write_embeddings(target)} {EMBEDDING_PROPERTY} properties")
+        ids, vectors = stream_embeddings(target) if embeddings else (None, None)
+    finally:
+        print(f"Dropping {target.name} graph...")
+        drop(target)
+    return ids, vectors, pairs
+
+
+def run_pipeline(target, embedding_dimension=EMBEDDING_DIMENSION, top_k=SIMILARITY_TOP_K, write=False, index_dir=None,
+                 use_cache=True, refresh=False):
+    """
+    Runs the whole pipeline for one EmbeddingTarget and returns the similar pairs.
+
+    With use_cache, embeddings are looked up in the EmbeddingCache by graph fingerprint first; GDS only runs
+    on a miss (or with refresh), and KNN runs locally on the embeddings either way. Without the cache,
+    KNN runs in GDS on the projection. With index_dir, the target's embeddings also replace its label in
+    the local ANN index there.
+    """
+    neo4j_client.warmup()
+    if not use_cache:
+        ids, vectors, pairs = _compute_in_gds(target, embedding_dimension, top_k, write, knn=True,
+                                              embeddings=index_dir is not None)
+        if index_dir is not None:
+            _update_index(index_dir, target, ids, vectors)
+        return pairs
+
+    cache = EmbeddingCache()
+    fingerprint, details = graph_fingerprint(neo4j_client.run_query, target, node2vec_config(embedding_dimension))
+    cached = None if refresh else cache.load(target, fingerprint)
+    if cached is None:
+        print(f"No cached {target.name} embeddings for the current graph; computing them")
+        ids, vectors, _ = _compute_in_gds(target, embedding_dimension, top_k, write, knn=False, embeddings=True)
+        cache.store(target, fingerprint, details, ids, vectors)
+    else:
+        ids, vectors = cached
+        print(f"Using {len(ids)} cached {target.label} embeddings (fingerprint {fingerprint[:12]})")
+        if write:
+            print(f"Wrote {write_cached_embeddings(target.label, ids, vectors)} {EMBEDDING_PROPERTY} properties")
+    if index_dir is not None:
+        _update_index(index_dir, target, ids, vectors)
+    print(f"Finding top {top_k} similar {target.label} nodes locally...")
+    return local_similar(ids, vectors, top_k)
+
+
+def _update_index(index_dir, target, ids, vectors):
+    from ann_index import update_index
+    manifest = update_index(index_dir, target.label, ids, vectors)
+    print(f"Indexed {len(ids)} {target.label} embeddings in {index_dir} ({manifest['n_lists']} lists)")
+
+
+def print_similar(target, pairs):
+    printed_pairs = set()
+    for node1, node2, similarity in pairs:
+        if target.dedupe_pairs:
+            pair = tuple(sorted([node1, node2]))
+            if pair in printed_pairs:
+                continue
+            printed_pairs.add(pair)
+        print(f"{target.label} {node1} is similar to {target.label} {node2} (similarity: {similarity:.3f})")
+
+
+def main(target_name=None):
+    import argparse
+    from ann_index import ANN_INDEX_DIR
+    parser = argparse.ArgumentParser(description="Compute node2vec embeddings and find similar nodes with GDS KNN.")
+    if target_name is None:
+        parser.add_argument('target', choices=sorted(EMBEDDING_TARGETS))
+    parser.add_argument('--dimension', type=int, default=EMBEDDING_DIMENSION, help='node2vec embedding dimension')
+    parser.add_argument('--top-k', type=int, default=SIMILARITY_TOP_K, help='Neighbours per node')
+    parser.add_argument('--write', action='store_true', help=f'Write the embeddings to the {EMBEDDING_PROPERTY} node property')
+    parser.add_argument('--index', nargs='?', const=ANN_INDEX_DIR, metavar='DIR', help='Also add the embeddings to the local ANN index (see ann_index.py)')
+    parser.add_argument('--no-cache', action='store_true', help='Always run node2vec and KNN in GDS, bypassing the embedding cache')
+    parser.add_argument('--refresh', action='store_true', help='Recompute the embeddings even if the cache matches the graph')
+    args = parser.parse_args()
+    target = EMBEDDING_TARGETS[target_name or args.target]
+    if "Segment" in target.node_labels:
+        with neo4j_client.session() as session:
+            if session.execute_read(segment_storage.detect_layout) == "compact":
+                raise SystemExit(f"The {target.name} target needs Segment nodes, but the graph stores segments as lists "
+                                 "on the videos (SEGMENT_STORAGE=compact); reseed with SEGMENT_STORAGE=nodes to use it.")
+    with instrumentation.phase(f"embeddings.{target.name}"):
+        pairs = run_pipeline(target, embedding_dimension=args.dimension, top_k=args.top_k, write=args.write,
+                             index_dir=args.index, use_cache=not args.no_cache, refresh=args.refresh)
+    print_similar(target, pairs)
+    if results_store.publish_enabled():
+        results_store.write_table(f'similar_{target.name}', ['node', 'similar', 'similarity'], pairs,
+                                  meta={'label': target.label, 'top_k': args.top_k})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import json
+import os
+import shutil
+import sys
+import time
+from collections import namedtuple
+import numpy as np
+from result_stream import FETCH_SIZE, iter_record_batches
+
+# Make the shared top-level modules (instrumentation) importable when run from the repository checkout;
+# the Docker images put them on PYTHONPATH instead
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import instrumentation
+import segment_storage
+
+# Columnar on-disk snapshot of the knowledge graph for the reasoning jobs.
+#
+# Layout of a snapshot directory:
+#   manifest.json                  format version, export time, node/edge counts and the list of columns
+#   nodes/<Label>.ids.npy          sorted node ids; a node's index is its position in this array
+#   nodes/<Label>.<prop>.npy       node property column, aligned with the ids
+#   rels/<TYPE>.indptr.npy         CSR row pointers over the source label's indexes (int64)
+#   rels/<TYPE>.indices.npy        target node index of every edge, grouped by source
+#   rels/<TYPE>.<prop>.npy         edge property column, aligned with indices
+#
+# Every file is a plain .npy array, so opening a snapshot memory-maps it read-only without copying.
+# Missing numbers are NaN, missing timestamps NaT.
+GRAPH_SNAPSHOT_DIR = os.getenv("GRAPH_SNAPSHOT_DIR", "graph_snapshot")
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Node labels and the property columns exported for them
+SNAPSHOT_NODES = {
+    "User": (),
+    "Course": (),
+    "Video": (),
+    "Segment": ("start", "end", "segment_index"),
+}
+
+# Relationship type -> (source label, target label, property columns)
+SNAPSHOT_RELATIONSHIPS = {
+    "WATCHED": ("User", "Video", (
+        "watching_count", "video_duration", "local_watching_time", "video_progress_time",
+        "video_start_time", "video_end_time", "local_start_time", "local_end_time",
+    )),
+    "ENROLLED_IN": ("User", "Course", ("enroll_time",)),
+    "HAS_SEGMENT": ("Video", "Segment", ()),
+    "PART_OF": ("Video", "Course", ("video_order",)),
+}
+
+# Properties stored as "YYYY-MM-DD HH:MM:SS" strings in the graph, exported as datetime64[s]
+TIMESTAMP_PROPERTIES = {"local_start_time", "local_end_time", "enroll_time"}
+
+CSR = namedtuple("CSR", ["indptr", "indices", "source", "target"])
+
+
+class GraphSnapshot:
+    """
+    Read-only view of a snapshot directory. Arrays are memory-mapped on first access.
+
+    Usage:
+        snapshot = GraphSnapshot.open()
+        watched = snapshot.adjacency('WATCHED')
+        videos_of_user_0 = watched.indices[watched.indptr[0]:watched.indptr[1]]
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self._arrays = {}
+
+    @classmethod
+    def open(cls, path=GRAPH_SNAPSHOT_DIR):
+        manifest_path = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No graph snapshot in {path}; run 'python graph_snapshot.py export' first")
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported graph snapshot version {manifest.get('version')} in {path}")
+        return cls(path, manifest)
+
+    def _load(self, *parts):
+        name = os.path.join(*parts) + ".npy"
+        array = self._arrays.get(name)
+        if array is None:
+            array = self._arrays[name] = np.load(os.path.join(self.path, name), mmap_mode="r")
+        return array
+
+    def ids(self, label):
+        return self._load("nodes", f"{label}.ids")
+
+    def node_count(self, label):
+        return self.manifest["nodes"][label]
+
+    def index_of(self, label, ids):
+        """Maps node ids to their indexes; unknown ids map to -1."""
+        return _lookup(self.ids(label), np.asarray(ids, dtype=str))
+
+    def node_property(self, label, name):
+        return self._load("nodes", f"{label}.{name}")
+
+    def adjacency(self, rel_type):
+        source, target, _ = self.manifest["relationships"][rel_type]["endpoints"]
+        return CSR(self._load("rels", f"{rel_type}.indptr"), self._load("rels", f"{rel_type}.indices"), source, target)
+
+    def edge_property(self, rel_type, name):
+        return self._load("rels", f"{rel_type}.{name}")
+
+    def edge_sources(self, rel_type):
+        """Source node index of every edge, aligned with the adjacency's indices (built in memory)."""
+        indptr = self.adjacency(rel_type).indptr
+        return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def _lookup(sorted_ids, values):
+    if len(sorted_ids) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+    positions = np.searchsorted(sorted_ids, values)
+    clipped = np.minimum(positions, len(sorted_ids) - 1)
+    return np.where(sorted_ids[clipped] == values, clipped, -1).astype(np.int64)
+
+
+def _float_column(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _timestamp_column(values):
+    return np.array([v or None for v in values], dtype="datetime64[s]")
+
+
+def _column(name, values):
+    return _timestamp_column(values) if name in TIMESTAMP_PROPERTIES else _float_column(values)
+
+
+def _export_nodes(tx, label, properties, batch_size, query=None):
+    columns = ", ".join(["n.id"] + [f"n.{p}" for p in properties])
+    query = query or f"MATCH (n:{label}) WHERE n.id IS NOT NULL RETURN {columns}"
+    result = instrumentation.run(tx, query, name=f"export_{label}")
+    rows = [row for batch in iter_record_batches(result, batch_size) for row in batch]
+    ids = np.array([str(row[0]) for row in rows], dtype=str)
+    ids, first = np.unique(ids, return_index=True)
+    return ids, {p: _column(p, [rows[i][k + 1] for i in first]) for k, p in enumerate(properties)}
+
+
+def _export_relationships(tx, rel_type, source, target, properties, node_ids, batch_size, query=None):
+    columns = ", ".join(["a.id", "b.id"] + [f"r.{p}" for p in properties])
+    query = query or f"MATCH (a:{source})-[r:{rel_type}]->(b:{target}) RETURN {columns}"
+    chunks = []
+    for batch in iter_record_batches(instrumentation.run(tx, query, name=f"export_{rel_type}"), batch_size):
+        src = _lookup(node_ids[source], np.array([str(row[0]) for row in batch], dtype=str))
+        dst = _lookup(node_ids[target], np.array([str(row[1]) for row in batch], dtype=str))
+        props = [_column(p, [row[k + 2] for row in batch]) for k, p in enumerate(properties)]
+        keep = (src >= 0) & (dst >= 0)
+        chunks.append((src[keep], dst[keep], [column[keep] for column in props]))
+
+    n_sources, n_targets = len(node_ids[source]), len(node_ids[target])
+    if chunks:
+        src = np.concatenate([c[0] for c in chunks])
+        dst = np.concatenate([c[1] for c in chunks])
+        props = [np.concatenate([c[2][k] for c in chunks]) for k in range(len(properties))]
+    else:
+        src = dst = np.empty(0, dtype=np.int64)
+        props = [_column(p, []) for p in properties]
+    # Group edges by source (stable, so every source's edges keep the query order)
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n_sources + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_sources), out=indptr[1:])
+    index_dtype = np.int32 if n_targets < 2 ** 31 else np.int64
+    return indptr, dst[order].astype(index_dtype), {p: column[order] for p, column in zip(properties, props)}
+
+
+def _save(directory, name, array):
+    np.save(os.path.join(directory, name + ".npy"), np.ascontiguousarray(array))
+
+
+def export_snapshot(session, path=GRAPH_SNAPSHOT_DIR, batch_size=FETCH_SIZE):
+    """
+    Exports the graph into a snapshot directory. The snapshot is written to a temporary directory and
+    swapped in at the end, so readers never see a half-written snapshot. Returns the manifest.
+    Segments are exported the same way for either segment storage layout (see segment_storage.py).
+    """
+    start = time.perf_counter()
+    queries = segment_storage.SNAPSHOT_QUERIES[session.execute_read(segment_storage.detect_layout)]
+    tmp_path = path.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_path, "nodes"))
+    os.makedirs(os.path.join(tmp_path, "rels"))
+
+    manifest = {"version": SNAPSHOT_FORMAT_VERSION, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "nodes": {}, "node_properties": {}, "relationships": {}}
+    node_ids = {}
+    for label, properties in SNAPSHOT_NODES.items():
+        ids, columns = session.execute_read(_export_nodes, label, properties, batch_size, queries.get(label))
+        node_ids[label] = ids
+        _save(os.path.join(tmp_path, "nodes"), f"{label}.ids", ids)
+        for name, column in columns.items():
+            _save(os.path.join(tmp_path, "nodes"), f"{label}.{name}", column)
+        manifest["nodes"][label] = len(ids)
+        manifest["node_properties"][label] = list(properties)
+        print(f"Exported {len(ids)} {label} nodes", flush=True)
+
+    for rel_type, (source, target, properties) in SNAPSHOT_RELATIONSHIPS.items():
+        indptr, indices, columns = session.execute_read(
+            _export_relationships, rel_type, source, target, properties, node_ids, batch_size, queries.get(rel_type)
+        )
+        _save(os.path.join(tmp_path, "rels"), f"{rel_type}.indptr", indptr)
+        _save(os.path.join(tmp_path, "rels"), f"{rel_type}.indices", indices)
+        for name, column in columns.items():
+            _save(os.path.join(tmp_path, "rels"), f"{rel_type}.{name}", column)
+        manifest["relationships"][rel_type] = {
+            "endpoints": [source, target, list(properties)],
+            "edges": len(indices),
+        }
+        print(f"Exported {len(indices)} {rel_type} relationships", flush=True)
+
+    with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    print(f"Graph snapshot written to {path} in {time.perf_counter() - start:.1f}s", flush=True)
+    return manifest
+
+
+def main():
+    import argparse
+    # Only exporting needs the database; reading a snapshot works without the driver
+    import neo4j_client
+
+    parser = argparse.ArgumentParser(description="Export or inspect the on-disk graph snapshot used by the reasoning scripts.")
+    parser.add_argument('command', choices=['export', 'info'])
+    parser.add_argument('--dir', default=GRAPH_SNAPSHOT_DIR, help='Snapshot directory (default: GRAPH_SNAPSHOT_DIR)')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        snapshot = GraphSnapshot.open(args.dir)
+        print(json.dumps(snapshot.manifest, indent=2))
+        return
+
+    neo4j_client.warmup()
+    with neo4j_client.session(fetch_size=FETCH_SIZE) as session, instrumentation.phase("graph_snapshot.export"):
+        export_snapshot(session, args.dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import queue
+import threading
+
+# Number of records the driver pulls per round trip, and the size of the batches handed to aggregations.
+# Pass it to driver.session(fetch_size=FETCH_SIZE) so the driver streams instead of buffering the whole result.
+FETCH_SIZE = int(os.getenv("NEO4J_FETCH_SIZE", "1000"))
+
+_DONE = object()
+
+
+def iter_record_batches(result, batch_size=FETCH_SIZE, prefetch=True):
+    """
+    Yields lists of plain value tuples (in the result's column order) from a driver Result, batch_size
+    records at a time, so driver Record objects never pile up in memory.
+
+    With prefetch, a background thread keeps pulling the next batch from the server while the caller
+    processes the current one. Must be consumed inside the transaction function that ran the query.
+    """
+    if not prefetch:
+        yield from _batches(result, batch_size)
+        return
+
+    batches = queue.Queue(maxsize=2)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for batch in _batches(result, batch_size):
+                while not stop.is_set():
+                    try:
+                        batches.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            batches.put(_DONE)
+        except BaseException as e:
+            batches.put(e)
+
+    producer = threading.Thread(target=produce, name="record-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = batches.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Stop the producer if the consumer bailed out early, and never leave it touching the result
+        # after the transaction function returns
+        stop.set()
+        while producer.is_alive():
+            try:
+                batches.get_nowait()
+            except queue.Empty:
+                producer.join(0.05)
+
+
+def _batches(result, batch_size):
+    batch = []
+    for record in result:
+        batch.append(tuple(record))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
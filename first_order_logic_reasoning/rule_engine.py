@@ -0,0 +1,302 @@
+import itertools
+import re
+import numpy as np
+
+# Minimal Datalog engine for the reasoning scripts.
+# Facts are loaded in bulk from columns, every join looks up a hash index on the bound columns,
+# and rule sets (including recursive ones) are evaluated with semi-naive fixpoint iteration.
+#
+# Rule syntax follows pyDatalog:  Head(X, Y) <= Body1(X, Z) & Body2(Z, Y)
+# Arguments starting with an uppercase letter or "_" are variables; quoted strings and numbers are constants.
+# Every bare "_" is a fresh anonymous variable, so two of them in one rule need not bind to the same value.
+
+# Quoted strings are single tokens, so ',', '&', '#' and '<=' inside them are not separators
+_TOKEN = re.compile(r"""\s*(?:('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|(<=|[(),&#])|([^\s(),&#'"<]+))""")
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class Relation:
+    """A set of equal-length tuples with lazily built hash indexes keyed by column positions."""
+
+    def __init__(self, arity):
+        self.arity = arity
+        self.rows = set()
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, rows):
+        """Adds rows and returns the ones that were not present yet."""
+        new = set(rows) - self.rows
+        if new:
+            self.rows |= new
+            for columns, index in self._indexes.items():
+                _index_rows(index, columns, new)
+        return new
+
+    def index(self, columns):
+        """Returns {key tuple: [rows]} for the given column positions, building it on first use."""
+        index = self._indexes.get(columns)
+        if index is None:
+            index = {}
+            _index_rows(index, columns, self.rows)
+            self._indexes[columns] = index
+        return index
+
+
+def _index_rows(index, columns, rows):
+    for row in rows:
+        index.setdefault(tuple(row[c] for c in columns), []).append(row)
+
+
+class Atom:
+    def __init__(self, predicate, args):
+        self.predicate = predicate
+        # Each argument is ("var", name) or ("const", value)
+        self.args = args
+
+    def variables(self):
+        return {value for kind, value in self.args if kind == "var"}
+
+    def __repr__(self):
+        return f"{self.predicate}({', '.join(str(v) if k == 'var' else repr(v) for k, v in self.args)})"
+
+
+class Rule:
+    def __init__(self, head, body):
+        self.head = head
+        self.body = body
+        unbound = head.variables() - set().union(*(atom.variables() for atom in body))
+        if unbound:
+            raise ValueError(f"Head variables {sorted(unbound)} do not appear in the body of {self}")
+
+    def __repr__(self):
+        return f"{self.head} <= {' & '.join(map(repr, self.body))}"
+
+
+def _tokenize(line):
+    """Splits a rule line into (kind, text) tokens: "string", "punct" or "word"; a '#' outside quotes ends it."""
+    tokens = []
+    position = 0
+    line = line.rstrip()
+    while position < len(line):
+        match = _TOKEN.match(line, position)
+        if match is None:
+            raise ValueError(f"Cannot parse rule at {line[position:]!r}: {line!r}")
+        position = match.end()
+        string, punct, word = match.groups()
+        if punct == "#":
+            break
+        if string is not None:
+            tokens.append(("string", re.sub(r"\\(.)", r"\1", string[1:-1])))
+        elif punct is not None:
+            tokens.append(("punct", punct))
+        else:
+            tokens.append(("word", word))
+    return tokens
+
+
+def _parse_arg(text):
+    if text == "_":
+        return ("var", None)
+    if text[:1].isupper() or text[:1] == "_":
+        return ("var", text)
+    try:
+        return ("const", int(text))
+    except ValueError:
+        try:
+            return ("const", float(text))
+        except ValueError:
+            return ("const", text)
+
+
+def _parse_atom(tokens, position, line, anonymous):
+    """Parses Name(arg, ...) starting at tokens[position]; returns (Atom, next position)."""
+    def expect(kind, text=None):
+        nonlocal position
+        if position >= len(tokens) or tokens[position][0] != kind or text not in (None, tokens[position][1]):
+            found = tokens[position][1] if position < len(tokens) else "end of line"
+            raise ValueError(f"Expected {text or kind} but found {found!r} in rule: {line!r}")
+        position += 1
+        return tokens[position - 1][1]
+
+    predicate = expect("word")
+    if not _NAME.fullmatch(predicate):
+        raise ValueError(f"Invalid predicate name {predicate!r} in rule: {line!r}")
+    expect("punct", "(")
+    args = []
+    while not (position < len(tokens) and tokens[position] == ("punct", ")")):
+        if args:
+            expect("punct", ",")
+        if position < len(tokens) and tokens[position][0] == "string":
+            args.append(("const", tokens[position][1]))
+            position += 1
+            continue
+        kind, value = _parse_arg(expect("word"))
+        if kind == "var" and value is None:
+            # '#' cannot occur in a parsed name, so these never clash with named variables
+            value = f"_#{next(anonymous)}"
+        args.append((kind, value))
+    expect("punct", ")")
+    return Atom(predicate, args), position
+
+
+def parse_rules(text):
+    """Parses one rule per non-empty line ('#' outside quotes starts a comment)."""
+    rules = []
+    for line in text.splitlines():
+        tokens = _tokenize(line)
+        if not tokens:
+            continue
+        if ("punct", "<=") not in tokens:
+            raise ValueError(f"Missing '<=' in rule: {line.strip()!r}")
+        anonymous = itertools.count()
+        head, position = _parse_atom(tokens, 0, line.strip(), anonymous)
+        if tokens[position:position + 1] != [("punct", "<=")]:
+            raise ValueError(f"Expected '<=' after the head of rule: {line.strip()!r}")
+        body = []
+        while True:
+            atom, position = _parse_atom(tokens, position + 1, line.strip(), anonymous)
+            body.append(atom)
+            if position == len(tokens):
+                break
+            if tokens[position] != ("punct", "&"):
+                raise ValueError(f"Expected '&' but found {tokens[position][1]!r} in rule: {line.strip()!r}")
+        rules.append(Rule(head, body))
+    return rules
+
+
+class RuleEngine:
+    """
+    Usage:
+        engine = RuleEngine()
+        engine.add_facts('Edge', src_array, dst_array)
+        engine.add_rules('Path(X, Y) <= Edge(X, Y)\\nPath(X, Y) <= Path(X, Z) & Edge(Z, Y)')
+        engine.run()
+        src, dst = engine.ask('Path')
+    """
+
+    def __init__(self):
+        self.relations = {}
+        self.rules = []
+        self._pending = {}
+
+    def _relation(self, predicate, arity):
+        relation = self.relations.get(predicate)
+        if relation is None:
+            relation = self.relations[predicate] = Relation(arity)
+        elif relation.arity != arity:
+            raise ValueError(f"{predicate} has arity {relation.arity}, got {arity}")
+        return relation
+
+    def add_facts(self, predicate, *columns):
+        """Bulk-loads facts from equal-length columns (NumPy arrays or sequences). Returns the number of new facts."""
+        if not columns:
+            raise ValueError("At least one column is required")
+        lists = [c.tolist() if isinstance(c, np.ndarray) else list(c) for c in columns]
+        if len({len(c) for c in lists}) > 1:
+            raise ValueError(f"Columns for {predicate} have different lengths")
+        new = self._relation(predicate, len(lists)).add(zip(*lists))
+        self._pending.setdefault(predicate, set()).update(new)
+        return len(new)
+
+    def add_rules(self, rules):
+        """Adds rules given as text (see parse_rules) or Rule objects."""
+        rules = parse_rules(rules) if isinstance(rules, str) else list(rules)
+        for rule in rules:
+            self._relation(rule.head.predicate, len(rule.head.args))
+            for atom in rule.body:
+                self._relation(atom.predicate, len(atom.args))
+        self.rules.extend(rules)
+        # New rules must see every existing fact once
+        for predicate, relation in self.relations.items():
+            self._pending.setdefault(predicate, set()).update(relation.rows)
+
+    def run(self, max_iterations=None):
+        """
+        Evaluates the rules to a fixpoint. Each iteration only joins the facts derived in the previous one
+        (the delta) against the full relations, so no derivation is repeated from scratch.
+        Returns the number of iterations.
+        """
+        delta = {p: rows for p, rows in self._pending.items() if rows}
+        self._pending = {}
+        iterations = 0
+        while delta:
+            if max_iterations is not None and iterations >= max_iterations:
+                break
+            iterations += 1
+            derived = {}
+            for rule in self.rules:
+                for position, atom in enumerate(rule.body):
+                    if atom.predicate in delta:
+                        rows = self._evaluate(rule, position, delta[atom.predicate])
+                        if rows:
+                            derived.setdefault(rule.head.predicate, set()).update(rows)
+            delta = {}
+            for predicate, rows in derived.items():
+                new = self.relations[predicate].add(rows)
+                if new:
+                    delta[predicate] = new
+        return iterations
+
+    def _evaluate(self, rule, delta_position, delta_rows):
+        # Start from the delta atom, then join the remaining atoms, most-bound first, through hash indexes
+        bindings = [b for b in (_match(rule.body[delta_position], row, {}) for row in delta_rows) if b is not None]
+        remaining = [atom for i, atom in enumerate(rule.body) if i != delta_position]
+        bound = rule.body[delta_position].variables()
+        while remaining and bindings:
+            atom = max(remaining, key=lambda a: sum(1 for k, v in a.args if k == "const" or v in bound))
+            remaining.remove(atom)
+            key_columns = tuple(i for i, (k, v) in enumerate(atom.args) if k == "const" or v in bound)
+            index = self.relations[atom.predicate].index(key_columns)
+            joined = []
+            for binding in bindings:
+                key = tuple(atom.args[i][1] if atom.args[i][0] == "const" else binding[atom.args[i][1]] for i in key_columns)
+                for row in index.get(key, ()):
+                    extended = _match(atom, row, binding)
+                    if extended is not None:
+                        joined.append(extended)
+            bindings = joined
+            bound |= atom.variables()
+        if remaining:
+            return set()
+        return {tuple(value if kind == "const" else b[value] for kind, value in rule.head.args) for b in bindings}
+
+    def ask(self, predicate):
+        """Returns the facts of a predicate as a tuple of NumPy arrays, one per column."""
+        relation = self.relations.get(predicate)
+        if relation is None:
+            raise KeyError(f"Unknown predicate: {predicate}")
+        if not relation.rows:
+            return tuple(np.array([], dtype=object) for _ in range(relation.arity))
+        try:
+            rows = sorted(relation.rows)
+        except TypeError:
+            rows = sorted(relation.rows, key=repr)
+        return tuple(_column(values) for values in zip(*rows))
+
+    def count(self, predicate):
+        relation = self.relations.get(predicate)
+        return len(relation) if relation is not None else 0
+
+
+def _match(atom, row, binding):
+    """Extends binding so that atom matches row; returns None on conflict."""
+    extended = dict(binding)
+    for (kind, value), item in zip(atom.args, row):
+        if kind == "const":
+            if item != value:
+                return None
+        elif value in extended:
+            if extended[value] != item:
+                return None
+        else:
+            extended[value] = item
+    return extended
+
+
+def _column(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
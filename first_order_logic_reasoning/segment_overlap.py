@@ -0,0 +1,213 @@
+import numpy as np
+
+# Columnar interval-overlap engine for segment skip detection.
+# Interaction rows are (user, video, segment) triples with the segment bounds and the watched interval.
+
+
+class SegmentInteractions:
+    """
+    Interaction rows as NumPy columns. Ids are interned: `users` and `segments` hold the distinct ids,
+    the row columns hold indexes into them. `segment_video` holds the video id of every segment.
+    Missing watch times are stored as NaN.
+    """
+
+    def __init__(self, users, segments, segment_video, user_idx, segment_idx, seg_start, seg_end, watched_start, watched_end):
+        self.users = users
+        self.segments = segments
+        self.segment_video = segment_video
+        self.user_idx = user_idx
+        self.segment_idx = segment_idx
+        self.seg_start = seg_start
+        self.seg_end = seg_end
+        self.watched_start = watched_start
+        self.watched_end = watched_end
+
+    def __len__(self):
+        return len(self.user_idx)
+
+    # Column order of the value tuples accepted by from_batches
+    COLUMNS = ('user', 'video', 'segment', 'seg_start', 'seg_end', 'watched_start', 'watched_end')
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Builds the columns from records with the keys returned by get_user_segment_interactions
+        (user, video, segment, seg_start, seg_end, watched_start, watched_end).
+        """
+        return cls.from_batches([[tuple(record[key] for key in cls.COLUMNS) for record in records]])
+
+    @classmethod
+    def from_batches(cls, batches):
+        """
+        Builds the columns from an iterable of batches of value tuples in COLUMNS order, e.g. from
+        result_stream.iter_record_batches. Every batch is converted to compact NumPy chunks right away,
+        so only the interned ids and 48 bytes per row are kept while the rest of the result streams in.
+        This is compact, not constant memory: the rows are kept (viewer_pairs needs them), so memory still
+        grows with the row count. Aggregate in the database instead (segments_skipped server mode) when
+        only the counts are needed.
+        """
+        user_index = {}
+        segment_index = {}
+        segment_video = []
+        chunks = []
+        for batch in batches:
+            user_idx = np.empty(len(batch), dtype=np.int64)
+            segment_idx = np.empty(len(batch), dtype=np.int64)
+            for i, (user, video, segment, *_) in enumerate(batch):
+                user_idx[i] = user_index.setdefault(user, len(user_index))
+                seg_key = (video, segment)
+                if seg_key not in segment_index:
+                    segment_index[seg_key] = len(segment_index)
+                    segment_video.append(video)
+                segment_idx[i] = segment_index[seg_key]
+            times = _float_column([value for row in batch for value in row[3:7]]).reshape(len(batch), 4)
+            chunks.append((user_idx, segment_idx, times))
+        if chunks:
+            user_idx, segment_idx, times = (np.concatenate(parts) for parts in zip(*chunks))
+        else:
+            user_idx, segment_idx, times = np.empty(0, np.int64), np.empty(0, np.int64), np.empty((0, 4))
+        return cls(
+            users=_object_column(list(user_index)),
+            segments=_object_column([segment for _, segment in segment_index]),
+            segment_video=_object_column(segment_video),
+            user_idx=user_idx,
+            segment_idx=segment_idx,
+            seg_start=times[:, 0].copy(),
+            seg_end=times[:, 1].copy(),
+            watched_start=times[:, 2].copy(),
+            watched_end=times[:, 3].copy(),
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Builds the columns from a graph_snapshot.GraphSnapshot: every WATCHED edge is expanded to the segments
+        of its video through the HAS_SEGMENT adjacency, without any per-row Python work. Indexes are the
+        snapshot's node indexes, so segments nobody interacted with are included (with no rows).
+        """
+        watched = snapshot.adjacency('WATCHED')
+        has_segment = snapshot.adjacency('HAS_SEGMENT')
+        edge_user = snapshot.edge_sources('WATCHED')
+        edge_video = np.asarray(watched.indices, dtype=np.int64)
+        segment_counts = np.diff(has_segment.indptr)[edge_video]
+        # Row r belongs to WATCHED edge `edge[r]` and is the `offset[r]`-th segment of that edge's video
+        edge = np.repeat(np.arange(len(edge_video)), segment_counts)
+        offset = np.arange(len(edge)) - np.repeat(np.cumsum(segment_counts) - segment_counts, segment_counts)
+        segment_idx = np.asarray(has_segment.indices[has_segment.indptr[edge_video[edge]] + offset], dtype=np.int64)
+
+        video_ids = snapshot.ids('Video')
+        video_of_segment = np.full(snapshot.node_count('Segment'), -1, dtype=np.int64)
+        video_of_segment[has_segment.indices] = snapshot.edge_sources('HAS_SEGMENT')
+        segment_video = _object_column([video_ids[i] if i >= 0 else None for i in video_of_segment.tolist()])
+        return cls(
+            users=np.asarray(snapshot.ids('User')).astype(object),
+            segments=np.asarray(snapshot.ids('Segment')).astype(object),
+            segment_video=segment_video,
+            user_idx=edge_user[edge],
+            segment_idx=segment_idx,
+            seg_start=snapshot.node_property('Segment', 'start')[segment_idx],
+            seg_end=snapshot.node_property('Segment', 'end')[segment_idx],
+            watched_start=snapshot.edge_property('WATCHED', 'video_start_time')[edge],
+            watched_end=snapshot.edge_property('WATCHED', 'video_end_time')[edge],
+        )
+
+    def viewed_mask(self):
+        """
+        True for rows where the watched interval overlaps the segment. Rows without watch times or
+        without overlap count as skipped; a missing segment bound cannot rule out an overlap, so such
+        rows count as viewed.
+        """
+        has_times = ~np.isnan(self.watched_start) & ~np.isnan(self.watched_end)
+        # NaN comparisons are False, so rows without watch times never look like overlaps
+        no_overlap = (self.watched_end < self.seg_start) | (self.watched_start > self.seg_end)
+        return has_times & ~no_overlap
+
+    def viewer_pairs(self):
+        """Returns the distinct (user_idx, segment_idx) pairs of users who watched part of a segment."""
+        return self.distinct_pairs(self.viewed_mask())
+
+    def distinct_pairs(self, mask):
+        """Returns the distinct (user_idx, segment_idx) pairs among the rows selected by mask."""
+        n_users = max(len(self.users), 1)
+        keys = np.unique(self.segment_idx[mask] * n_users + self.user_idx[mask])
+        return keys % n_users, keys // n_users
+
+
+def _float_column(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _object_column(values):
+    # np.array would turn a list of equal-length tuple ids into a 2-D array
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class SegmentSkipStats:
+    """Per-segment view and skip counts (distinct users), one entry per segment."""
+
+    def __init__(self, video, segment, views, skips):
+        self.video = video
+        self.segment = segment
+        self.views = views
+        self.skips = skips
+
+    def __len__(self):
+        return len(self.segment)
+
+    def skip_rate(self):
+        """Skipped users per viewing user; 0 for segments nobody viewed."""
+        return np.divide(self.skips, self.views, out=np.zeros(len(self), dtype=np.float64), where=self.views > 0)
+
+    def index(self):
+        """Returns a dict mapping (video, segment) to the entry position."""
+        return {key: i for i, key in enumerate(zip(self.video, self.segment))}
+
+    @classmethod
+    def from_records(cls, records):
+        """Builds the stats from records with video, segment, views and skips keys (one per segment)."""
+        video, segment, views, skips = [], [], [], []
+        for record in records:
+            video.append(record['video'])
+            segment.append(record['segment'])
+            views.append(record['views'])
+            skips.append(record['skips'])
+        return cls(
+            video=np.array(video, dtype=object),
+            segment=np.array(segment, dtype=object),
+            views=np.array(views, dtype=np.int64),
+            skips=np.array(skips, dtype=np.int64),
+        )
+
+
+def segment_skip_stats(interactions):
+    """
+    Counts distinct viewing and skipping users per segment with vectorized overlap tests and grouped counts.
+    """
+    n_segments = len(interactions.segments)
+    viewed = interactions.viewed_mask()
+    _, viewed_segments = interactions.distinct_pairs(viewed)
+    _, skipped_segments = interactions.distinct_pairs(~viewed)
+    return SegmentSkipStats(
+        video=interactions.segment_video,
+        segment=interactions.segments,
+        views=np.bincount(viewed_segments, minlength=n_segments),
+        skips=np.bincount(skipped_segments, minlength=n_segments),
+    )
+
+
+def compare_skip_stats(a, b):
+    """
+    Returns (video, segment, (views, skips) in a, (views, skips) in b) for every segment whose counts differ
+    between two SegmentSkipStats; segments missing on one side count as (0, 0).
+    """
+    a_index = a.index()
+    b_index = b.index()
+    mismatches = []
+    for key in list(a_index) + [k for k in b_index if k not in a_index]:
+        ours = (int(a.views[a_index[key]]), int(a.skips[a_index[key]])) if key in a_index else (0, 0)
+        theirs = (int(b.views[b_index[key]]), int(b.skips[b_index[key]])) if key in b_index else (0, 0)
+        if ours != theirs:
+            mismatches.append((key[0], key[1], ours, theirs))
+    return mismatches
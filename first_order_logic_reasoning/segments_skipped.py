@@ -1,128 +1,169 @@
-from neo4j import GraphDatabase
-from pyDatalog import pyDatalog
 from dotenv import load_dotenv
 import os
-from collections import defaultdict
+import sys
+import numpy as np
+from segment_overlap import SegmentInteractions, SegmentSkipStats, segment_skip_stats, compare_skip_stats
+from rule_engine import RuleEngine
+from result_stream import FETCH_SIZE, iter_record_batches
+from graph_snapshot import GRAPH_SNAPSHOT_DIR, GraphSnapshot
+
+# Make the shared top-level modules (neo4j_client) importable when run from the repository checkout;
+# the Docker images put them on PYTHONPATH instead
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import instrumentation
+import neo4j_client
+import results_store
+import segment_storage
 
 load_dotenv()
 
-# Neo4j connection details
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")  
-
 SKIP_RATE_THRESHOLD = 0.01
 MIN_SKIPPED = 3  
+# "server" aggregates view/skip counts in Cypher (one row per segment), "client" fetches every
+# user x segment row and aggregates with NumPy; client memory grows with the row count (about 48 bytes
+# per row), so use server mode on large graphs
+SKIP_STATS_MODE = os.getenv("SKIP_STATS_MODE", "server")
+
+# Rules evaluated over the WatchedSegment/ViewedSegment and HighSkipRate facts
+SKIP_RULES = """
+ViewedSegment(V, S) <= WatchedSegment(U, V, S)
+RecommendToSkip(V, S) <= ViewedSegment(V, S) & HighSkipRate(V, S)
+"""
+
 
+def get_user_segment_interactions(tx, layout="nodes", batch_size=FETCH_SIZE):
+    """
+    Streams the user x segment rows in batches and folds each batch into compact columns as it arrives,
+    instead of materializing every Record first. Returns a segment_overlap.SegmentInteractions.
+    layout is the segment storage of the database (see segment_storage.py).
+    """
+    query = segment_storage.INTERACTIONS_QUERIES[layout]
+    result = instrumentation.run(tx, query, name="user_segment_interactions")
+    return SegmentInteractions.from_batches(iter_record_batches(result, batch_size))
 
-def get_user_segment_interactions(tx):
-    query = """
-    MATCH (u:User)-[w:WATCHED]->(v:Video)-[:HAS_SEGMENT]->(s:Segment)
-    RETURN u.id AS user, v.id AS video, s.id AS segment,
-           s.start AS seg_start, s.end AS seg_end,
-           w.video_start_time AS watched_start, w.video_end_time AS watched_end
+def get_segment_skip_counts(tx, layout="nodes"):
+    """
+    Runs the overlap test and the per-segment distinct viewer/skipper counts inside Cypher,
+    so only one row per segment is returned. Same semantics as segment_overlap.segment_skip_stats.
+    """
+    query = segment_storage.SKIP_COUNTS_QUERIES[layout]
+    return SegmentSkipStats.from_records(instrumentation.run(tx, query, name="segment_skip_counts"))
+
+def load_segment_skip_stats(session, mode=SKIP_STATS_MODE, layout=None):
+    """
+    Returns (stats, interactions). interactions is only available in client mode.
+    layout defaults to the segment storage detected in the database.
     """
-    return list(tx.run(query))
+    if mode not in ("server", "client"):
+        raise ValueError(f"Unknown skip stats mode: {mode}")
+    layout = layout or session.execute_read(segment_storage.detect_layout)
+    if mode == "server":
+        return session.execute_read(get_segment_skip_counts, layout), None
+    interactions = session.execute_read(get_user_segment_interactions, layout)
+    return segment_skip_stats(interactions), interactions
+
+def load_snapshot_skip_stats(path=GRAPH_SNAPSHOT_DIR):
+    """
+    Same as the client mode of load_segment_skip_stats, but reads the on-disk graph snapshot instead of Neo4j.
+    """
+    interactions = SegmentInteractions.from_snapshot(GraphSnapshot.open(path))
+    return segment_skip_stats(interactions), interactions
 
-def get_segments_skipped_by_percentage(segment_views, segment_skips, threshold=0.5):
+def get_segments_skipped_by_percentage(stats, threshold=0.5):
     """
     Returns a list of (video, segment, skip_rate, skipped, total) for segments skipped by at least threshold percent of users.
+    `stats` is a segment_overlap.SegmentSkipStats.
     """
-    results = []
-    for seg_id in segment_views:
-        total = len(segment_views[seg_id])
-        skipped = len(segment_skips.get(seg_id, set()))
-        skip_rate = skipped / total if total > 0 else 0
-        if total > 0 and skip_rate >= threshold:
-            results.append((seg_id[0], seg_id[1], skip_rate, skipped, total))
-    return results
-
-def get_segments_skipped_by_number(segment_skips, min_skipped=1):
+    skip_rate = stats.skip_rate()
+    selected = np.flatnonzero((stats.views > 0) & (skip_rate >= threshold))
+    return [
+        (stats.video[i], stats.segment[i], float(skip_rate[i]), int(stats.skips[i]), int(stats.views[i]))
+        for i in selected
+    ]
+
+def get_segments_skipped_by_number(stats, min_skipped=1):
     """
     Returns a list of (video, segment, skipped) for segments skipped by at least min_skipped users.
+    `stats` is a segment_overlap.SegmentSkipStats.
     """
-    results = []
-    for seg_id, skipped_users in segment_skips.items():
-        skipped = len(skipped_users)
-        if skipped >= min_skipped:
-            results.append((seg_id[0], seg_id[1], skipped))
-    return results
-
-def main():
-    pyDatalog.clear()
-    # Declare all logic terms before use
-    pyDatalog.create_terms('WatchedSegment, HighSkipRate, RecommendToSkip, U, V, S')
-
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    with driver.session() as session:
-        user_segment_records = session.execute_read(get_user_segment_interactions)
-
-    segment_views = defaultdict(set)
-    segment_skips = defaultdict(set)
-
-    for record in user_segment_records:
-        seg_id = (record['video'], record['segment'])
-        seg_start = record['seg_start']
-        seg_end = record['seg_end']
-        watched_start = record['watched_start']
-        watched_end = record['watched_end']
-
-        # Only consider users who actually watched some part of the segment
-        if watched_end is not None and watched_start is not None and not (watched_end < seg_start or watched_start > seg_end):
-            segment_views[seg_id].add(record['user'])
-            # Assert WatchedSegment fact for pyDatalog
-            pyDatalog.assert_fact('WatchedSegment', record['user'], record['video'], record['segment'])
+    selected = np.flatnonzero((stats.skips > 0) & (stats.skips >= min_skipped))
+    return [(stats.video[i], stats.segment[i], int(stats.skips[i])) for i in selected]
+
+def load_stats_from_database(mode, cross_check=False):
+    neo4j_client.warmup()
+    with neo4j_client.session(fetch_size=FETCH_SIZE) as session:
+        stats, interactions = load_segment_skip_stats(session, mode)
+        if cross_check:
+            other_mode = "client" if mode == "server" else "server"
+            other_stats, _ = load_segment_skip_stats(session, other_mode)
+            mismatches = compare_skip_stats(stats, other_stats)
+            print(f"Cross-check {mode} vs {other_mode}: {len(mismatches)} mismatching segments")
+            for video, segment, ours, theirs in mismatches[:20]:
+                print(f"Video: {video}, Segment: {segment}, {mode} (views, skips): {ours}, {other_mode}: {theirs}")
+    return stats, interactions
+
+def main(mode=SKIP_STATS_MODE, cross_check=False, snapshot=None):
+    engine = RuleEngine()
+    engine.add_rules(SKIP_RULES)
+
+    with instrumentation.phase("segments_skipped.load"):
+        if snapshot is not None:
+            stats, interactions = load_snapshot_skip_stats(snapshot)
         else:
-            # If no watch times or no overlap, treat as skipped
-            segment_skips[seg_id].add(record['user'])
-
-    for seg_id in segment_views:
-        total = len(segment_views[seg_id])
-        skipped = len(segment_skips.get(seg_id, set()))
-        if total > 0 and skipped / total > SKIP_RATE_THRESHOLD:
-            pyDatalog.assert_fact('HighSkipRate', seg_id[0], seg_id[1])
-
-    # Debug: print number of HighSkipRate facts asserted
-    try:
-        high_skip_facts = pyDatalog.ask('HighSkipRate(V, S)')
-        num_high_skip = len(high_skip_facts.answers) if high_skip_facts is not None else 0
-        print(f"Number of HighSkipRate facts asserted: {num_high_skip}")
-    except AttributeError:
-        print("No HighSkipRate facts asserted.")
-        num_high_skip = 0
-
-    # Define the rule
-    pyDatalog.load('RecommendToSkip(V, S) <= WatchedSegment(U, V, S) & HighSkipRate(V, S)')
-
-    # Query recommendations with error handling
-    print("Recommendations to skip segments:")
-    if num_high_skip > 0:
-        try:
-            result = pyDatalog.ask('RecommendToSkip(V, S)')
-            if result is not None:
-                for v, s in result.answers:
-                    seg_id = (v, s)
-                    total = len(segment_views.get(seg_id, set()))
-                    skipped = len(segment_skips.get(seg_id, set()))
-                    skip_rate = skipped / total if total > 0 else 0
-                    print(f"Video: {v}, Segment: {s}, Skip Rate: {skip_rate:.2f} ({skipped}/{total})")
-            else:
-                print("No recommendations found.")
-        except AttributeError:
-            print("No recommendations found (RecommendToSkip predicate not defined).")
+            stats, interactions = load_stats_from_database(mode, cross_check)
+
+    if interactions is not None:
+        # One WatchedSegment fact per distinct (user, segment) overlap, loaded in bulk
+        viewer_users, viewer_segments = interactions.viewer_pairs()
+        engine.add_facts('WatchedSegment', interactions.users[viewer_users],
+                         interactions.segment_video[viewer_segments], interactions.segments[viewer_segments])
     else:
+        # Server-side counts carry no user ids; a segment with at least one viewer is a viewed segment
+        viewed = stats.views > 0
+        engine.add_facts('ViewedSegment', stats.video[viewed], stats.segment[viewed])
+
+    high_skip_rate = (stats.views > 0) & (stats.skip_rate() > SKIP_RATE_THRESHOLD)
+    engine.add_facts('HighSkipRate', stats.video[high_skip_rate], stats.segment[high_skip_rate])
+    num_high_skip = engine.count('HighSkipRate')
+    print(f"Number of HighSkipRate facts asserted: {num_high_skip}")
+
+    with instrumentation.phase("segments_skipped.rules"):
+        engine.run()
+
+    print("Recommendations to skip segments:")
+    recommended_videos, recommended_segments = engine.ask('RecommendToSkip')
+    recommended = []
+    if len(recommended_videos) > 0:
+        stats_index = stats.index()
+        skip_rates = stats.skip_rate()
+        for v, s in zip(recommended_videos, recommended_segments):
+            i = stats_index[(v, s)]
+            print(f"Video: {v}, Segment: {s}, Skip Rate: {skip_rates[i]:.2f} ({stats.skips[i]}/{stats.views[i]})")
+            recommended.append((v, s, skip_rates[i], stats.skips[i], stats.views[i]))
+    elif num_high_skip == 0:
         print("No recommendations found (no HighSkipRate facts asserted).")
+    else:
+        print("No recommendations found.")
+    if results_store.publish_enabled():
+        results_store.write_table('skip_segments', ['video', 'segment', 'skip_rate', 'skipped', 'viewed'], recommended,
+                                  meta={'skip_rate_threshold': SKIP_RATE_THRESHOLD})
 
     # Example usage after main logic:
-    skipped_segments = get_segments_skipped_by_percentage(segment_views, segment_skips, threshold=SKIP_RATE_THRESHOLD)
+    skipped_segments = get_segments_skipped_by_percentage(stats, threshold=SKIP_RATE_THRESHOLD)
     print(f"Segments skipped by at least {SKIP_RATE_THRESHOLD*100:.0f}% of users:")
     for v, s, skip_rate, skipped, total in skipped_segments:
         print(f"Video: {v}, Segment: {s}, Skip Rate: {skip_rate:.2f} ({skipped}/{total})")
     
-    skipped_by_number = get_segments_skipped_by_number(segment_skips, min_skipped=MIN_SKIPPED)
+    skipped_by_number = get_segments_skipped_by_number(stats, min_skipped=MIN_SKIPPED)
     print(f"Segments skipped by at least {MIN_SKIPPED} users:")
     for v, s, skipped in skipped_by_number:
         print(f"Video: {v}, Segment: {s}, Skipped by: {skipped} users")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Find video segments that users skip.")
+    parser.add_argument('--mode', choices=['server', 'client'], default=SKIP_STATS_MODE, help='Aggregate view/skip counts in Cypher (server) or in Python (client)')
+    parser.add_argument('--cross-check', action='store_true', help='Also run the other mode and report segments whose counts differ')
+    parser.add_argument('--snapshot', nargs='?', const=GRAPH_SNAPSHOT_DIR, metavar='DIR', help='Read the on-disk graph snapshot (see graph_snapshot.py) instead of querying Neo4j')
+    args = parser.parse_args()
+    main(mode=args.mode, cross_check=args.cross_check, snapshot=args.snapshot)
\ No newline at end of file
@@ -0,0 +1,257 @@
+import os
+import numpy as np
+
+# Columnar playback-speed analytics. A speed sample is one WATCHED edge with a usable
+# video_progress_time / local_watching_time ratio; all statistics are grouped NumPy passes over those samples.
+
+# Histogram bin edges for speed ratios. The first and last bins are open-ended, so every sample lands in a bin.
+SPEED_HISTOGRAM_BINS = tuple(float(edge) for edge in os.getenv(
+    "SPEED_HISTOGRAM_BINS", "0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,3.0").split(","))
+SPEED_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class SpeedSamples:
+    """
+    Speed ratios as NumPy columns. `users` and `videos` hold the distinct ids, `user_idx` and `video_idx`
+    index into them. Only rows where both times are present, progress is non-zero and local time is
+    positive are kept (the same rows recommend_playback_speeds counts).
+    """
+
+    # Column order of the value tuples accepted by from_batches
+    COLUMNS = ('user_id', 'video_id', 'video_progress_time', 'local_watching_time')
+
+    def __init__(self, users, videos, user_idx, video_idx, speed):
+        self.users = users
+        self.videos = videos
+        self.user_idx = user_idx
+        self.video_idx = video_idx
+        self.speed = speed
+
+    def __len__(self):
+        return len(self.speed)
+
+    @classmethod
+    def from_records(cls, records):
+        return cls.from_batches([[tuple(record.get(key) for key in cls.COLUMNS) for record in records]])
+
+    @classmethod
+    def from_batches(cls, batches):
+        """Builds the columns batch by batch from value tuples in COLUMNS order (see result_stream)."""
+        user_index = {}
+        video_index = {}
+        chunks = []
+        for batch in batches:
+            user_idx = np.fromiter((user_index.setdefault(row[0], len(user_index)) for row in batch), np.int64, len(batch))
+            video_idx = np.fromiter((video_index.setdefault(row[1], len(video_index)) for row in batch), np.int64, len(batch))
+            progress = _float_column([row[2] for row in batch])
+            local = _float_column([row[3] for row in batch])
+            valid = _valid(progress, local)
+            chunks.append((user_idx[valid], video_idx[valid], progress[valid] / local[valid]))
+        if chunks:
+            user_idx, video_idx, speed = (np.concatenate(parts) for parts in zip(*chunks))
+        else:
+            user_idx, video_idx, speed = np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+        return cls(_object_column(list(user_index)), _object_column(list(video_index)), user_idx, video_idx, speed)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Reads the WATCHED columns of a graph_snapshot.GraphSnapshot; indexes are the snapshot's node indexes."""
+        progress = snapshot.edge_property('WATCHED', 'video_progress_time')
+        local = snapshot.edge_property('WATCHED', 'local_watching_time')
+        valid = _valid(progress, local)
+        return cls(
+            users=snapshot.ids('User'),
+            videos=snapshot.ids('Video'),
+            user_idx=snapshot.edge_sources('WATCHED')[valid],
+            video_idx=np.asarray(snapshot.adjacency('WATCHED').indices[valid], dtype=np.int64),
+            speed=progress[valid] / local[valid],
+        )
+
+
+def _valid(progress, local):
+    # NaN marks a missing value; comparisons with NaN are False
+    return (progress != 0) & ~np.isnan(progress) & (local > 0)
+
+
+def _float_column(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _object_column(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class SpeedDistribution:
+    """
+    Per-group speed statistics (a group is a video or a course):
+    samples, distinct users, mean, percentile values (groups x percentiles) and histogram counts (groups x bins).
+    The distinct speeds rounded to 0.01 with their sample counts are kept as flat
+    (speed_group, speed_value, speed_count) columns for recommendations.
+    """
+
+    def __init__(self, groups, samples, users, mean, percentiles, percentile_values, bin_edges, histogram,
+                 speed_group, speed_value, speed_count):
+        self.groups = groups
+        self.samples = samples
+        self.users = users
+        self.mean = mean
+        self.percentiles = percentiles
+        self.percentile_values = percentile_values
+        self.bin_edges = bin_edges
+        self.histogram = histogram
+        self.speed_group = speed_group
+        self.speed_value = speed_value
+        self.speed_count = speed_count
+
+    def __len__(self):
+        return len(self.groups)
+
+    def percentile(self, q):
+        """Returns the column of percentile q for every group."""
+        return self.percentile_values[:, list(self.percentiles).index(q)]
+
+    def recommendations(self, threshold_percentage, threshold_number):
+        """
+        Returns (group, speed, sample count, distinct users) for every rounded speed used at least
+        threshold_number times or by at least threshold_percentage of the group's users.
+        """
+        total = self.users[self.speed_group]
+        share = np.divide(self.speed_count, total, out=np.zeros(len(total)), where=total > 0)
+        selected = np.flatnonzero((self.speed_count >= threshold_number) | ((total > 0) & (share >= threshold_percentage)))
+        return [
+            (self.groups[self.speed_group[i]], float(self.speed_value[i]), int(self.speed_count[i]), int(total[i]))
+            for i in selected
+        ]
+
+
+def speed_distribution(groups, group_idx, user_idx, speed, bin_edges=SPEED_HISTOGRAM_BINS, percentiles=SPEED_PERCENTILES):
+    """
+    Computes a SpeedDistribution for samples already assigned to groups, in one sort plus grouped counts.
+    Percentiles interpolate linearly between the sorted samples of a group (NaN for empty groups).
+    """
+    n_groups = len(groups)
+    # Sort by speed, then stably by group. A group column that fits 16 bits takes NumPy's radix sort,
+    # which is several times faster than lexsort on tens of millions of rows.
+    order = np.argsort(speed)
+    group_dtype = np.uint16 if n_groups <= 1 << 16 else np.int64
+    order = order[np.argsort(group_idx[order].astype(group_dtype), kind='stable')]
+    group_idx, user_idx, speed = group_idx[order], user_idx[order], speed[order]
+
+    samples = np.bincount(group_idx, minlength=n_groups)
+    starts = np.cumsum(samples) - samples
+    mean = np.divide(np.bincount(group_idx, weights=speed, minlength=n_groups), samples,
+                     out=np.full(n_groups, np.nan), where=samples > 0)
+
+    q = np.asarray(percentiles, dtype=np.float64) / 100
+    position = starts[:, None] + np.maximum(samples[:, None] - 1, 0) * q
+    lo = np.floor(position).astype(np.int64)
+    hi = np.ceil(position).astype(np.int64)
+    if len(speed):
+        lo = np.minimum(lo, len(speed) - 1)
+        hi = np.minimum(hi, len(speed) - 1)
+        percentile_values = speed[lo] + (speed[hi] - speed[lo]) * (position - lo)
+        percentile_values[samples == 0] = np.nan
+    else:
+        percentile_values = np.full((n_groups, len(q)), np.nan)
+
+    edges = np.asarray(bin_edges, dtype=np.float64)
+    n_bins = len(edges) - 1
+    bins = np.clip(np.searchsorted(edges, speed, side='right') - 1, 0, n_bins - 1)
+    histogram = np.bincount(group_idx * n_bins + bins, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+    n_users = int(user_idx.max()) + 1 if len(user_idx) else 1
+    users = np.bincount(_distinct(group_idx * n_users + user_idx) // n_users, minlength=n_groups)
+
+    # Samples are sorted by speed within each group, so equal rounded speeds are adjacent
+    hundredths = np.rint(speed * 100).astype(np.int64)
+    first = np.flatnonzero(np.concatenate((
+        [True], (group_idx[1:] != group_idx[:-1]) | (hundredths[1:] != hundredths[:-1])
+    ))) if len(speed) else np.empty(0, np.int64)
+    return SpeedDistribution(
+        groups=groups,
+        samples=samples,
+        users=users,
+        mean=mean,
+        percentiles=tuple(percentiles),
+        percentile_values=percentile_values,
+        bin_edges=edges,
+        histogram=histogram,
+        speed_group=group_idx[first],
+        speed_value=hundredths[first] / 100,
+        speed_count=np.diff(np.append(first, len(speed))),
+    )
+
+
+def _distinct(values):
+    # np.unique without its extra bookkeeping; noticeably faster on large int arrays
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))] if len(values) else values
+
+
+def video_speed_distribution(samples, **kwargs):
+    return speed_distribution(samples.videos, samples.video_idx, samples.user_idx, samples.speed, **kwargs)
+
+
+def course_speed_distribution(samples, part_of_videos, part_of_courses, **kwargs):
+    """
+    Rolls samples up to courses through PART_OF pairs (parallel arrays of video and course ids).
+    A video in several courses contributes its samples to each of them; videos in no course are left out.
+    """
+    video_index = {video: i for i, video in enumerate(np.asarray(samples.videos).tolist())}
+    pair_video = np.fromiter((video_index.get(v, -1) for v in np.asarray(part_of_videos).tolist()), np.int64, len(part_of_videos))
+    courses, pair_course = np.unique(np.asarray(part_of_courses, dtype=str), return_inverse=True)
+    known = pair_video >= 0
+    pair_video, pair_course = pair_video[known], pair_course[known]
+
+    # Courses of every video as CSR, then one output row per (sample, course of its video)
+    order = np.argsort(pair_video, kind='stable')
+    course_counts = np.bincount(pair_video, minlength=len(samples.videos))
+    indptr = np.cumsum(course_counts) - course_counts
+    reps = course_counts[samples.video_idx]
+    row = np.repeat(np.arange(len(samples)), reps)
+    offset = np.arange(len(row)) - np.repeat(np.cumsum(reps) - reps, reps)
+    course_idx = pair_course[order][indptr[samples.video_idx[row]] + offset]
+    return speed_distribution(_object_column(courses.tolist()), course_idx.astype(np.int64),
+                              samples.user_idx[row], samples.speed[row], **kwargs)
+
+
+def stored_speed_distribution(groups, samples, users, speed_sum, bin_edges, histogram, speed_values, speed_counts,
+                              percentiles=SPEED_PERCENTILES):
+    """
+    Builds a SpeedDistribution from the viewing statistics seeding stores on Video and Course nodes (see
+    viewing_stats.py), one entry per group; no per-sample data is needed. Counts, means and histograms
+    match speed_distribution; percentiles are interpolated over the speeds rounded to 0.01.
+    """
+    distinct_edges = {tuple(e) for e in bin_edges}
+    if len(distinct_edges) > 1:
+        raise ValueError("The stored speed histograms use different bin edges; seed again to recompute them")
+    edges = np.asarray(next(iter(distinct_edges), SPEED_HISTOGRAM_BINS), dtype=np.float64)
+    samples = np.asarray(samples, dtype=np.int64)
+    q = np.asarray(percentiles, dtype=np.float64) / 100
+    percentile_values = np.full((len(groups), len(q)), np.nan)
+    for i, (values, counts) in enumerate(zip(speed_values, speed_counts)):
+        if not samples[i]:
+            continue
+        values = np.asarray(values, dtype=np.float64)
+        ends = np.cumsum(counts)
+        position = (samples[i] - 1) * q
+        lo = values[np.searchsorted(ends, np.floor(position), side='right')]
+        hi = values[np.searchsorted(ends, np.ceil(position), side='right')]
+        percentile_values[i] = lo + (hi - lo) * (position - np.floor(position))
+    lengths = [len(values) for values in speed_values]
+    return SpeedDistribution(
+        groups=_object_column(list(groups)),
+        samples=samples,
+        users=np.asarray(users, dtype=np.int64),
+        mean=np.divide(np.asarray(speed_sum, dtype=np.float64), samples, out=np.full(len(samples), np.nan),
+                       where=samples > 0),
+        percentiles=tuple(percentiles),
+        percentile_values=percentile_values,
+        bin_edges=edges,
+        histogram=np.asarray(histogram, dtype=np.int64).reshape(len(groups), len(edges) - 1),
+        speed_group=np.repeat(np.arange(len(groups)), lengths),
+        speed_value=np.concatenate([np.asarray(v, dtype=np.float64) for v in speed_values]) if lengths else np.empty(0),
+        speed_count=np.concatenate([np.asarray(c, dtype=np.int64) for c in speed_counts]) if lengths else np.empty(0, np.int64),
+    )
@@ -1,59 +1,238 @@
-from neo4j import GraphDatabase
 from collections import defaultdict, Counter
 from dotenv import load_dotenv
 import os
+import sys
+import numpy as np
+from result_stream import FETCH_SIZE, iter_record_batches
+from graph_snapshot import GRAPH_SNAPSHOT_DIR, GraphSnapshot
+from speed_analytics import SpeedSamples, video_speed_distribution, course_speed_distribution, stored_speed_distribution
 
-load_dotenv()
+# Make the shared top-level modules (neo4j_client) importable when run from the repository checkout;
+# the Docker images put them on PYTHONPATH instead
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import instrumentation
+import neo4j_client
+import results_store
 
-NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
+load_dotenv()
 
 THRESHOLD_PERCENTAGE = 0.3  # 30% of users
 THRESHOLD_NUMBER = 1        # or at least x users
+# "vectorized" computes per-video and per-course distributions with NumPy (speed_analytics),
+# "records" runs the original per-record recommendation loop,
+# "stats" reads the statistics seeding stores on Video and Course nodes (viewing_stats.py), one row per node
+SPEED_ANALYTICS_MODE = os.getenv("SPEED_ANALYTICS_MODE", "vectorized")
 
 # Query user-video interactions from the knowledge graph
 
-def get_user_video_acts(tx):
+def get_user_video_acts(tx, batch_size=FETCH_SIZE):
+    """
+    Streams the WATCHED rows in batches into a PlaybackSpeedStats, so no Record list is built.
+    """
+    query = """
+    MATCH (u:User)-[w:WATCHED]->(v:Video)
+    RETURN u.id AS user_id, v.id AS video_id, w.video_progress_time AS video_progress_time, w.local_watching_time AS local_watching_time
+    """
+    stats = PlaybackSpeedStats()
+    for batch in iter_record_batches(instrumentation.run(tx, query, name="user_video_acts"), batch_size):
+        stats.add_batch(batch)
+    return stats
+
+
+def get_speed_samples(tx, batch_size=FETCH_SIZE):
+    """Streams the WATCHED rows into a speed_analytics.SpeedSamples."""
     query = """
     MATCH (u:User)-[w:WATCHED]->(v:Video)
     RETURN u.id AS user_id, v.id AS video_id, w.video_progress_time AS video_progress_time, w.local_watching_time AS local_watching_time
     """
-    return list(tx.run(query))
+    return SpeedSamples.from_batches(iter_record_batches(instrumentation.run(tx, query, name="speed_samples"), batch_size))
+
+
+def get_video_courses(tx):
+    """Returns the PART_OF pairs as two parallel lists (video ids, course ids)."""
+    query = """
+    MATCH (v:Video)-[:PART_OF]->(c:Course)
+    RETURN v.id AS video_id, c.id AS course_id
+    """
+    videos, courses = [], []
+    for batch in iter_record_batches(instrumentation.run(tx, query, name="video_courses")):
+        for video, course in batch:
+            videos.append(video)
+            courses.append(course)
+    return videos, courses
+
+
+# Viewing statistics stored by seeding (see viewing_stats.py), in the argument order of stored_speed_distribution
+STORED_STATS_QUERY = """
+MATCH (n:{label}) WHERE n.speed_samples IS NOT NULL
+RETURN n.id AS id, n.speed_samples AS samples, n.speed_users AS users, n.speed_sum AS speed_sum,
+       n.speed_histogram_edges AS bin_edges, n.speed_histogram AS histogram,
+       n.speed_values AS speed_values, n.speed_counts AS speed_counts
+"""
+
+
+def get_stored_distribution(tx, label, batch_size=FETCH_SIZE):
+    """Reads the stored viewing statistics of every Video or Course node into a speed_analytics.SpeedDistribution."""
+    result = instrumentation.run(tx, STORED_STATS_QUERY.format(label=label), name=f"stored_{label.lower()}_stats")
+    rows = [row for batch in iter_record_batches(result, batch_size) for row in batch]
+    return stored_speed_distribution(*(zip(*rows) if rows else [()] * 8))
+
+
+class PlaybackSpeedStats:
+    """
+    Running per-video playback speed counts. Rows are (user_id, video_id, video_progress_time, local_watching_time)
+    tuples, added one batch at a time.
+    """
+
+    def __init__(self):
+        self.video_speed_counts = defaultdict(Counter)
+        self.video_users = defaultdict(set)
+
+    def add_batch(self, rows):
+        for user, v, progress, local in rows:
+            if progress and local and local > 0:
+                speed = round(progress / local, 2)
+                self.video_speed_counts[v][speed] += 1
+                self.video_users[v].add(user)
+
+    @classmethod
+    def from_records(cls, user_video_acts):
+        stats = cls()
+        stats.add_batch((act['user_id'], act['video_id'], act.get('video_progress_time'), act.get('local_watching_time'))
+                        for act in user_video_acts)
+        return stats
+
+    @classmethod
+    def from_snapshot(cls, snapshot, batch_size=FETCH_SIZE):
+        """Reads the WATCHED columns of a graph_snapshot.GraphSnapshot instead of querying Neo4j."""
+        user_ids = snapshot.ids('User')
+        video_ids = snapshot.ids('Video')
+        users = snapshot.edge_sources('WATCHED')
+        videos = snapshot.adjacency('WATCHED').indices
+        progress = snapshot.edge_property('WATCHED', 'video_progress_time')
+        local = snapshot.edge_property('WATCHED', 'local_watching_time')
+        stats = cls()
+        for start in range(0, len(videos), batch_size):
+            window = slice(start, start + batch_size)
+            # NaN marks a missing value in the snapshot; the record path sees None there
+            stats.add_batch(zip(
+                user_ids[users[window]].tolist(), video_ids[videos[window]].tolist(),
+                [None if p != p else p for p in progress[window].tolist()],
+                [None if t != t else t for t in local[window].tolist()],
+            ))
+        return stats
+
+    def recommendations(self, threshold_percentage=THRESHOLD_PERCENTAGE, threshold_number=THRESHOLD_NUMBER):
+        recommendations = []
+        for v, speed_counts in self.video_speed_counts.items():
+            total_users = len(self.video_users[v])
+            for p, count in speed_counts.items():
+                if count >= threshold_number or (total_users > 0 and count / total_users >= threshold_percentage):
+                    recommendations.append({'video_id': v, 'speed': p, 'user_count': count, 'total_users': total_users})
+        return recommendations
 
 
 def recommend_playback_speeds(user_video_acts, threshold_percentage=THRESHOLD_PERCENTAGE, threshold_number=THRESHOLD_NUMBER):
-    video_speed_counts = defaultdict(Counter)
-    video_user_counts = defaultdict(set)
-
-    for act in user_video_acts:
-        v = act['video_id']
-        user = act['user_id']
-        progress = act.get('video_progress_time')
-        local = act.get('local_watching_time')
-        if progress and local and local > 0:
-            speed = round(progress / local, 2)
-            video_speed_counts[v][speed] += 1
-            video_user_counts[v].add(user)
-
-    recommendations = []
-    for v, speed_counts in video_speed_counts.items():
-        total_users = len(video_user_counts[v])
-        for p, count in speed_counts.items():
-            if count >= threshold_number or (total_users > 0 and count / total_users >= threshold_percentage):
-                recommendations.append({'video_id': v, 'speed': p, 'user_count': count, 'total_users': total_users})
-    return recommendations
-
-
-def main():
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    with driver.session() as session:
-        user_video_acts = session.execute_read(get_user_video_acts)
-    recs = recommend_playback_speeds(user_video_acts)
+    """`user_video_acts` is either a PlaybackSpeedStats or an iterable of records/dicts."""
+    if not isinstance(user_video_acts, PlaybackSpeedStats):
+        user_video_acts = PlaybackSpeedStats.from_records(user_video_acts)
+    return user_video_acts.recommendations(threshold_percentage, threshold_number)
+
+
+def print_distribution(label, distribution):
+    median = distribution.percentile(50)
+    p90 = distribution.percentile(90)
+    edges = distribution.bin_edges
+    bins = [f"<{edges[1]:g}"] + [f"{lo:g}-{hi:g}" for lo, hi in zip(edges[1:-2], edges[2:-1])] + [f">={edges[-2]:g}"]
+    for i in np.flatnonzero(distribution.samples > 0):
+        histogram = ", ".join(f"{b}: {c}" for b, c in zip(bins, distribution.histogram[i]) if c)
+        print(f"{label}: {distribution.groups[i]}, Samples: {distribution.samples[i]}, Users: {distribution.users[i]}, "
+              f"Mean: {distribution.mean[i]:.2f}x, Median: {median[i]:.2f}x, P90: {p90[i]:.2f}x, Histogram: {histogram}")
+
+
+def publish_speeds(recommendations, by_course=None):
+    """Publishes (video, speed, user_count, total_users) rows and per-course summaries for the recommendation service."""
+    if not results_store.publish_enabled():
+        return
+    results_store.write_table('playback_speeds', ['video', 'speed', 'user_count', 'total_users'], recommendations,
+                              meta={'threshold_percentage': THRESHOLD_PERCENTAGE, 'threshold_number': THRESHOLD_NUMBER})
+    if by_course is not None:
+        present = np.flatnonzero(by_course.samples > 0)
+        median = by_course.percentile(50)
+        p90 = by_course.percentile(90)
+        results_store.write_table('course_speeds', ['course', 'samples', 'users', 'mean', 'median', 'p90'], [
+            (by_course.groups[i], by_course.samples[i], by_course.users[i], by_course.mean[i], median[i], p90[i])
+            for i in present
+        ])
+
+
+def main(snapshot=None, mode=SPEED_ANALYTICS_MODE, distributions=False):
+    if mode == "records":
+        with instrumentation.phase("video_speed.load"):
+            if snapshot is not None:
+                user_video_acts = PlaybackSpeedStats.from_snapshot(GraphSnapshot.open(snapshot))
+            else:
+                neo4j_client.warmup()
+                user_video_acts = neo4j_client.execute_read(get_user_video_acts, session_config={'fetch_size': FETCH_SIZE})
+        recs = recommend_playback_speeds(user_video_acts)
+        print("Recommended playback speeds:")
+        for rec in recs:
+            if rec['user_count'] >= THRESHOLD_NUMBER:
+                print(f"Video: {rec['video_id']}, Speed: {rec['speed']}x, Used by: {rec['user_count']}/{rec['total_users']} users")
+        publish_speeds([(r['video_id'], r['speed'], r['user_count'], r['total_users']) for r in recs])
+        return
+    if mode == "stats":
+        if snapshot is not None:
+            raise ValueError("The stats mode reads the statistics stored in Neo4j and cannot use a snapshot")
+        with instrumentation.phase("video_speed.load"):
+            neo4j_client.warmup()
+            by_video = neo4j_client.execute_read(get_stored_distribution, "Video", session_config={'fetch_size': FETCH_SIZE})
+            by_course = neo4j_client.execute_read(get_stored_distribution, "Course", session_config={'fetch_size': FETCH_SIZE})
+        if not len(by_video):
+            raise SystemExit("No viewing statistics are stored on the videos; seed again to compute them "
+                             "(SEED_INCREMENTAL=True adds them without reseeding)")
+        report_speeds(by_video, by_course, distributions)
+        return
+    if mode != "vectorized":
+        raise ValueError(f"Unknown speed analytics mode: {mode}")
+
+    with instrumentation.phase("video_speed.load"):
+        if snapshot is not None:
+            graph = GraphSnapshot.open(snapshot)
+            samples = SpeedSamples.from_snapshot(graph)
+            part_of = graph.adjacency('PART_OF')
+            part_of_videos = graph.ids('Video')[graph.edge_sources('PART_OF')]
+            part_of_courses = graph.ids('Course')[part_of.indices]
+        else:
+            neo4j_client.warmup()
+            samples = neo4j_client.execute_read(get_speed_samples, session_config={'fetch_size': FETCH_SIZE})
+            part_of_videos, part_of_courses = neo4j_client.execute_read(get_video_courses, session_config={'fetch_size': FETCH_SIZE})
+
+    with instrumentation.phase("video_speed.distributions"):
+        by_video = video_speed_distribution(samples)
+        by_course = course_speed_distribution(samples, part_of_videos, part_of_courses)
+    report_speeds(by_video, by_course, distributions)
+
+
+def report_speeds(by_video, by_course, distributions=False):
+    recs = by_video.recommendations(THRESHOLD_PERCENTAGE, THRESHOLD_NUMBER)
     print("Recommended playback speeds:")
-    for rec in recs:
-        if rec['user_count'] >= THRESHOLD_NUMBER:
-            print(f"Video: {rec['video_id']}, Speed: {rec['speed']}x, Used by: {rec['user_count']}/{rec['total_users']} users")
+    for video, speed, count, total in recs:
+        if count >= THRESHOLD_NUMBER:
+            print(f"Video: {video}, Speed: {speed}x, Used by: {count}/{total} users")
+    publish_speeds(recs, by_course)
+    print("Playback speeds per course:")
+    print_distribution("Course", by_course)
+    if distributions:
+        print("Playback speeds per video:")
+        print_distribution("Video", by_video)
+
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Recommend playback speeds per video.")
+    parser.add_argument('--snapshot', nargs='?', const=GRAPH_SNAPSHOT_DIR, metavar='DIR', help='Read the on-disk graph snapshot (see graph_snapshot.py) instead of querying Neo4j')
+    parser.add_argument('--mode', choices=['vectorized', 'records', 'stats'], default=SPEED_ANALYTICS_MODE, help='NumPy distributions per video and course (vectorized), the per-record loop (records) or the statistics stored by seeding (stats)')
+    parser.add_argument('--distributions', action='store_true', help='Also print the speed distribution of every video')
+    args = parser.parse_args()
+    main(snapshot=args.snapshot, mode=args.mode, distributions=args.distributions)
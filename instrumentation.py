@@ -0,0 +1,252 @@
+import atexit
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Metrics for the database calls of the seeding, reasoning and embedding scripts.
+#
+# Statements sent through run() are recorded per phase (see phase()) and statement name:
+#   calls, rows sent (UNWIND batches), rows returned, client wall time from run to fully consumed,
+#   server time until the first record and until consumed, update counters from the ResultSummary,
+#   and db hits when the statement was profiled.
+# With METRICS_DIR set, every process writes one JSON file <METRICS_DIR>/<script>-<timestamp>-<pid>.json at exit,
+# statements sorted by wall time so the dominant one comes first. Without it, run() is a plain tx.run.
+#
+# PROFILE_STATEMENTS (comma-separated statement names, or "all") runs those statements with PROFILE and
+# writes the plan of their slowest call to <PROFILE_DIR>/<phase>--<name>.json. PROFILE makes the server
+# track every row, so only enable it for the statements being investigated.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+PROFILE_STATEMENTS = {s.strip() for s in os.getenv("PROFILE_STATEMENTS", "").split(",") if s.strip()}
+PROFILE_DIR = os.getenv("PROFILE_DIR", "query_profiles")
+
+COUNTERS = (
+    "nodes_created", "nodes_deleted", "relationships_created", "relationships_deleted", "properties_set",
+    "labels_added", "labels_removed", "indexes_added", "indexes_removed", "constraints_added",
+    "constraints_removed", "system_updates",
+)
+
+_lock = threading.Lock()
+_phases = {}
+_phase_stack = []
+_statements = {}
+_started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+_start = time.perf_counter()
+
+
+def enabled():
+    return bool(METRICS_DIR or PROFILE_STATEMENTS)
+
+
+def should_profile(name):
+    return "all" in PROFILE_STATEMENTS or name in PROFILE_STATEMENTS
+
+
+def current_phase():
+    with _lock:
+        return "/".join(_phase_stack) or None
+
+
+@contextmanager
+def phase(name):
+    """
+    Times a phase of a run. Phases nest ("seed/watched"); statements are attributed to the innermost one,
+    also when they are sent from worker threads while the phase is open. Repeated phases are summed.
+    """
+    if not enabled():
+        yield
+        return
+    with _lock:
+        _phase_stack.append(name)
+        path = "/".join(_phase_stack)
+        entry = _phases.setdefault(path, {"phase": path, "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                          "runs": 0, "seconds": 0.0})
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            entry["runs"] += 1
+            entry["seconds"] += time.perf_counter() - start
+            _phase_stack.pop()
+
+
+def statement_name(query):
+    """Default name of a statement: the start of its text, without a leading UNWIND $rows AS row."""
+    text = re.sub(r"^UNWIND \$\w+ AS \w+ ", "", " ".join(query.split()))
+    return text[:60]
+
+
+def run(runner, query, parameters=None, name=None, input_rows=None, **kwargs):
+    """
+    runner.run(query, parameters, **kwargs) for a session or transaction, recorded under `name`
+    (default: statement_name(query)). input_rows is the number of rows sent with the statement, e.g. the
+    length of an UNWIND batch. The statement is recorded once its result has been iterated or consumed.
+    """
+    if not enabled():
+        return runner.run(query, parameters, **kwargs)
+    name = name or statement_name(query)
+    profiled = should_profile(name) and not query.lstrip().upper().startswith(("PROFILE", "EXPLAIN"))
+    start = time.perf_counter()
+    result = runner.run("PROFILE " + query if profiled else query, parameters, **kwargs)
+    return MeteredResult(result, current_phase(), name, query, input_rows or 0, start, profiled)
+
+
+class MeteredResult:
+    """Wraps a driver Result: counts the records as they are read and records the statement when done."""
+
+    def __init__(self, result, phase_name, name, query, input_rows, start, profiled):
+        self._result = result
+        self._phase = phase_name
+        self._name = name
+        self._query = query
+        self._input_rows = input_rows
+        self._start = start
+        self._profiled = profiled
+        self._rows = 0
+        self._done = False
+
+    def __iter__(self):
+        for record in self._result:
+            self._rows += 1
+            yield record
+        self._finish()
+
+    def single(self, strict=False):
+        record = self._result.single(strict=strict) if strict else self._result.single()
+        self._rows += record is not None
+        self._finish()
+        return record
+
+    def data(self, *keys):
+        data = self._result.data(*keys)
+        self._rows += len(data)
+        self._finish()
+        return data
+
+    def consume(self):
+        return self._finish()
+
+    def __getattr__(self, attribute):
+        return getattr(self._result, attribute)
+
+    def _finish(self):
+        summary = self._result.consume()
+        if not self._done:
+            self._done = True
+            _record(self._phase, self._name, self._query, self._input_rows, self._rows,
+                    time.perf_counter() - self._start, summary, self._profiled)
+        return summary
+
+
+def _db_hits(plan):
+    if not plan:
+        return 0
+    return plan.get("dbHits", 0) + sum(_db_hits(child) for child in plan.get("children", ()))
+
+
+def _record(phase_name, name, query, input_rows, output_rows, seconds, summary, profiled):
+    counters = getattr(summary, "counters", None)
+    plan = getattr(summary, "profile", None) if profiled else None
+    with _lock:
+        entry = _statements.get((phase_name, name))
+        if entry is None:
+            entry = _statements[(phase_name, name)] = {
+                "phase": phase_name, "statement": name, "query": " ".join(query.split())[:500],
+                "calls": 0, "input_rows": 0, "output_rows": 0, "seconds": 0.0, "max_seconds": 0.0,
+                "server_available_ms": 0, "server_consumed_ms": 0, "counters": {}, "db_hits": None,
+            }
+        entry["calls"] += 1
+        entry["input_rows"] += input_rows
+        entry["output_rows"] += output_rows
+        entry["seconds"] += seconds
+        entry["server_available_ms"] += getattr(summary, "result_available_after", None) or 0
+        entry["server_consumed_ms"] += getattr(summary, "result_consumed_after", None) or 0
+        for counter in COUNTERS:
+            value = getattr(counters, counter, 0) if counters is not None else 0
+            if value:
+                entry["counters"][counter] = entry["counters"].get(counter, 0) + value
+        if plan is not None:
+            entry["db_hits"] = (entry["db_hits"] or 0) + _db_hits(plan)
+            if seconds >= entry["max_seconds"]:
+                entry["plan"] = plan
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+
+def _with_rates(entry, rows):
+    seconds = entry["seconds"]
+    return {**entry, "seconds": round(seconds, 4), "rows_per_second": round(rows / seconds, 1) if seconds else None}
+
+
+def snapshot():
+    """Returns the metrics collected so far as a JSON-serializable dict (plans omitted)."""
+    with _lock:
+        statements = [dict(entry) for entry in _statements.values()]
+        phases = [dict(entry) for entry in _phases.values()]
+    for entry in statements:
+        entry.pop("plan", None)
+        entry["max_seconds"] = round(entry["max_seconds"], 4)
+    for entry in phases:
+        entry["seconds"] = round(entry["seconds"], 4)
+        inside = [s for s in statements
+                  if s["phase"] and (s["phase"] == entry["phase"] or s["phase"].startswith(entry["phase"] + "/"))]
+        entry["statements"] = sum(s["calls"] for s in inside)
+        entry["rows"] = sum(s["input_rows"] + s["output_rows"] for s in inside)
+        entry["db_seconds"] = round(sum(s["seconds"] for s in inside), 4)
+        entry["rows_per_second"] = round(entry["rows"] / entry["seconds"], 1) if entry["seconds"] else None
+    statements = [_with_rates(s, s["input_rows"] + s["output_rows"]) for s in statements]
+    statements.sort(key=lambda s: s["seconds"], reverse=True)
+    return {
+        "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python",
+        "started_at": _started_at,
+        "seconds": round(time.perf_counter() - _start, 4),
+        "phases": phases,
+        "statements": statements,
+    }
+
+
+def _file_part(text):
+    return re.sub(r"[^\w.-]+", "_", text or "none").strip("_")[:80]
+
+
+def write_profiles(directory=PROFILE_DIR):
+    """Writes the plan of every profiled statement's slowest call. Returns the paths written."""
+    with _lock:
+        profiled = [dict(entry) for entry in _statements.values() if "plan" in entry]
+    if not profiled:
+        return []
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for entry in profiled:
+        path = os.path.join(directory, f"{_file_part(entry['phase'])}--{_file_part(entry['statement'])}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"phase": entry["phase"], "statement": entry["statement"], "query": entry["query"],
+                       "seconds": round(entry["max_seconds"], 4), "db_hits": _db_hits(entry["plan"]),
+                       "plan": entry["plan"]}, f, indent=2, default=str)
+        paths.append(path)
+    return paths
+
+
+def write_metrics(directory=METRICS_DIR):
+    """Writes the metrics of this process as JSON. Returns the path."""
+    metrics = snapshot()
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(metrics["script"])[0]
+    path = os.path.join(directory, f"{_file_part(stem)}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2, default=str)
+    return path
+
+
+def _write_at_exit():
+    if PROFILE_STATEMENTS:
+        for path in write_profiles():
+            print(f"Query profile written to {path}", flush=True)
+    if METRICS_DIR and (_statements or _phases):
+        print(f"Metrics written to {write_metrics()}", flush=True)
+
+
+atexit.register(_write_at_exit)
@@ -0,0 +1,423 @@
+import json
+import marshal
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from itertools import accumulate, islice, repeat
+
+# Names of the MOOC source files (without extension) used by the seeding and subsetting scripts
+MOOC_FILES = ("user_video_act", "user", "course", "video")
+
+# File extension per on-disk format; open_mooc_sources reads whichever is present (see mooc_path)
+MOOC_FORMATS = {"json": ".json", "columnar": ".mcol"}
+
+# Characters that may surround records in a JSON array or JSON Lines file
+_SEPARATORS = " \t\r\n,[]"
+
+
+def iter_json_records(path, chunk_size=1 << 20):
+    """
+    Yields the top-level objects of a JSON array file one at a time without loading the whole file.
+    Newline-separated objects (JSON Lines) are read the same way.
+    Args:
+        path: Path to the JSON file.
+        chunk_size: Number of characters read from disk at a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        read_size = chunk_size
+        while True:
+            # Skip array brackets, commas and whitespace between records
+            while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    return
+                buffer = f.read(chunk_size)
+                pos = 0
+                eof = not buffer
+                continue
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The record continues past the buffer; read more (growing the read size for large records)
+                chunk = f.read(read_size)
+                read_size *= 2
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            read_size = chunk_size
+            yield obj
+            pos = end
+
+
+class JsonArraySource:
+    """
+    Re-iterable view over the records of a JSON array file. Every iteration streams the file again,
+    so it can be passed wherever a list of records was used before without holding the file in memory.
+    Args:
+        path: Path to the JSON file.
+        limit: If > 0, only the first `limit` records are yielded.
+    """
+
+    def __init__(self, path, limit=0):
+        self.path = path
+        self.limit = limit
+
+    def __iter__(self):
+        records = iter_json_records(self.path)
+        if self.limit > 0:
+            records = islice(records, self.limit)
+        return records
+
+    def records(self, start=0, stop=None):
+        """Yields the records with positions in [start, stop)."""
+        return islice(iter(self), start, stop)
+
+    def column(self, name):
+        """Yields the value of one field for every record (None where it is missing)."""
+        return (record.get(name) for record in self)
+
+    def __repr__(self):
+        return f"JsonArraySource({self.path!r}, limit={self.limit})"
+
+
+def mooc_path(folder, name):
+    """
+    Path of the MOOC file `name` in folder: the columnar file when it exists and is not older than the JSON file,
+    otherwise the JSON file.
+    """
+    json_path = os.path.join(folder, name + MOOC_FORMATS["json"])
+    columnar_path = os.path.join(folder, name + MOOC_FORMATS["columnar"])
+    if os.path.exists(columnar_path) and (not os.path.exists(json_path)
+                                          or os.path.getmtime(columnar_path) >= os.path.getmtime(json_path)):
+        return columnar_path
+    return json_path
+
+
+def open_mooc_source(path, limit=0):
+    """Streaming source for a JSON array or columnar file, chosen by extension."""
+    if path.endswith(MOOC_FORMATS["columnar"]):
+        return ColumnarSource(path, limit=limit)
+    return JsonArraySource(path, limit=limit)
+
+
+def open_mooc_sources(folder, user_video_act_limit=0):
+    """
+    Returns a dict of streaming sources for all MOOC files in `folder`, keyed by file name (see MOOC_FILES).
+    """
+    return {
+        name: open_mooc_source(mooc_path(folder, name), limit=user_video_act_limit if name == "user_video_act" else 0)
+        for name in MOOC_FILES
+    }
+
+
+def write_json_array(path, records):
+    """
+    Streams records into a JSON array file with the same layout as json.dump(..., indent=2).
+    Returns the number of records written.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write("[\n" if count == 0 else ",\n")
+            text = json.dumps(record, ensure_ascii=False, indent=2)
+            f.write("  " + text.replace("\n", "\n  "))
+            count += 1
+        f.write("\n]" if count else "[]")
+    return count
+
+
+def write_mooc_file(folder, name, records, data_format="json"):
+    """Writes records as folder/<name> in data_format ("json" or "columnar"). Returns the number of records written."""
+    path = os.path.join(folder, name + MOOC_FORMATS[data_format])
+    if data_format == "columnar":
+        return write_columnar(path, records)
+    return write_json_array(path, records)
+
+
+# --- Columnar format ---
+#
+# A .mcol file holds the records of one MOOC file in blocks of COLUMNAR_BLOCK_SIZE records:
+#   b"MCOL1\n" | block 0 column 0 | block 0 column 1 | ... | index | 8-byte little-endian offset of the index
+# Every column of a block is compressed on its own (zlib over marshal), so a single field can be read without
+# decoding the others. Columns are typed: ints and floats as packed arrays, repeated strings as a dictionary
+# plus codes, and lists (e.g. a user's activity) as lengths plus one flattened child column per nested field.
+# The index lists the blocks with the position of every column and the records lacking a field, and points to
+# an id index (sorted ids and record positions) used by ColumnarSource.get.
+COLUMNAR_MAGIC = b"MCOL1\n"
+COLUMNAR_VERSION = 1
+COLUMNAR_BLOCK_SIZE = 4096
+COLUMNAR_COMPRESSION_LEVEL = 6
+
+_FOOTER = struct.Struct("<Q")
+
+
+def _packed(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpacked(typecode, data):
+    packed = array(typecode)
+    packed.frombytes(data)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed
+
+
+def _encode_values(values):
+    types = set(map(type, values))
+    if types == {int}:
+        try:
+            return ("q", _packed("q", values))
+        except OverflowError:
+            pass
+    elif types == {float}:
+        return ("d", _packed("d", values))
+    elif types == {str}:
+        distinct = dict.fromkeys(values)
+        if len(distinct) * 2 <= len(values):
+            codes = {value: code for code, value in enumerate(distinct)}
+            return ("dict", list(distinct), _packed("i", map(codes.__getitem__, values)))
+    elif types == {list}:
+        lengths = _packed("q", map(len, values))
+        flat = [item for value in values for item in value]
+        if flat and all(type(item) is dict for item in flat):
+            return ("records", lengths, _encode_records(flat))
+        return ("list", lengths, _encode_values(flat))
+    # Mixed types and nulls are kept as they are
+    return ("raw", values)
+
+
+def _encode_records(records):
+    keys = list(dict.fromkeys(key for record in records for key in record))
+    missing = {}
+    columns = []
+    for key in keys:
+        absent = [i for i, record in enumerate(records) if key not in record]
+        if absent:
+            missing[key] = absent
+        columns.append(_encode_values([record[key] for record in records if key in record]))
+    return (len(records), keys, columns, missing)
+
+
+def _split(values, lengths):
+    offsets = list(accumulate(_unpacked("q", lengths), initial=0))
+    return [values[start:end] for start, end in zip(offsets, offsets[1:])]
+
+
+def _decode_values(encoded):
+    kind = encoded[0]
+    if kind in ("q", "d"):
+        return _unpacked(kind, encoded[1]).tolist()
+    if kind == "dict":
+        return list(map(encoded[1].__getitem__, _unpacked("i", encoded[2])))
+    if kind == "list":
+        return _split(_decode_values(encoded[2]), encoded[1])
+    if kind == "records":
+        return _split(_decode_records(encoded[2]), encoded[1])
+    return encoded[1]
+
+
+def _aligned(values, count, absent, fill):
+    """Spreads the values of the records that have a field over all count records, fill where it is missing."""
+    if not absent:
+        return values
+    absent = set(absent)
+    present = iter(values)
+    return [fill if i in absent else next(present) for i in range(count)]
+
+
+_MISSING = object()
+
+
+def _decode_records(encoded):
+    count, keys, columns, missing = encoded
+    values = [_aligned(_decode_values(column), count, missing.get(key), _MISSING) for key, column in zip(keys, columns)]
+    records = list(map(dict, map(zip, repeat(keys), zip(*values)))) if keys else [{} for _ in range(count)]
+    for key in missing:
+        for i in missing[key]:
+            del records[i][key]
+    return records
+
+
+def write_columnar(path, records, block_size=COLUMNAR_BLOCK_SIZE):
+    """
+    Streams records into a columnar file (see above), block by block. The file is written next to path and
+    renamed at the end. Returns the number of records written.
+    """
+    tmp_path = path + ".tmp"
+    blocks = []
+    ids = []
+    count = 0
+    with open(tmp_path, "wb") as f:
+        f.write(COLUMNAR_MAGIC)
+
+        def write_blob(obj):
+            data = zlib.compress(marshal.dumps(obj), COLUMNAR_COMPRESSION_LEVEL)
+            position = (f.tell(), len(data))
+            f.write(data)
+            return position
+
+        def write_block(block):
+            rows, keys, columns, missing = _encode_records(block)
+            blocks.append({"rows": rows, "missing": missing,
+                           "columns": {key: write_blob(column) for key, column in zip(keys, columns)}})
+
+        block = []
+        for record in records:
+            ids.append((record.get("id"), count))
+            block.append(record)
+            count += 1
+            if len(block) == block_size:
+                write_block(block)
+                block = []
+        if block:
+            write_block(block)
+
+        ids = sorted((str(record_id), position) for record_id, position in ids if record_id is not None)
+        index = {
+            "version": COLUMNAR_VERSION, "count": count, "block_size": block_size, "blocks": blocks,
+            "columns": list(dict.fromkeys(key for b in blocks for key in b["columns"])),
+            "ids": write_blob(([record_id for record_id, _ in ids], _packed("q", (p for _, p in ids)))),
+        }
+        index_offset = f.tell()
+        f.write(zlib.compress(marshal.dumps(index), COLUMNAR_COMPRESSION_LEVEL))
+        f.write(_FOOTER.pack(index_offset))
+    os.replace(tmp_path, path)
+    return count
+
+
+class ColumnarSource:
+    """
+    Re-iterable view over the records of a columnar file, with the same interface as JsonArraySource.
+    Only the index is read up front; blocks are decoded as they are reached, and column() decodes a single field.
+    Args:
+        path: Path to the .mcol file.
+        limit: If > 0, only the first `limit` records are visible.
+    """
+
+    def __init__(self, path, limit=0):
+        self.path = path
+        self.limit = limit
+        self._index = None
+        self._ids = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            with open(self.path, "rb") as f:
+                if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+                    raise ValueError(f"{self.path} is not a columnar MOOC file")
+                f.seek(-_FOOTER.size, os.SEEK_END)
+                end = f.tell()
+                (offset,) = _FOOTER.unpack(f.read(_FOOTER.size))
+                f.seek(offset)
+                index = marshal.loads(zlib.decompress(f.read(end - offset)))
+            if index.get("version") != COLUMNAR_VERSION:
+                raise ValueError(f"Unsupported columnar format version {index.get('version')} in {self.path}")
+            self._index = index
+        return self._index
+
+    @property
+    def columns(self):
+        return list(self.index["columns"])
+
+    def __len__(self):
+        count = self.index["count"]
+        return min(count, self.limit) if self.limit > 0 else count
+
+    @staticmethod
+    def _read(f, position):
+        f.seek(position[0])
+        return marshal.loads(zlib.decompress(f.read(position[1])))
+
+    def _block_records(self, f, block):
+        keys = list(block["columns"])
+        columns = [self._read(f, block["columns"][key]) for key in keys]
+        return _decode_records((block["rows"], keys, columns, block["missing"]))
+
+    def records(self, start=0, stop=None):
+        """Yields the records with positions in [start, stop), decoding only the blocks that hold them."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        block_size = self.index["block_size"]
+        with open(self.path, "rb") as f:
+            for number in range(start // block_size, (stop - 1) // block_size + 1 if stop > start else 0):
+                first = number * block_size
+                block = self._block_records(f, self.index["blocks"][number])
+                yield from block[max(start - first, 0):stop - first]
+
+    def __iter__(self):
+        return self.records()
+
+    def column(self, name):
+        """Yields the value of one field for every record (None where it is missing), decoding only that field."""
+        remaining = len(self)
+        with open(self.path, "rb") as f:
+            for block in self.index["blocks"]:
+                if remaining <= 0:
+                    return
+                position = block["columns"].get(name)
+                values = _decode_values(self._read(f, position)) if position else []
+                yield from _aligned(values, block["rows"], block["missing"].get(name, () if position else range(block["rows"])),
+                                    None)[:remaining]
+                remaining -= block["rows"]
+
+    def get(self, record_id):
+        """Returns the record with the given id, or None."""
+        if self._ids is None:
+            with open(self.path, "rb") as f:
+                ids, positions = self._read(f, self.index["ids"])
+            self._ids = (ids, _unpacked("q", positions))
+        ids, positions = self._ids
+        i = bisect_left(ids, str(record_id))
+        if i == len(ids) or ids[i] != str(record_id) or positions[i] >= len(self):
+            return None
+        return next(self.records(positions[i], positions[i] + 1))
+
+    def __repr__(self):
+        return f"ColumnarSource({self.path!r}, limit={self.limit})"
+
+
+def convert_folder(folder, data_format="columnar"):
+    """Rewrites every MOOC file in folder in data_format, reading whichever format is current. Returns the counts."""
+    counts = {}
+    for name in MOOC_FILES:
+        source_path = mooc_path(folder, name)
+        if os.path.exists(source_path) and not source_path.endswith(MOOC_FORMATS[data_format]):
+            counts[name] = write_mooc_file(folder, name, open_mooc_source(source_path), data_format)
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Convert the MOOC files of a data folder between JSON and the columnar format.")
+    parser.add_argument('command', choices=['convert', 'info'])
+    parser.add_argument('folder', help='Data folder, e.g. data/data_subset')
+    parser.add_argument('--format', choices=sorted(MOOC_FORMATS), default='columnar', help='Target format of convert')
+    args = parser.parse_args()
+    if args.command == 'info':
+        for name in MOOC_FILES:
+            path = mooc_path(args.folder, name)
+            if os.path.exists(path):
+                size = os.path.getsize(path) / 1e6
+                count = len(ColumnarSource(path)) if path.endswith(MOOC_FORMATS["columnar"]) else "?"
+                print(f"{name}: {path} ({size:.1f} MB, {count} records)")
+    else:
+        start = time.perf_counter()
+        counts = convert_folder(args.folder, args.format)
+        print(", ".join(f"{n} {name} records" for name, n in counts.items()) +
+              f" written as {args.format} in {time.perf_counter() - start:.1f}s")
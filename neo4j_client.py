@@ -0,0 +1,174 @@
+import atexit
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+import instrumentation
+
+# Shared Neo4j access for every entry point (seeding, reasoning and embedding scripts).
+# One lazily created driver per process holds the connection pool; all pool and retry settings live here.
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
+# Connections kept per process and how long a session waits for a free one
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60"))
+NEO4J_CONNECTION_TIMEOUT = float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "30"))
+# Time budget of the driver's own managed-transaction retries, then extra attempts with backoff on top
+NEO4J_MAX_TRANSACTION_RETRY_TIME = float(os.getenv("NEO4J_MAX_TRANSACTION_RETRY_TIME", "30"))
+NEO4J_MAX_RETRIES = int(os.getenv("NEO4J_MAX_RETRIES", "5"))
+# Connections opened by warmup(); 0 disables warmup
+NEO4J_WARMUP_CONNECTIONS = int(os.getenv("NEO4J_WARMUP_CONNECTIONS", "1"))
+
+# Errors after which the same unit of work can safely be tried again
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+
+class _SentStatementError(Exception):
+    # Carries a transient error of a non-idempotent statement past with_retry (see run_query)
+    pass
+
+
+_driver = None
+_driver_lock = threading.Lock()
+
+
+def get_driver():
+    """Returns the process-wide driver, creating it on first use. It is closed automatically at exit."""
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(
+                    NEO4J_URI,
+                    auth=(NEO4J_USER, NEO4J_PASSWORD),
+                    max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+                    connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+                    connection_timeout=NEO4J_CONNECTION_TIMEOUT,
+                    max_transaction_retry_time=NEO4J_MAX_TRANSACTION_RETRY_TIME,
+                )
+                atexit.register(close_driver)
+    return _driver
+
+
+def set_driver(driver):
+    """
+    Makes driver the process-wide driver, e.g. the in-process stand-in used by the benchmarks.
+    Returns the previous driver, which is not closed.
+    """
+    global _driver
+    with _driver_lock:
+        previous, _driver = _driver, driver
+    return previous
+
+
+def close_driver():
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+
+
+def session(**kwargs):
+    """Opens a session on the shared driver; kwargs are passed to driver.session (e.g. fetch_size, database)."""
+    return get_driver().session(**kwargs)
+
+
+def with_retry(func, *args, max_retries=NEO4J_MAX_RETRIES, **kwargs):
+    """
+    Calls func(*args, **kwargs) and retries it with jittered exponential backoff on transient errors
+    (deadlocks, lock timeouts, leader switches, dropped connections).
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            delay = min(10.0, 0.2 * 2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"Transient error ({getattr(e, 'code', None) or type(e).__name__}), retrying in {delay:.1f}s "
+                  f"({attempt}/{max_retries})", flush=True)
+            time.sleep(delay)
+
+
+def execute_read(work, *args, session_config=None, **kwargs):
+    """Runs work(tx, *args, **kwargs) in a managed read transaction on a fresh session, with retries."""
+    def attempt():
+        with session(**(session_config or {})) as s:
+            return s.execute_read(work, *args, **kwargs)
+    return with_retry(attempt)
+
+
+def execute_write(work, *args, session_config=None, **kwargs):
+    """Runs work(tx, *args, **kwargs) in a managed write transaction on a fresh session, with retries."""
+    def attempt():
+        with session(**(session_config or {})) as s:
+            return s.execute_write(work, *args, **kwargs)
+    return with_retry(attempt)
+
+
+def run_query(query, parameters=None, session_config=None, name=None, idempotent=False, **kwargs):
+    """
+    Runs an auto-commit query and returns its records as a list. Use this for statements that cannot run in
+    a managed transaction, such as GDS procedures or CALL { } IN TRANSACTIONS.
+    Transient errors are retried only while the statement was never sent (a ping checks the connection
+    first), unless idempotent=True: a statement such as gds.graph.project or CALL { } IN TRANSACTIONS may have
+    partly run, so its error is raised and the caller redoes its own setup before trying again.
+    name labels the statement in the metrics (see instrumentation.py).
+    """
+    def attempt():
+        with session(**(session_config or {})) as s:
+            if idempotent:
+                return list(instrumentation.run(s, query, parameters, name=name, **kwargs))
+            s.run("RETURN 1").consume()
+            try:
+                return list(instrumentation.run(s, query, parameters, name=name, **kwargs))
+            except RETRYABLE_ERRORS as e:
+                raise _SentStatementError() from e
+    try:
+        return with_retry(attempt)
+    except _SentStatementError as e:
+        raise e.__cause__
+
+
+def verify_connectivity(timeout=NEO4J_CONNECTION_TIMEOUT):
+    """Waits until the server accepts connections (e.g. while the container is still starting), up to timeout seconds."""
+    deadline = time.monotonic() + timeout
+    delay = 0.5
+    while True:
+        try:
+            get_driver().verify_connectivity()
+            return
+        except (ServiceUnavailable, SessionExpired, OSError):
+            if time.monotonic() + delay > deadline:
+                raise
+            print(f"Neo4j at {NEO4J_URI} not reachable yet, retrying in {delay:.1f}s", flush=True)
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+
+def warmup(connections=NEO4J_WARMUP_CONNECTIONS):
+    """
+    Checks connectivity and opens `connections` pooled connections up front, so the first real queries
+    do not pay for connection setup and authentication.
+    """
+    verify_connectivity()
+    if connections <= 0:
+        return
+
+    def ping(_):
+        with session() as s:
+            s.run("RETURN 1").consume()
+
+    # Concurrent sessions each hold their own connection, which then stays in the pool
+    with ThreadPoolExecutor(max_workers=min(connections, NEO4J_MAX_POOL_SIZE)) as pool:
+        list(pool.map(ping, range(connections)))
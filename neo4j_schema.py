@@ -0,0 +1,80 @@
+import time
+
+# Label of the single node that records which schema migrations have been applied
+SCHEMA_VERSION_LABEL = "SchemaVersion"
+
+# Ordered schema migrations as (version, description, statements).
+# Never edit an applied migration; append a new one with the next version number instead.
+MIGRATIONS = [
+    (1, "Uniqueness constraints on entity ids and range indexes for reasoning queries", [
+        "CREATE CONSTRAINT user_id_unique IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
+        "CREATE CONSTRAINT course_id_unique IF NOT EXISTS FOR (c:Course) REQUIRE c.id IS UNIQUE",
+        "CREATE CONSTRAINT video_id_unique IF NOT EXISTS FOR (v:Video) REQUIRE v.id IS UNIQUE",
+        "CREATE CONSTRAINT segment_id_unique IF NOT EXISTS FOR (s:Segment) REQUIRE s.id IS UNIQUE",
+        "CREATE INDEX segment_index_range IF NOT EXISTS FOR (s:Segment) ON (s.segment_index)",
+        "CREATE INDEX part_of_video_order_range IF NOT EXISTS FOR ()-[r:PART_OF]-() ON (r.video_order)",
+        "CREATE INDEX watched_local_start_time_range IF NOT EXISTS FOR ()-[r:WATCHED]-() ON (r.local_start_time)",
+    ]),
+    (2, "Uniqueness constraint on transcript ids (compact segment storage)", [
+        "CREATE CONSTRAINT transcript_id_unique IF NOT EXISTS FOR (t:Transcript) REQUIRE t.id IS UNIQUE",
+    ]),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# Returns the schema version recorded in the graph, 0 if none was recorded yet
+def get_schema_version(session):
+    record = session.run(
+        f"MATCH (m:{SCHEMA_VERSION_LABEL} {{id: 'schema'}}) RETURN m.version AS version"
+    ).single()
+    return record["version"] if record is not None and record["version"] is not None else 0
+
+
+def set_schema_version(session, version, description):
+    session.run(
+        f"MERGE (m:{SCHEMA_VERSION_LABEL} {{id: 'schema'}}) "
+        "SET m.version = $version, m.description = $description, m.applied_at = datetime()",
+        version=version,
+        description=description,
+    ).consume()
+
+
+# Blocks until every index (including constraint-backed ones) is ONLINE
+def wait_for_indexes(session, timeout=300, poll_interval=1.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        pending = list(session.run(
+            "SHOW INDEXES YIELD name, state, populationPercent "
+            "WHERE state <> 'ONLINE' "
+            "RETURN name, state, populationPercent"
+        ))
+        failed = [r["name"] for r in pending if r["state"] == "FAILED"]
+        if failed:
+            raise RuntimeError(f"Indexes failed to populate: {', '.join(failed)}")
+        if not pending:
+            return
+        if time.monotonic() > deadline:
+            names = ", ".join(f"{r['name']} ({r['populationPercent'] or 0:.0f}%)" for r in pending)
+            raise TimeoutError(f"Indexes not ONLINE after {timeout}s: {names}")
+        print("Waiting for indexes: " + ", ".join(
+            f"{r['name']} {r['populationPercent'] or 0:.0f}%" for r in pending
+        ), flush=True)
+        time.sleep(poll_interval)
+
+
+# Applies all pending migrations in order and waits for the resulting indexes to come online.
+# Schema statements are idempotent, so rerunning after a partial failure is safe.
+def ensure_schema(session, timeout=300):
+    current = get_schema_version(session)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"Applying schema migration {version}: {description}", flush=True)
+        for statement in statements:
+            # Schema commands must run in their own auto-commit transaction
+            session.run(statement).consume()
+        wait_for_indexes(session, timeout=timeout)
+        set_schema_version(session, version, description)
+    wait_for_indexes(session, timeout=timeout)
+    return max(current, LATEST_SCHEMA_VERSION)
@@ -1,161 +1,488 @@
+import os
+import time
+import uuid
+from collections import namedtuple
+from itertools import islice
+import instrumentation
+import segment_storage
+import viewing_stats
+
+# Number of rows sent per UNWIND statement / explicit transaction while seeding
+DEFAULT_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", "1000"))
+
+# --- Batched write statements, one per entity and relationship type ---
+USER_QUERY = """
+UNWIND $rows AS row
+MERGE (u:User {id: row.id})
+SET u += row.props
+"""
+
+COURSE_QUERY = """
+UNWIND $rows AS row
+MERGE (c:Course {id: row.id})
+SET c += row.props
+"""
+
+# Merges the Course node (it may not be part of course.json) and the relationship in one statement
+ENROLLED_IN_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {id: row.user_id})
+MERGE (c:Course {id: row.course_id})
+MERGE (u)-[r:ENROLLED_IN]->(c)
+SET r.enroll_time = row.enroll_time
+"""
+
+VIDEO_QUERY = """
+UNWIND $rows AS row
+MERGE (v:Video {id: row.id})
+SET v += row.props
+"""
+
+SEGMENT_QUERY = """
+UNWIND $rows AS row
+MATCH (v:Video {id: row.video_id})
+MERGE (s:Segment {id: row.segment_id})
+SET s.segment_index = row.segment_index, s.start = row.start, s.end = row.end, s.text = row.text
+MERGE (v)-[:HAS_SEGMENT]->(s)
+"""
+
+# Compact segment storage (see segment_storage.py): boundaries as parallel lists on the Video,
+# texts optionally on one Transcript node per video
+SEGMENT_LIST_QUERY = """
+UNWIND $rows AS row
+MATCH (v:Video {id: row.video_id})
+SET v.segment_start = row.start, v.segment_end = row.end
+"""
+
+TRANSCRIPT_QUERY = """
+UNWIND $rows AS row
+MATCH (v:Video {id: row.video_id})
+MERGE (t:Transcript {id: row.video_id})
+SET t.text = row.text
+MERGE (v)-[:HAS_TRANSCRIPT]->(t)
+"""
+
+PART_OF_QUERY = """
+UNWIND $rows AS row
+MATCH (v:Video {id: row.video_id}), (c:Course {id: row.course_id})
+MERGE (v)-[r:PART_OF {video_order: row.video_order}]->(c)
+SET r.display_name = row.display_name, r.chapter = row.chapter
+"""
+
+WATCHED_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {id: row.user_id}), (v:Video {id: row.video_id})
+MERGE (u)-[r:WATCHED]->(v)
+SET r.watching_count = row.watching_count, r.video_duration = row.video_duration,
+    r.local_watching_time = row.local_watching_time, r.video_progress_time = row.video_progress_time,
+    r.video_start_time = row.video_start_time, r.video_end_time = row.video_end_time,
+    r.local_start_time = row.local_start_time, r.local_end_time = row.local_end_time
+"""
+
+# Pre-aggregated viewing statistics (see viewing_stats.py), written once the relationships exist
+VIDEO_STATS_QUERY = """
+UNWIND $rows AS row
+MATCH (v:Video {id: row.id})
+SET v += row.props
+"""
+
+COURSE_STATS_QUERY = """
+UNWIND $rows AS row
+MATCH (c:Course {id: row.id})
+SET c += row.props
+"""
+
+WATCHED_PROPERTIES = (
+    "watching_count", "video_duration", "local_watching_time", "video_progress_time",
+    "video_start_time", "video_end_time", "local_start_time", "local_end_time",
+)
+
+
 def is_seeded(session):
-    result = session.run("MATCH (u:User) RETURN u LIMIT 1")
+    result = instrumentation.run(session, "MATCH (u:User) RETURN u LIMIT 1", name="is_seeded")
     return result.single() is not None
 
-# Insert users, their properties, enrolled courses, and video interactions since these are all defined in the user_video_act.json 
-def insert_data_into_kg(session, user_video_act_data, user_data, course_data, video_data):
 
-    # --- Filter users, courses, and videos to only those referenced in user_video_act_data ---
-    user_ids = set(user['id'] for user in user_video_act_data)
-    course_ids = set()
-    video_ids = set()
-    for user in user_video_act_data:
-        for act in user.get('activity', []):
-            if 'course_id' in act:
-                course_ids.add(act['course_id'])
-            if 'video_id' in act:
-                video_ids.add(act['video_id'])
+# Returns True if the database holds no data nodes (the schema version marker does not count)
+def is_database_empty(session):
+    result = instrumentation.run(session, "MATCH (n) WHERE NOT n:SchemaVersion RETURN n LIMIT 1", name="is_database_empty")
+    return result.single() is None
 
-    filtered_user_data = [u for u in user_data if u['id'] in user_ids]
-    filtered_course_data = [c for c in course_data if c['id'] in course_ids]
-    filtered_video_data = [v for v in video_data if v['id'] in video_ids]
-
-    # --- Insert filtered users with full attributes ---
-    print("Insert users", flush=True)
-    for user in filtered_user_data:
-        user_props = {k: v for k, v in user.items() if k != 'course_order' and k != 'enroll_time'}
-        set_clause = ", ".join([f"u.{k} = ${k}" for k in user_props if k != 'id'])
-        cypher = "MERGE (u:User {id: $id})"
-        if set_clause:
-            cypher += f" SET {set_clause}"
-        session.run(
-            cypher,
-            **user_props
-        )
-
-    print("Insert courses", flush=True)
-    # --- Insert filtered courses with full attributes ---
-    for course in filtered_course_data:
+
+# Records a finished seeding run on a marker node. It carries the schema marker's label, so it is neither
+# counted as data nor cleared.
+def record_seed_run(session):
+    instrumentation.run(
+        session, "MERGE (m:SchemaVersion {id: 'seed'}) SET m.run_id = randomUUID(), m.seeded_at = datetime()",
+        name="record_seed_run",
+    ).consume()
+
+
+# Per label and relationship type change markers on a SchemaVersion node (neither counted as data nor cleared).
+# A seed step that writes rows gives each label/type it creates (SeedStep.writes) a new random marker, so
+# consumers such as the embedding cache can tell which parts of the graph changed since they last looked.
+CHANGE_MARKER_QUERY = "MERGE (m:SchemaVersion {id: 'seed_changes'}) SET m += $changes"
+
+
+def record_changes(session, names):
+    if not names:
+        return
+    changes = {name: str(uuid.uuid4()) for name in names}
+    instrumentation.run(session, CHANGE_MARKER_QUERY, name="record_changes", changes=changes).consume()
+
+
+# Yields rows unchanged, calling mark() once before the first row is handed out (not at all for no rows).
+# Marking before the write means an interrupted step can never leave changed data without a new marker.
+def marking_changes(rows, mark):
+    rows = iter(rows)
+    for row in rows:
+        mark()
+        yield row
+        yield from rows
+
+
+# Yields lists of at most batch_size items from any iterable
+def batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# Sends rows as UNWIND batches, each batch in its own explicit (managed) write transaction.
+# on_batch, if given, is called with every batch after it committed. name labels the statement in the metrics.
+def write_batches(session, query, rows, batch_size=DEFAULT_BATCH_SIZE, on_batch=None, name=None):
+    written = 0
+    for batch in batched(rows, batch_size):
+        session.execute_write(run_batch, query, batch, name=name)
+        if on_batch is not None:
+            on_batch(batch)
+        written += len(batch)
+    return written
+
+
+def run_batch(tx, query, batch, name=None):
+    instrumentation.run(tx, query, name=name, input_rows=len(batch), rows=batch).consume()
+
+
+# --- Row builders: turn source records into the parameter maps used by the queries above ---
+def user_rows(user_data):
+    for user in user_data:
+        props = {k: v for k, v in user.items() if k not in ('id', 'course_order', 'enroll_time')}
+        yield {"id": user["id"], "props": props}
+
+
+def course_rows(course_data):
+    for course in course_data:
         # Keep id, core_id, name, prerequisites, about
-        course_props = {k: v for k, v in course.items() if k in ('id', 'core_id', 'name', 'prerequisites', 'about')}
-        set_clause = ", ".join([f"c.{k} = ${k}" for k in course_props if k != 'id'])
-        cypher = "MERGE (c:Course {id: $id})"
-        if set_clause:
-            cypher += f" SET {set_clause}"
-        session.run(
-            cypher,
-            **course_props
-        )
-
-    print("Insert ENROLLED_IN relationships", flush=True)
-    # --- Insert ENROLLED_IN relationships for users and courses ---
-    for user in filtered_user_data:
-        user_id = user.get("id")
+        props = {k: v for k, v in course.items() if k in ('core_id', 'name', 'prerequisites', 'about')}
+        yield {"id": course["id"], "props": props}
+
+
+def enrollment_rows(user_data):
+    for user in user_data:
         course_order = user.get("course_order", [])
         enroll_time = user.get("enroll_time", [])
+        # MERGE keeps one ENROLLED_IN per course and the last SET wins, so only the last entry per course is sent
+        rows = {}
         for idx, course_id in enumerate(course_order):
-            time = enroll_time[idx] if idx < len(enroll_time) else None
-            # Ensure Course node exists before relationship
-            session.run(
-                "MERGE (c:Course {id: $course_id})",
-                course_id=course_id
-            )
-            session.run(
-                "MATCH (u:User {id: $user_id}), (c:Course {id: $course_id}) "
-                "MERGE (u)-[r:ENROLLED_IN]->(c) "
-                "SET r.enroll_time = $enroll_time",
-                user_id=user_id,
-                course_id=course_id,
-                enroll_time=time
-            )
-
-    print("Insert videos and video segments", flush=True)
-    # --- Insert filtered videos with full attributes ---
-    for video in filtered_video_data:
-        video_props = {k: v for k, v in video.items() if k != 'start' and k != 'end' and k != 'text'}
-        set_clause = ", ".join([f"v.{k} = ${k}" for k in video_props if k != 'id'])
-        cypher = "MERGE (v:Video {id: $id})"
-        if set_clause:
-            cypher += f" SET {set_clause}"
-        session.run(
-            cypher,
-            **video_props
-        )
-
-        # Insert video segments for this video
+            rows[course_id] = {
+                "user_id": user.get("id"),
+                "course_id": course_id,
+                "enroll_time": enroll_time[idx] if idx < len(enroll_time) else None,
+            }
+        yield from rows.values()
+
+
+def video_rows(video_data):
+    for video in video_data:
+        props = {k: v for k, v in video.items() if k not in ('id', 'start', 'end', 'text')}
+        yield {"id": video["id"], "props": props}
+
+
+def segment_rows(video_data):
+    for video in video_data:
         starts = video.get('start', [])
         ends = video.get('end', [])
         texts = video.get('text', [])
         for idx, (start, end, text) in enumerate(zip(starts, ends, texts)):
-            segment_id = f"{video['id']}_S{idx}"
-            session.run(
-                """
-                MATCH (v:Video {id: $video_id})
-                MERGE (s:Segment {id: $segment_id})
-                SET s.segment_index = $segment_index, s.start = $start, s.end = $end, s.text = $text
-                MERGE (v)-[:HAS_SEGMENT]->(s)
-                """,
-                video_id=video['id'],
-                segment_id=segment_id,
-                segment_index=idx,
-                start=start,
-                end=end,
-                text=text
-            )
-
-    print("Insert relationships - videos are part of courses", flush=True)
-    # --- Insert course-video relationships (PART_OF) for filtered courses/videos ---
-    for course in filtered_course_data:
+            yield {
+                "video_id": video['id'],
+                "segment_id": segment_storage.segment_id(video['id'], idx),
+                "segment_index": idx,
+                "start": start,
+                "end": end,
+                "text": text,
+            }
+
+
+def _list_float(value):
+    # Stored lists must be homogeneous and null-free; a missing bound becomes NaN, which never compares as
+    # outside a watched range, like a missing Segment property
+    return float("nan") if value is None else float(value)
+
+
+def segment_list_rows(video_data):
+    for video in video_data:
+        # Same segments as segment_rows: only positions with a start, an end and a text
+        segments = list(zip(video.get('start', []), video.get('end', []), video.get('text', [])))
+        if segments:
+            yield {
+                "video_id": video['id'],
+                "start": [_list_float(start) for start, _, _ in segments],
+                "end": [_list_float(end) for _, end, _ in segments],
+            }
+
+
+def transcript_rows(video_data):
+    for video in video_data:
+        segments = list(zip(video.get('start', []), video.get('end', []), video.get('text', [])))
+        if segments:
+            yield {"video_id": video['id'], "text": ["" if text is None else str(text) for _, _, text in segments]}
+
+
+def part_of_rows(course_data, video_ids):
+    for course in course_data:
         video_order = course.get('video_order', [])
         display_names = course.get('display_name', [])
         chapters = course.get('chapter', [])
         for idx, video_id in enumerate(video_order):
             if video_id in video_ids:
-                session.run(
-                    "MATCH (v:Video {id: $video_id}), (c:Course {id: $course_id}) "
-                    "MERGE (v)-[r:PART_OF {video_order: $video_order}]->(c) "
-                    "SET r.display_name = $display_name, r.chapter = $chapter",
-                    video_id=video_id,
-                    course_id=course['id'],
-                    video_order=idx,
-                    display_name=display_names[idx] if idx < len(display_names) else None,
-                    chapter=chapters[idx] if idx < len(chapters) else None
-                )
+                yield {
+                    "video_id": video_id,
+                    "course_id": course['id'],
+                    "video_order": idx,
+                    "display_name": display_names[idx] if idx < len(display_names) else None,
+                    "chapter": chapters[idx] if idx < len(chapters) else None,
+                }
 
-    print("Insert user relationships - users watched videos", flush=True)
-    # --- Insert user activities and WATCHED relationships ---
-    for user in filtered_user_data:
-        user_id = user.get("id")
-        activities = user.get("activity", [])
-        # Insert WATCHED relationships for videos
-        for act in activities:
+
+def watched_rows(user_video_act_data):
+    for user in user_video_act_data:
+        # The same video can be listed once per course; MERGE keeps one WATCHED and the last SET wins
+        rows = {}
+        for act in user.get("activity", []):
             video_id = act.get("video_id")
             if video_id:
-                session.run(
-                    "MATCH (u:User {id: $user_id}), (v:Video {id: $video_id}) "
-                    "MERGE (u)-[r:WATCHED]->(v) "
-                    "SET r.watching_count = $watching_count, r.video_duration = $video_duration, "
-                    "r.local_watching_time = $local_watching_time, r.video_progress_time = $video_progress_time, "
-                    "r.video_start_time = $video_start_time, r.video_end_time = $video_end_time, "
-                    "r.local_start_time = $local_start_time, r.local_end_time = $local_end_time",
-                    user_id=user_id,
-                    video_id=video_id,
-                    watching_count=act.get("watching_count"),
-                    video_duration=act.get("video_duration"),
-                    local_watching_time=act.get("local_watching_time"),
-                    video_progress_time=act.get("video_progress_time"),
-                    video_start_time=act.get("video_start_time"),
-                    video_end_time=act.get("video_end_time"),
-                    local_start_time=act.get("local_start_time"),
-                    local_end_time=act.get("local_end_time")
+                row = {"user_id": user.get("id"), "video_id": video_id}
+                row.update({k: act.get(k) for k in WATCHED_PROPERTIES})
+                rows[video_id] = row
+        yield from rows.values()
+
+
+def video_stats_rows(user_video_act_data, user_ids, video_ids):
+    # Only WATCHED rows between seeded users and videos exist in the graph, so only those are aggregated
+    stats = viewing_stats.ViewingStats()
+    for user in user_video_act_data:
+        if user.get("id") in user_ids:
+            stats.add_user(row for row in watched_rows([user]) if row["video_id"] in video_ids)
+    yield from stats.rows()
+
+
+def course_stats_rows(user_video_act_data, course_data, user_ids, video_ids):
+    # Every PART_OF pair is kept, so a video listed twice in a course counts twice
+    courses_of = {}
+    for row in part_of_rows(course_data, video_ids):
+        courses_of.setdefault(row["video_id"], []).append(row["course_id"])
+    stats = viewing_stats.ViewingStats()
+    for user in user_video_act_data:
+        if user.get("id") in user_ids:
+            stats.add_user((row for row in watched_rows([user]) if row["video_id"] in video_ids),
+                           lambda video_id: courses_of.get(video_id, ()))
+    yield from stats.rows()
+
+
+# Yields only the records whose id is in ids
+def select_records(records, ids):
+    return (record for record in records if record['id'] in ids)
+
+
+# The ids of the records that exist in the source and are in ids (the nodes seeding creates)
+def seeded_ids(records, ids):
+    return {record['id'] for record in select_records(records, ids)}
+
+
+# Collects the user, course and video ids referenced by the activity records
+def referenced_ids(user_video_act_data):
+    user_ids = set()
+    course_ids = set()
+    video_ids = set()
+    for user in user_video_act_data:
+        user_ids.add(user['id'])
+        for act in user.get('activity', []):
+            if 'course_id' in act:
+                course_ids.add(act['course_id'])
+            if 'video_id' in act:
+                video_ids.add(act['video_id'])
+    return user_ids, course_ids, video_ids
+
+
+# One write step of the seeding pipeline.
+# phase: steps of the same phase are independent of each other; a phase only starts once the previous one finished
+# rows: zero-argument callable returning a fresh iterator of parameter rows for `query`
+# partition_key: row column whose value identifies the node the step locks most contentiously
+# key: row columns that identify the node/relationship the row writes (used by incremental seeding)
+# lock_order: row columns parallel seeding sorts each batch by, so that nodes shared across partitions are
+# locked in the same order by every transaction (default: the partition key)
+# writes: node labels and relationship types the step creates; they get a new change marker whenever the step
+# writes rows (steps that only set properties of existing nodes leave it empty)
+SeedStep = namedtuple("SeedStep", ["name", "phase", "message", "query", "rows", "partition_key", "key", "lock_order",
+                                   "writes"], defaults=(None, ()))
+
+
+# Steps that write the transcript segments in the given layout (see segment_storage.py)
+def segment_steps(video_data, video_ids, storage, text=segment_storage.SEGMENT_TEXT):
+    if segment_storage.check_layout(storage) == "nodes":
+        return [SeedStep("segments", "segments", "Insert video segments", SEGMENT_QUERY,
+                         lambda: segment_rows(select_records(video_data, video_ids)), "video_id", ("segment_id",),
+                         writes=("Segment", "HAS_SEGMENT"))]
+    steps = [SeedStep("segment_lists", "segments", "Insert video segment lists", SEGMENT_LIST_QUERY,
+                      lambda: segment_list_rows(select_records(video_data, video_ids)), "video_id", ("video_id",))]
+    if text == "transcript":
+        steps.append(SeedStep("transcripts", "segments", "Insert segment transcripts", TRANSCRIPT_QUERY,
+                              lambda: transcript_rows(select_records(video_data, video_ids)), "video_id", ("video_id",),
+                              writes=("Transcript", "HAS_TRANSCRIPT")))
+    return steps
+
+
+# Builds the ordered seeding steps for the given data (lists or re-iterable streaming sources).
+# storage is the segment layout ("nodes" or "compact", default SEGMENT_STORAGE)
+def seed_steps(user_video_act_data, user_data, course_data, video_data, storage=None):
+    # --- Filter users, courses, and videos to only those referenced in user_video_act_data ---
+    user_ids, course_ids, video_ids = referenced_ids(user_video_act_data)
+    return [
+        SeedStep("users", "nodes", "Insert users", USER_QUERY,
+                 lambda: user_rows(select_records(user_data, user_ids)), "id", ("id",), writes=("User",)),
+        SeedStep("courses", "nodes", "Insert courses", COURSE_QUERY,
+                 lambda: course_rows(select_records(course_data, course_ids)), "id", ("id",), writes=("Course",)),
+        SeedStep("videos", "nodes", "Insert videos", VIDEO_QUERY,
+                 lambda: video_rows(select_records(video_data, video_ids)), "id", ("id",), writes=("Video",)),
+        *segment_steps(video_data, video_ids, storage or segment_storage.SEGMENT_STORAGE),
+        SeedStep("enrollments", "relationships", "Insert ENROLLED_IN relationships", ENROLLED_IN_QUERY,
+                 lambda: enrollment_rows(select_records(user_data, user_ids)), "course_id",
+                 ("user_id", "course_id"), ("user_id", "course_id"), ("Course", "ENROLLED_IN")),
+        SeedStep("part_of", "relationships", "Insert relationships - videos are part of courses", PART_OF_QUERY,
+                 lambda: part_of_rows(select_records(course_data, course_ids), video_ids), "course_id",
+                 ("video_id", "course_id", "video_order"), ("video_id", "course_id"), ("PART_OF",)),
+        # Activities live in user_video_act.json, not in user.json
+        SeedStep("watched", "relationships", "Insert user relationships - users watched videos", WATCHED_QUERY,
+                 lambda: watched_rows(user_video_act_data), "video_id", ("user_id", "video_id"),
+                 ("user_id", "video_id"), ("WATCHED",)),
+        # Recomputed from the full activity data on every run; incremental runs rewrite only the changed ones
+        SeedStep("video_stats", "stats", "Aggregate viewing statistics of videos", VIDEO_STATS_QUERY,
+                 lambda: video_stats_rows(user_video_act_data, seeded_ids(user_data, user_ids),
+                                          seeded_ids(video_data, video_ids)), "id", ("id",)),
+        SeedStep("course_stats", "stats", "Aggregate viewing statistics of courses", COURSE_STATS_QUERY,
+                 lambda: course_stats_rows(user_video_act_data, select_records(course_data, course_ids),
+                                           seeded_ids(user_data, user_ids), seeded_ids(video_data, video_ids)),
+                 "id", ("id",)),
+    ]
+
+
+# Insert users, their properties, enrolled courses, and video interactions since these are all defined in the user_video_act.json 
+# The data arguments may be lists or re-iterable streaming sources (see mooc_data.JsonArraySource and ColumnarSource);
+# every step makes its own pass, so memory stays bounded by the id sets and one batch of rows.
+# With a checkpoint (seed_checkpoint.SeedCheckpoint) only new or changed rows are written and an interrupted run resumes.
+# steps: the SeedSteps to run, by default seed_steps() of the given data (the benchmarks pass wrapped ones)
+def insert_data_into_kg(session, user_video_act_data, user_data, course_data, video_data, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None,
+                        storage=None, steps=None):
+    if steps is None:
+        steps = seed_steps(user_video_act_data, user_data, course_data, video_data, storage)
+    with instrumentation.phase("seed"):
+        for step in steps:
+            with instrumentation.phase(step.name):
+                mark = lambda step=step: record_changes(session, step.writes)
+                if checkpoint is None:
+                    print(step.message, flush=True)
+                    write_batches(session, step.query, marking_changes(step.rows(), mark), batch_size, name=step.name)
+                    continue
+                if checkpoint.is_step_complete(step):
+                    print(f"{step.message}: already completed in this run, skipping", flush=True)
+                    continue
+                print(step.message, flush=True)
+                written = write_batches(
+                    session, step.query, marking_changes(checkpoint.changed_rows(step, step.rows()), mark), batch_size,
+                    on_batch=lambda batch, step=step: checkpoint.commit_batch(step, batch), name=step.name,
                 )
+                checkpoint.complete_step(step)
+                print(f"  {written} new or changed rows written", flush=True)
+    if checkpoint is not None:
+        checkpoint.complete_run()
 
 
 # Returns True if the RESEED environment variable is set to a truthy value
 def should_reseed():
-    import os
     return os.getenv("RESEED", "false").strip().lower() in ("1", "true", "yes", "y")
 
-# Deletes all nodes and relationships in the database
-def clear_database(session):
-    session.run("MATCH (n) DETACH DELETE n")
+# Returns True if the SEED_INCREMENTAL environment variable is set to a truthy value
+def should_seed_incrementally():
+    return os.getenv("SEED_INCREMENTAL", "false").strip().lower() in ("1", "true", "yes", "y")
+
+# Rows deleted per inner transaction while clearing, and rows per outer statement (one progress report each)
+CLEAR_BATCH_SIZE = int(os.getenv("CLEAR_BATCH_SIZE", "10000"))
+CLEAR_BATCHES_PER_REPORT = 10
+
+
+# Returns the comma-separated RESEED_LABELS environment variable as a list (None means all labels)
+def reseed_labels():
+    labels = [label.strip() for label in os.getenv("RESEED_LABELS", "").split(",") if label.strip()]
+    return labels or None
+
+
+def _label_predicate(variable, labels):
+    if labels is None:
+        return f"NOT {variable}:SchemaVersion"
+    return " OR ".join(f"{variable}:`{label.replace('`', '``')}`" for label in labels)
+
+
+# Runs a chunked delete statement until nothing is left, printing progress and rate after every chunk
+def _delete_in_chunks(session, what, count_query, delete_query, batch_size):
+    total = instrumentation.run(session, count_query, name=f"count_{what}").single()["total"]
+    if total == 0:
+        return 0
+    chunk_size = batch_size * CLEAR_BATCHES_PER_REPORT
+    deleted = 0
+    start = time.perf_counter()
+    while True:
+        # CALL { ... } IN TRANSACTIONS needs an auto-commit transaction, hence session.run
+        result = instrumentation.run(session, delete_query, name=f"delete_{what}",
+                                     chunk_size=chunk_size, batch_size=batch_size).single()
+        if result["deleted"] == 0:
+            break
+        deleted += result["deleted"]
+        elapsed = time.perf_counter() - start
+        print(f"Deleted {deleted}/{total} {what} ({deleted / max(elapsed, 1e-9):.0f}/s)", flush=True)
+    return deleted
+
+
+# Deletes nodes and relationships in bounded batches: relationships first, then nodes.
+# labels: only delete nodes with one of these labels (and their relationships); None clears everything
+# except the schema version marker.
+def clear_database(session, labels=None, batch_size=CLEAR_BATCH_SIZE):
+    with instrumentation.phase("clear"):
+        return _clear_database(session, labels, batch_size)
+
+
+def _clear_database(session, labels, batch_size):
+    predicate = _label_predicate("n", labels)
+    relationships = _delete_in_chunks(
+        session, "relationships",
+        "MATCH ()-[r]->() RETURN count(r) AS total" if labels is None
+        else f"MATCH (n)-[r]-() WHERE {predicate} RETURN count(DISTINCT r) AS total",
+        ("MATCH ()-[r]->()" if labels is None else f"MATCH (n)-[r]-() WHERE {predicate}") +
+        " WITH DISTINCT r LIMIT $chunk_size "
+        "CALL { WITH r DELETE r } IN TRANSACTIONS OF $batch_size ROWS "
+        "RETURN count(*) AS deleted",
+        batch_size,
+    )
+    nodes = _delete_in_chunks(
+        session, "nodes",
+        f"MATCH (n) WHERE {predicate} RETURN count(n) AS total",
+        f"MATCH (n) WHERE {predicate} WITH n LIMIT $chunk_size "
+        "CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF $batch_size ROWS "
+        "RETURN count(*) AS deleted",
+        batch_size,
+    )
+    return {"relationships": relationships, "nodes": nodes}
@@ -0,0 +1,131 @@
+import os
+import queue
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+import instrumentation
+from neo4j_client import with_retry
+from neo4j_utils import DEFAULT_BATCH_SIZE, marking_changes, record_changes, run_batch, seed_steps
+
+# Parallel seeding: every step is split by entity id into SEED_WORKERS partitions and each partition is
+# written by its own worker thread and session. Workers spend their time waiting on the network, so threads
+# scale as well as processes here while sharing one driver and its connection pool.
+SEED_WORKERS = int(os.getenv("SEED_WORKERS", "1"))
+# Extra attempts for a batch that keeps failing with a transient error (deadlocks, lock timeouts)
+# after the driver's own managed-transaction retries gave up
+SEED_MAX_RETRIES = int(os.getenv("SEED_MAX_RETRIES", "5"))
+
+_QUEUE_DEPTH = 2
+_DONE = None
+
+
+# Maps a partition key to a stable partition number (hash() is salted per process, crc32 is not)
+def partition_of(key, partitions):
+    return zlib.crc32(str(key).encode("utf-8")) % partitions
+
+
+def _write_with_retry(session, query, batch, name=None, max_retries=SEED_MAX_RETRIES):
+    with_retry(session.execute_write, run_batch, query, batch, name=name, max_retries=max_retries)
+
+
+# Worker loop: writes every batch of one partition in its own session
+def _drain(driver, step, batches, checkpoint):
+    written = 0
+    lock_order = step.lock_order or (step.partition_key,)
+    with driver.session() as session:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                return written
+            # Partitions share the other endpoint of a relationship (a User, or a Video for PART_OF); sorting
+            # by it first makes every transaction lock those shared nodes in the same global order
+            batch.sort(key=lambda row: tuple(str(row[column]) for column in lock_order))
+            _write_with_retry(session, step.query, batch, name=step.name)
+            if checkpoint is not None:
+                checkpoint.commit_batch(step, batch)
+            written += len(batch)
+
+
+def _record_changes(driver, names):
+    if not names:
+        return
+    with driver.session() as session:
+        record_changes(session, names)
+
+
+def _put(batches, batch, future):
+    # Block while the worker is busy, but surface its error instead of waiting forever on a dead worker
+    while True:
+        try:
+            batches.put(batch, timeout=1.0)
+            return
+        except queue.Full:
+            if future.done():
+                future.result()
+
+
+def run_step_parallel(driver, step, workers=SEED_WORKERS, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None):
+    """
+    Routes the rows of one seed step to `workers` partitions by step.partition_key and writes them concurrently.
+    Rows for the same Course/Video end up in the same partition, and each batch is sorted by step.lock_order,
+    so the nodes partitions share are locked in a consistent order. With a checkpoint, only new or changed rows are sent.
+    Returns the number of rows written.
+    """
+    rows = step.rows() if checkpoint is None else checkpoint.changed_rows(step, step.rows())
+    rows = marking_changes(rows, lambda: _record_changes(driver, step.writes))
+    queues = [queue.Queue(maxsize=_QUEUE_DEPTH) for _ in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"seed-{step.name}") as pool:
+        futures = [pool.submit(_drain, driver, step, q, checkpoint) for q in queues]
+        buffers = [[] for _ in range(workers)]
+        try:
+            for row in rows:
+                p = partition_of(row[step.partition_key], workers)
+                buffers[p].append(row)
+                if len(buffers[p]) >= batch_size:
+                    _put(queues[p], buffers[p], futures[p])
+                    buffers[p] = []
+            for p, buffer in enumerate(buffers):
+                if buffer:
+                    _put(queues[p], buffer, futures[p])
+        finally:
+            for p, q in enumerate(queues):
+                if not futures[p].done():
+                    _put(q, _DONE, futures[p])
+        return sum(f.result() for f in futures)
+
+
+def parallel_insert_data_into_kg(driver, user_video_act_data, user_data, course_data, video_data,
+                                 workers=SEED_WORKERS, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, storage=None):
+    """
+    Parallel counterpart of neo4j_utils.insert_data_into_kg. Phases run one after another (nodes, then
+    segments, then relationships, then the viewing statistics) and report their throughput; within a phase, steps run in order and
+    each step is spread across the worker partitions.
+    """
+    steps = seed_steps(user_video_act_data, user_data, course_data, video_data, storage)
+    with instrumentation.phase("seed"):
+        for phase, phase_steps in groupby(steps, key=lambda step: step.phase):
+            with instrumentation.phase(phase):
+                _run_phase(driver, phase, phase_steps, workers, batch_size, checkpoint)
+    if checkpoint is not None:
+        checkpoint.complete_run()
+
+
+def _run_phase(driver, phase, phase_steps, workers, batch_size, checkpoint):
+    phase_start = time.perf_counter()
+    phase_rows = 0
+    for step in phase_steps:
+        if checkpoint is not None and checkpoint.is_step_complete(step):
+            print(f"{step.message}: already completed in this run, skipping", flush=True)
+            continue
+        print(f"{step.message} ({workers} workers)", flush=True)
+        step_start = time.perf_counter()
+        with instrumentation.phase(step.name):
+            rows = run_step_parallel(driver, step, workers=workers, batch_size=batch_size, checkpoint=checkpoint)
+        if checkpoint is not None:
+            checkpoint.complete_step(step)
+        elapsed = time.perf_counter() - step_start
+        print(f"  {step.name}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)", flush=True)
+        phase_rows += rows
+    elapsed = time.perf_counter() - phase_start
+    print(f"Phase {phase}: {phase_rows} rows in {elapsed:.1f}s ({phase_rows / max(elapsed, 1e-9):.0f} rows/s)", flush=True)
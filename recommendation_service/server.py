@@ -0,0 +1,248 @@
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Make the shared top-level modules (results_store) importable when run from the repository checkout;
+# the Docker image puts them on PYTHONPATH instead
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from results_store import RESULTS_DIR, read_table
+
+# Long-running HTTP service answering per-entity queries from the result tables the batch jobs publish
+# (see results_store.py). Tables are held in memory, indexed by their key column, and reloaded in the
+# background whenever a job replaces a file. Plain asyncio, no web framework: every lookup is a dict access.
+SERVICE_HOST = os.getenv("SERVICE_HOST", "0.0.0.0")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+# Seconds between checks for new or changed result files
+RESULTS_RELOAD_INTERVAL = float(os.getenv("RESULTS_RELOAD_INTERVAL", "2"))
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = float(os.getenv("KEEPALIVE_TIMEOUT", "15"))
+DEFAULT_LIMIT = 10
+
+_MAX_HEADER_LINES = 100
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class Table:
+    """A result table with its rows grouped by the key column, in file order."""
+
+    def __init__(self, data, version):
+        self.name = data["name"]
+        self.columns = data["columns"]
+        self.meta = data.get("meta", {})
+        self.written_at = data.get("written_at")
+        self.version = version
+        self.row_count = len(data["rows"])
+        key = self.columns.index(data.get("key") or self.columns[0])
+        index = defaultdict(list)
+        for row in data["rows"]:
+            index[row[key]].append(dict(zip(self.columns, row)))
+        self.index = dict(index)
+
+    def get(self, key, limit=None):
+        rows = self.index.get(key, [])
+        return rows[:limit] if limit is not None else rows
+
+    def describe(self):
+        return {"rows": self.row_count, "keys": len(self.index), "written_at": self.written_at, "meta": self.meta}
+
+
+class TableStore:
+    """
+    Loads every <name>.json in results_dir. reload() re-reads only files whose mtime or size changed and
+    swaps in a new dict, so request handlers always see a complete, consistent set of tables.
+    """
+
+    def __init__(self, results_dir):
+        self.results_dir = results_dir
+        self.tables = {}
+
+    def _versions(self):
+        versions = {}
+        for path in glob.glob(os.path.join(self.results_dir, "*.json")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            versions[path] = (stat.st_mtime_ns, stat.st_size)
+        return versions
+
+    def reload(self):
+        """Returns the names of the tables that were (re)loaded or dropped."""
+        current = {table.path: table for table in self.tables.values()}
+        tables = {}
+        changed = []
+        for path, version in self._versions().items():
+            table = current.get(path)
+            if table is None or table.version != version:
+                try:
+                    table = Table(read_table(path), version)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Skipping {path}: {e}", flush=True)
+                    table = current.get(path)
+                    if table is None:
+                        continue
+                else:
+                    table.path = path
+                    changed.append(table.name)
+            tables[table.name] = table
+        changed.extend(name for name in self.tables if name not in tables)
+        self.tables = tables
+        return changed
+
+    def get(self, name):
+        return self.tables.get(name)
+
+
+class RecommendationService:
+    def __init__(self, store):
+        self.store = store
+        self.started = time.time()
+        self.requests = 0
+
+    def route(self, method, target):
+        """Returns (status, payload) for a request."""
+        if method != "GET":
+            return 405, {"error": "Only GET is supported"}
+        url = urlsplit(target)
+        # '+' is a literal character in the MOOC ids, so only percent-escapes are decoded
+        parts = [unquote(p) for p in url.path.strip("/").split("/") if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            limit = int(query.get("k", query.get("limit", DEFAULT_LIMIT)))
+        except ValueError:
+            return 400, {"error": "k/limit must be an integer"}
+
+        if parts == ["health"]:
+            return 200, {"status": "ok", "uptime": round(time.time() - self.started, 1), "requests": self.requests,
+                         "tables": {name: table.describe() for name, table in self.store.tables.items()}}
+        if len(parts) == 3 and parts[2] == "similar" and parts[0] in ("users", "videos", "courses"):
+            default_source = {"users": "users", "videos": "videos", "courses": "courses"}[parts[0]]
+            return self.similar(query.get("source", default_source), parts[1], limit)
+        if len(parts) == 3 and parts[0] == "videos" and parts[2] == "skip-segments":
+            return self.lookup("skip_segments", parts[1], limit, "segments")
+        if len(parts) == 3 and parts[0] == "videos" and parts[2] == "speed":
+            return self.video_speed(parts[1])
+        if len(parts) == 3 and parts[0] == "courses" and parts[2] == "speed":
+            return self.lookup("course_speeds", parts[1], None, "speeds")
+        if len(parts) == 3 and parts[0] == "tables":
+            return self.lookup(parts[1], parts[2], limit, "rows")
+        return 404, {"error": f"Unknown endpoint {url.path}"}
+
+    def _table(self, name):
+        table = self.store.get(name)
+        if table is None:
+            return None, (503, {"error": f"Results table {name} has not been published yet"})
+        return table, None
+
+    def lookup(self, name, key, limit, field):
+        table, error = self._table(name)
+        if error:
+            return error
+        return 200, {"id": key, field: table.get(key, limit), "written_at": table.written_at}
+
+    def similar(self, source, node_id, limit):
+        table, error = self._table(f"similar_{source}")
+        if error:
+            return error
+        rows = [{"id": row["similar"], "similarity": row["similarity"]} for row in table.get(node_id, limit)]
+        return 200, {"id": node_id, "label": table.meta.get("label"), "similar": rows, "written_at": table.written_at}
+
+    def video_speed(self, video_id):
+        table, error = self._table("playback_speeds")
+        if error:
+            return error
+        speeds = table.get(video_id)
+        # The speed most users chose; ties go to the one closest to normal speed
+        recommended = max(speeds, key=lambda r: (r["user_count"], -abs(r["speed"] - 1.0))) if speeds else None
+        return 200, {"id": video_id, "recommended": recommended, "speeds": speeds, "written_at": table.written_at}
+
+
+async def _read_request(reader):
+    """Returns (method, target, version, headers) or None when the client closed the connection."""
+    line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise ValueError("Malformed request line")
+    headers = {}
+    for _ in range(_MAX_HEADER_LINES):
+        header = await reader.readline()
+        if header in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = header.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0") or 0)
+    if length:
+        await reader.readexactly(length)
+    return method, target, version, headers
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+async def handle_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                break
+            except ValueError as e:
+                writer.write(_response(400, {"error": str(e)}, False))
+                break
+            if request is None:
+                break
+            method, target, version, headers = request
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+            service.requests += 1
+            status, payload = service.route(method, target)
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def reload_loop(store, interval=RESULTS_RELOAD_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        # File parsing runs in a worker thread so requests keep being answered during a reload
+        changed = await asyncio.to_thread(store.reload)
+        if changed:
+            print(f"Reloaded result tables: {', '.join(sorted(changed))}", flush=True)
+
+
+async def serve(results_dir=RESULTS_DIR or "results", host=SERVICE_HOST, port=SERVICE_PORT):
+    store = TableStore(results_dir)
+    loaded = store.reload()
+    print(f"Loaded {len(loaded)} result tables from {results_dir}: {', '.join(sorted(loaded)) or 'none yet'}", flush=True)
+    service = RecommendationService(store)
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port, backlog=1024)
+    print(f"Recommendation service listening on {host}:{port}", flush=True)
+    reloader = asyncio.create_task(reload_loop(store))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        reloader.cancel()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
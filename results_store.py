@@ -0,0 +1,52 @@
+import json
+import os
+import time
+
+# Result tables published by the batch reasoning jobs and served by the recommendation service.
+# A table is one JSON file <RESULTS_DIR>/<name>.json: {"name", "columns", "key", "rows", "meta", "written_at"}.
+# Files are replaced atomically, so readers either see the previous batch or the complete new one.
+#
+# Jobs publish only when RESULTS_DIR is set (compose sets it for the reasoning and service containers).
+RESULTS_DIR = os.getenv("RESULTS_DIR", "")
+
+
+def publish_enabled():
+    return bool(RESULTS_DIR)
+
+
+def table_path(name, results_dir=None):
+    return os.path.join(results_dir or RESULTS_DIR, f"{name}.json")
+
+
+def write_table(name, columns, rows, key=None, meta=None, results_dir=None):
+    """
+    Writes a result table. key names the column the service indexes rows by (default: the first column).
+    rows are sequences in column order; NumPy scalars are converted. Returns the file path.
+    """
+    results_dir = results_dir or RESULTS_DIR
+    os.makedirs(results_dir, exist_ok=True)
+    path = table_path(name, results_dir)
+    table = {
+        "name": name,
+        "columns": list(columns),
+        "key": key or columns[0],
+        "rows": [[_plain(value) for value in row] for row in rows],
+        "meta": meta or {},
+        "written_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    print(f"Published {len(table['rows'])} rows to {path}", flush=True)
+    return path
+
+
+def read_table(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _plain(value):
+    # NumPy scalars expose item(); plain Python values pass through
+    return value.item() if hasattr(value, "item") else value
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from itertools import islice
+
+# Local state for incremental and resumable seeding. Kept outside the graph so that checking
+# thousands of rows costs one SQLite lookup per chunk instead of a database round trip.
+SEED_CHECKPOINT_PATH = os.getenv("SEED_CHECKPOINT_PATH", "state/seed_checkpoint.sqlite")
+
+_LOOKUP_CHUNK = 500
+
+
+def row_key(step, row):
+    return json.dumps([row[column] for column in step.key], ensure_ascii=False)
+
+
+def row_hash(row):
+    return hashlib.sha1(json.dumps(row, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class SeedCheckpoint:
+    """
+    Remembers a content hash for every row that has been written, per seed step, and which steps of the
+    current run have finished.
+
+    - Rows whose hash matches the stored one are filtered out, so reruns only write new or changed records.
+    - Hashes are stored only after the batch containing the row committed, so a crashed run resumes
+      after its last committed batch.
+    - Steps finished in an interrupted run are skipped entirely on the next run. Once a run completes,
+      these markers are cleared so the next run scans the sources for changes again.
+    """
+
+    def __init__(self, path=SEED_CHECKPOINT_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # Batches are committed from parallel seeding workers as well
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS row_hashes (step TEXT, key TEXT, hash TEXT, PRIMARY KEY (step, key))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS step_progress "
+                "(step TEXT PRIMARY KEY, batches INTEGER, rows INTEGER, completed INTEGER)"
+            )
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Yields only the rows of `step` that are new or differ from what was last written
+    def changed_rows(self, step, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, _LOOKUP_CHUNK))
+            if not chunk:
+                return
+            keyed = [(row_key(step, row), row) for row in chunk]
+            with self._lock:
+                placeholders = ",".join("?" * len(keyed))
+                stored = dict(self._conn.execute(
+                    f"SELECT key, hash FROM row_hashes WHERE step = ? AND key IN ({placeholders})",
+                    [step.name] + [key for key, _ in keyed],
+                ))
+            for key, row in keyed:
+                if stored.get(key) != row_hash(row):
+                    yield row
+
+    # Records a committed batch: stores the row hashes and advances the step's progress
+    def commit_batch(self, step, batch):
+        values = [(step.name, row_key(step, row), row_hash(row)) for row in batch]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO row_hashes (step, key, hash) VALUES (?, ?, ?)", values)
+            self._conn.execute(
+                "INSERT INTO step_progress (step, batches, rows, completed) VALUES (?, 1, ?, 0) "
+                "ON CONFLICT (step) DO UPDATE SET batches = batches + 1, rows = rows + excluded.rows",
+                (step.name, len(batch)),
+            )
+
+    def is_step_complete(self, step):
+        with self._lock:
+            record = self._conn.execute("SELECT completed FROM step_progress WHERE step = ?", (step.name,)).fetchone()
+        return bool(record and record[0])
+
+    def complete_step(self, step):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO step_progress (step, batches, rows, completed) VALUES (?, 0, 0, 1) "
+                "ON CONFLICT (step) DO UPDATE SET completed = 1",
+                (step.name,),
+            )
+
+    # Returns (batches, rows) written for the step in the current run
+    def progress(self, step):
+        with self._lock:
+            record = self._conn.execute("SELECT batches, rows FROM step_progress WHERE step = ?", (step.name,)).fetchone()
+        return record if record else (0, 0)
+
+    # Called after every step finished: the next run starts a fresh change scan
+    def complete_run(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM step_progress")
+
+    # Forgets everything, e.g. after the database was cleared
+    def reset(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM row_hashes")
+            self._conn.execute("DELETE FROM step_progress")
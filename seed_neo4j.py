@@ -1,52 +1,90 @@
-import json
 import os
-from neo4j import GraphDatabase
+from contextlib import nullcontext
 from dotenv import load_dotenv
-from neo4j_utils import is_seeded, should_reseed, insert_data_into_kg
+from neo4j_client import close_driver, get_driver, warmup
+from neo4j_utils import is_seeded, is_database_empty, should_reseed, reseed_labels, should_seed_incrementally, insert_data_into_kg, record_seed_run
+from neo4j_schema import ensure_schema
+from mooc_data import open_mooc_sources
+from parallel_seed import SEED_WORKERS, parallel_insert_data_into_kg
+from seed_checkpoint import SeedCheckpoint
+from bulk_import import BULK_IMPORT_DIR, export_import_csvs, find_neo4j_admin, run_bulk_import
 
 # Load environment variables from .env file
 load_dotenv()
 
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_USER = os.getenv("NEO4J_USER")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 DATA_FOLDER = os.getenv("DATA_FOLDER", "data/data_subset")
 USER_VIDEO_ACT_LIMIT = int(os.getenv("USER_VIDEO_ACT_LIMIT", "0"))
+# "transactional" MERGEs the data through the driver. "bulk" instead runs neo4j-admin import
+# before connecting to anything; the target database must be stopped (see bulk_import.py).
+SEED_MODE = os.getenv("SEED_MODE", "transactional").strip().lower()
+SEED_MODES = ("transactional", "bulk")
 
-# Load all data from DATA_FOLDER
-with open(os.path.join(DATA_FOLDER, "user_video_act.json"), "r", encoding="utf-8") as f:
-    user_video_act_data = json.load(f)
-with open(os.path.join(DATA_FOLDER, "user.json"), "r", encoding="utf-8") as f:
-    user_data = json.load(f)
-with open(os.path.join(DATA_FOLDER, "course.json"), "r", encoding="utf-8") as f:
-    course_data = json.load(f)
-with open(os.path.join(DATA_FOLDER, "video.json"), "r", encoding="utf-8") as f:
-    video_data = json.load(f)
 
-# Limit user_video_act_data if USER_VIDEO_ACT_LIMIT is set
-if USER_VIDEO_ACT_LIMIT > 0:
-    user_video_act_data = user_video_act_data[:USER_VIDEO_ACT_LIMIT]
+# Cold start: export CSVs and run neo4j-admin import against the stopped database. Opens no driver connection,
+# since neo4j-admin replaces the whole database; the schema is applied by the next (transactional) seed run.
+def bulk_import(user_video_act_data, user_data, course_data, video_data):
+    if find_neo4j_admin() is None:
+        raise SystemExit("SEED_MODE=bulk needs neo4j-admin on the PATH (or NEO4J_ADMIN).")
+    print(f"Exporting bulk import CSVs to {BULK_IMPORT_DIR}...", flush=True)
+    files = export_import_csvs(BULK_IMPORT_DIR, user_video_act_data, user_data, course_data, video_data)
+    if not run_bulk_import(files):
+        raise SystemExit("Bulk import failed. The target database must be stopped while importing.")
+    print("Bulk import finished. Start the Neo4j server and run seeding with SEED_MODE=transactional to apply the schema.", flush=True)
 
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
 # Seed the knowledge graph with data
 def seed_knowledge_graph(user_video_act_data, user_data, course_data, video_data):
     from neo4j_utils import clear_database
-    with driver.session() as session:
+    incremental = should_seed_incrementally()
+    # Waits for the server and opens one pooled connection per seeding worker up front
+    warmup(SEED_WORKERS)
+    driver = get_driver()
+    with driver.session() as session, (SeedCheckpoint() if incremental else nullcontext()) as checkpoint:
+        # Constraints and indexes must exist before any MERGE/MATCH by id
+        schema_version = ensure_schema(session)
+        print(f"Schema is at version {schema_version}.", flush=True)
         if is_seeded(session):
             if should_reseed():
-                print("Database already seeded. Reseeding as requested. Clearing database...", flush=True)
-                clear_database(session)
+                labels = reseed_labels()
+                print(f"Database already seeded. Reseeding as requested. Clearing {', '.join(labels) if labels else 'database'}...", flush=True)
+                clear_database(session, labels=labels)
+                if checkpoint is not None:
+                    checkpoint.reset()
+            elif checkpoint is not None:
+                print("Database already seeded. Writing new and changed records incrementally...", flush=True)
             else:
                 print("Database already seeded. Skipping seeding.", flush=True)
                 return
         else:
             print("Database not seeded. Proceeding with seeding...", flush=True)
+            if checkpoint is not None and is_database_empty(session):
+                # The checkpoint belongs to a database that no longer exists
+                checkpoint.reset()
         print("Inserting data into knowledge graph...", flush=True)
-        insert_data_into_kg(session, user_video_act_data, user_data, course_data, video_data)
+        if SEED_WORKERS > 1:
+            parallel_insert_data_into_kg(driver, user_video_act_data, user_data, course_data, video_data,
+                                         workers=SEED_WORKERS, checkpoint=checkpoint)
+        else:
+            insert_data_into_kg(session, user_video_act_data, user_data, course_data, video_data, checkpoint=checkpoint)
+        record_seed_run(session)
         print("Knowledge graph seeded successfully.", flush=True)
 
 
-if __name__ == "__main__":
-    seed_knowledge_graph(user_video_act_data, user_data, course_data, video_data)
+def main():
+    # Records are streamed from DATA_FOLDER during seeding; nothing is loaded up front
+    # USER_VIDEO_ACT_LIMIT > 0 keeps only the first N user_video_act records
+    sources = open_mooc_sources(DATA_FOLDER, user_video_act_limit=USER_VIDEO_ACT_LIMIT)
+    if SEED_MODE not in SEED_MODES:
+        raise SystemExit(f"Unknown SEED_MODE {SEED_MODE!r}; expected one of {', '.join(SEED_MODES)}")
+    if SEED_MODE == "bulk":
+        bulk_import(sources["user_video_act"], sources["user"], sources["course"], sources["video"])
+        return
+    try:
+        seed_knowledge_graph(sources["user_video_act"], sources["user"], sources["course"], sources["video"])
+    finally:
+        close_driver()
     print("Knowledge graph including seeds is set up and ready. Refresh your Neo4j browser window to see the latest changes!", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import instrumentation
+
+# How transcript segments are stored in the graph, and the read queries for either layout.
+#
+# nodes (default):  one (:Segment {id, segment_index, start, end, text}) per segment, linked (:Video)-[:HAS_SEGMENT]->
+# compact:          parallel float lists Video.segment_start / Video.segment_end; segment i of a video is
+#                   implied by the list position. With SEGMENT_TEXT=transcript the texts go to one
+#                   (:Transcript {id: <video id>, text: [...]}) per video, linked (:Video)-[:HAS_TRANSCRIPT]->;
+#                   with SEGMENT_TEXT=none they are not stored.
+#
+# Both layouts give segment i of video V the id "<V>_S<i>", so results are comparable across layouts.
+# SEGMENT_STORAGE selects the layout written by seeding; readers detect the layout of the database
+# (detect_layout), so changing it requires reseeding.
+SEGMENT_STORAGE = os.getenv("SEGMENT_STORAGE", "nodes").strip().lower()
+SEGMENT_TEXT = os.getenv("SEGMENT_TEXT", "transcript").strip().lower()
+
+LAYOUTS = ("nodes", "compact")
+
+
+def segment_id(video_id, index):
+    return f"{video_id}_S{index}"
+
+
+# A Video carrying segment lists marks a compact database
+LAYOUT_QUERY = "MATCH (v:Video) WHERE v.segment_start IS NOT NULL RETURN v.id AS id LIMIT 1"
+
+
+def detect_layout(tx):
+    """Returns the segment layout of the database ("nodes" or "compact"); works for a session or a transaction."""
+    return "compact" if instrumentation.run(tx, LAYOUT_QUERY, name="segment_layout").single() is not None else "nodes"
+
+
+# One row per (user, watched video, segment of that video), the input of the client-side skip analysis
+INTERACTIONS_QUERIES = {
+    "nodes": """
+    MATCH (u:User)-[w:WATCHED]->(v:Video)-[:HAS_SEGMENT]->(s:Segment)
+    RETURN u.id AS user, v.id AS video, s.id AS segment,
+           s.start AS seg_start, s.end AS seg_end,
+           w.video_start_time AS watched_start, w.video_end_time AS watched_end
+    """,
+    "compact": """
+    MATCH (u:User)-[w:WATCHED]->(v:Video)
+    UNWIND range(0, size(coalesce(v.segment_start, [])) - 1) AS i
+    RETURN u.id AS user, v.id AS video, v.id + '_S' + toString(i) AS segment,
+           v.segment_start[i] AS seg_start, v.segment_end[i] AS seg_end,
+           w.video_start_time AS watched_start, w.video_end_time AS watched_end
+    """,
+}
+
+# Distinct viewing and skipping users per segment, aggregated in Cypher (same semantics as
+# segment_overlap.segment_skip_stats: missing watch times count as skipped, missing segment bounds as viewed)
+SKIP_COUNTS_QUERIES = {
+    "nodes": """
+    MATCH (u:User)-[w:WATCHED]->(v:Video)-[:HAS_SEGMENT]->(s:Segment)
+    WITH v, s, u,
+         w.video_start_time IS NOT NULL AND w.video_end_time IS NOT NULL
+         AND NOT coalesce(w.video_end_time < s.start OR w.video_start_time > s.end, false) AS viewed
+    RETURN v.id AS video, s.id AS segment,
+           count(DISTINCT CASE WHEN viewed THEN u END) AS views,
+           count(DISTINCT CASE WHEN NOT viewed THEN u END) AS skips
+    """,
+    "compact": """
+    MATCH (u:User)-[w:WATCHED]->(v:Video)
+    UNWIND range(0, size(coalesce(v.segment_start, [])) - 1) AS i
+    WITH v, i, u,
+         w.video_start_time IS NOT NULL AND w.video_end_time IS NOT NULL
+         AND NOT coalesce(w.video_end_time < v.segment_start[i] OR w.video_start_time > v.segment_end[i], false) AS viewed
+    RETURN v.id AS video, v.id + '_S' + toString(i) AS segment,
+           count(DISTINCT CASE WHEN viewed THEN u END) AS views,
+           count(DISTINCT CASE WHEN NOT viewed THEN u END) AS skips
+    """,
+}
+
+# Number of rows INTERACTIONS_QUERIES returns
+INTERACTION_COUNT_QUERIES = {
+    "nodes": "MATCH (u:User)-[w:WATCHED]->(v:Video)-[:HAS_SEGMENT]->(s:Segment) RETURN count(*) AS count",
+    "compact": "MATCH (u:User)-[w:WATCHED]->(v:Video) RETURN sum(size(coalesce(v.segment_start, []))) AS count",
+}
+
+# Graph snapshot export of the compact layout: the same Segment columns (id, start, end, segment_index) and
+# HAS_SEGMENT edges (video id, segment id) the nodes layout exports, so snapshots do not depend on the layout
+SNAPSHOT_QUERIES = {
+    "nodes": {},
+    "compact": {
+        "Segment": """
+        MATCH (v:Video) WHERE v.segment_start IS NOT NULL
+        UNWIND range(0, size(v.segment_start) - 1) AS i
+        RETURN v.id + '_S' + toString(i) AS id, v.segment_start[i] AS seg_start, v.segment_end[i] AS seg_end, i AS segment_index
+        """,
+        "HAS_SEGMENT": """
+        MATCH (v:Video) WHERE v.segment_start IS NOT NULL
+        UNWIND range(0, size(v.segment_start) - 1) AS i
+        RETURN v.id AS source, v.id + '_S' + toString(i) AS target
+        """,
+    },
+}
+
+
+def check_layout(layout):
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown segment storage {layout!r}; expected one of {', '.join(LAYOUTS)}")
+    return layout
@@ -0,0 +1,102 @@
+import os
+from bisect import bisect_right
+from collections import Counter
+
+# Viewing statistics aggregated while seeding, so readers get per-video and per-course numbers from
+# O(videos) node properties instead of scanning every WATCHED relationship.
+#
+# They are computed in one streaming pass over the rows the WATCHED step writes (neo4j_utils.watched_rows),
+# one user at a time, and stored on Video and Course:
+#   viewer_count                 distinct users with a WATCHED relationship
+#   total_watch_time             sum of local_watching_time
+#   watched_span                 sum of video_end_time - video_start_time (watched-interval coverage; divide
+#                                by viewer_count and the video duration for the covered share)
+#   speed_samples, speed_users   WATCHED rows with a usable video_progress_time / local_watching_time ratio
+#                                (the rows speed_analytics keeps) and the distinct users among them
+#   speed_sum                    sum of those ratios (mean = speed_sum / speed_samples)
+#   speed_histogram              samples per bin of speed_histogram_edges (first and last bins are open-ended)
+#   speed_values, speed_counts   the distinct ratios rounded to 0.01, ascending, and their sample counts
+# A Course aggregates the videos linked to it by PART_OF; a video listed twice in a course counts twice,
+# like speed_analytics.course_speed_distribution.
+
+# Same setting and default as speed_analytics.SPEED_HISTOGRAM_BINS; the edges are stored with the histogram
+SPEED_HISTOGRAM_BINS = tuple(float(edge) for edge in os.getenv(
+    "SPEED_HISTOGRAM_BINS", "0,0.5,0.75,1.0,1.25,1.5,1.75,2.0,3.0").split(","))
+
+
+def _number(value):
+    # Missing and NaN values are left out of the sums
+    return None if value is None or value != value else value
+
+
+def playback_speed(row):
+    """The video_progress_time / local_watching_time ratio of a WATCHED row, or None if it is not usable."""
+    progress = _number(row.get("video_progress_time"))
+    local = _number(row.get("local_watching_time"))
+    if progress is None or local is None or progress == 0 or local <= 0:
+        return None
+    return progress / local
+
+
+class ViewingStats:
+    """Running viewing statistics per group (a video or a course id); see the module comment."""
+
+    def __init__(self, bin_edges=SPEED_HISTOGRAM_BINS):
+        self.bin_edges = [float(edge) for edge in bin_edges]
+        self.groups = {}
+
+    def _group(self, key):
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {
+                "viewer_count": 0, "total_watch_time": 0.0, "watched_span": 0.0,
+                "speed_samples": 0, "speed_users": 0, "speed_sum": 0.0,
+                "speed_histogram": [0] * (len(self.bin_edges) - 1), "speed_hundredths": Counter(),
+            }
+        return group
+
+    def add_user(self, rows, groups_of=None):
+        """
+        Adds the WATCHED rows of one user. groups_of maps a video id to the group keys the row counts for
+        (default: the video itself).
+        """
+        viewed = set()
+        sped = set()
+        n_bins = len(self.bin_edges) - 1
+        for row in rows:
+            keys = (row["video_id"],) if groups_of is None else groups_of(row["video_id"])
+            watch_time = _number(row.get("local_watching_time"))
+            start, end = _number(row.get("video_start_time")), _number(row.get("video_end_time"))
+            span = end - start if start is not None and end is not None and end > start else None
+            speed = playback_speed(row)
+            for key in keys:
+                group = self._group(key)
+                if key not in viewed:
+                    viewed.add(key)
+                    group["viewer_count"] += 1
+                if watch_time is not None:
+                    group["total_watch_time"] += watch_time
+                if span is not None:
+                    group["watched_span"] += span
+                if speed is None:
+                    continue
+                if key not in sped:
+                    sped.add(key)
+                    group["speed_users"] += 1
+                group["speed_samples"] += 1
+                group["speed_sum"] += speed
+                group["speed_histogram"][min(max(bisect_right(self.bin_edges, speed) - 1, 0), n_bins - 1)] += 1
+                # round() rounds half to even, like the np.rint speed_analytics uses
+                group["speed_hundredths"][round(speed * 100)] += 1
+
+    def rows(self):
+        """Yields {"id", "props"} rows with the stored properties of every group."""
+        for key, group in self.groups.items():
+            props = {name: value for name, value in group.items() if name != "speed_hundredths"}
+            hundredths = sorted(group["speed_hundredths"])
+            props.update(
+                speed_histogram_edges=list(self.bin_edges),
+                speed_values=[h / 100 for h in hundredths],
+                speed_counts=[group["speed_hundredths"][h] for h in hundredths],
+            )
+            yield {"id": key, "props": props}